@@ -2,16 +2,20 @@
 Admin Service Module
 Handles admin authentication, dashboard, and management operations
 """
+import os
 import bcrypt
-import mysql.connector
-from tkinter import messagebox
+from encoding_format import encode_templates
+from dashboard_service import DashboardAggregates
+from storage_backend import StorageError, IntegrityError
 
 class InvalidDepartmentSelectionError(Exception):
     pass
 
 class AdminService:
-    def __init__(self, database_service):
+    def __init__(self, database_service, face_recognition_service=None):
         self.db = database_service
+        self.face_service = face_recognition_service
+        self.dashboard = DashboardAggregates(database_service, int(os.getenv("dashboard_reconcile_seconds", "300")))
 
     def authenticate_admin(self, username, password):
         """Authenticate admin user"""
@@ -36,7 +40,7 @@ class AdminService:
         try:
             self.db.add_admin(username, password)
             return True, "New admin added successfully."
-        except mysql.connector.IntegrityError:
+        except IntegrityError:
             return False, "Username already exists."
         except Exception as e:
             return False, f"Error adding admin: {str(e)}"
@@ -60,16 +64,8 @@ class AdminService:
     def get_dashboard_data(self):
         """Get dashboard data including total employees, attendance rate, and department data"""
         try:
-            total_employees = self.db.get_total_employees()
-            attendance_rate = self.db.get_attendance_rate()
-            attendance_by_department = self.db.get_attendance_by_department()
-
-            attendance_data = [
-                (dept, attendance_count, (attendance_count / employee_count) * 100 if employee_count > 0 else 0)
-                for dept, employee_count, attendance_count in attendance_by_department
-            ]
-            return total_employees, attendance_rate, attendance_data
-        except mysql.connector.Error as err:
+            return self.dashboard.get_dashboard_data()
+        except StorageError as err:
             print(f"Error: {err}")
             return 0, 0, []
 
@@ -78,7 +74,7 @@ class AdminService:
         return self.db.get_all_departments()
 
     def register_employee(self, emp_id, emp_name, emp_department, emp_designation, face_encoding):
-        """Register new employee"""
+        """Register new employee; `face_encoding` is one template or a (templates x 128) array"""
         if not emp_id or not emp_name or not emp_department or not emp_designation:
             return False, "Please fill all the fields."
         
@@ -87,14 +83,31 @@ class AdminService:
             if emp_dept_id is None:
                 return False, "Invalid department selected."
             
-            encoding_data = face_encoding.tobytes()
+            # One 128-d template, or several stored back to back (multi-sample enrollment)
+            encoding_data = encode_templates(face_encoding, os.getenv("encoding_format", "float32"))
             self.db.add_employee(emp_id, emp_name, emp_dept_id, emp_designation, encoding_data)
+            if self.face_service:
+                self.face_service.employee_registered(emp_id, emp_name, face_encoding, emp_dept_id)
             return True, "Employee registered successfully."
-        except mysql.connector.IntegrityError:
+        except IntegrityError:
             return False, "Employee ID already exists."
         except Exception as e:
             return False, f"Error registering employee: {str(e)}"
 
+    def deactivate_employee(self, emp_id):
+        """Deactivate an employee so they can no longer mark attendance"""
+        if not emp_id:
+            return False, "Employee ID is required."
+        
+        try:
+            if not self.db.set_employee_active(emp_id, False):
+                return False, "Employee not found."
+            if self.face_service:
+                self.face_service.employee_deactivated(emp_id)
+            return True, "Employee deactivated successfully."
+        except Exception as e:
+            return False, f"Error deactivating employee: {str(e)}"
+
     def validate_department_selection(self, selected_department):
         """Validate if the selected department is valid"""
         if selected_department == "Select Department" or not selected_department:
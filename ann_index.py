@@ -0,0 +1,188 @@
+"""
+ANN Index Module
+Inverted-file (IVF) approximate nearest-neighbour index with exact re-rank for very large galleries
+
+Templates are grouped by their nearest k-means centroid into inverted
+lists. A query scores every centroid, scans only the `n_probes` closest
+lists, and re-ranks their templates with exact distances on the stored
+compact rows, so the answer differs from a full scan only when the true
+best match sits in a list that was not probed.
+"""
+import numpy as np
+
+import encoding_format
+from encoding_format import ENCODING_DIMENSIONS
+
+# Rows assigned to centroids per block, bounding the (rows x lists) distance matrix
+ASSIGN_BLOCK_ROWS = 4096
+# k-means is trained on at most this many samples per list
+TRAIN_SAMPLES_PER_LIST = 32
+
+
+def default_list_count(size):
+    """4 * sqrt(size) lists, the usual IVF sizing: a few hundred templates per list at a million"""
+    return max(1, min(size, int(4 * np.sqrt(size))))
+
+
+def _nearest(vectors, centroids, centroid_sq):
+    """Index of the nearest centroid for every row of `vectors` (float32)"""
+    out = np.empty(len(vectors), dtype=np.intp)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        block = vectors[start:start + ASSIGN_BLOCK_ROWS]
+        # ||v||^2 is the same for every centroid, so it does not change the argmin
+        out[start:start + ASSIGN_BLOCK_ROWS] = np.argmin(centroid_sq[np.newaxis, :] - 2.0 * (block @ centroids.T),
+                                                         axis=1)
+    return out
+
+
+def train_centroids(compact, scales, n_lists, iterations=10, seed=0):
+    """k-means centroids (n_lists x 128, float32) of a compact template matrix
+
+    Lloyd iterations on at most TRAIN_SAMPLES_PER_LIST sampled rows per
+    list; a list left empty is reseeded with a random sample.
+    """
+    rng = np.random.default_rng(seed)
+    n_lists = max(1, min(n_lists, len(compact)))
+    sample_rows = np.sort(rng.choice(len(compact), min(len(compact), n_lists * TRAIN_SAMPLES_PER_LIST), replace=False))
+    sample = _widen(np.asarray(compact)[sample_rows], None if scales is None else np.asarray(scales)[sample_rows])
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest(sample, centroids, np.einsum("ij,ij->i", centroids, centroids))
+        counts = np.bincount(assignment, minlength=n_lists)
+        filled = counts > 0
+        order = np.argsort(assignment, kind="stable")
+        starts = (np.cumsum(counts) - counts)[filled]
+        centroids[filled] = np.add.reduceat(sample[order], starts, axis=0) / counts[filled, np.newaxis]
+        if not filled.all():
+            centroids[~filled] = sample[rng.choice(len(sample), int((~filled).sum()), replace=False)]
+    return centroids
+
+
+class InvertedList:
+    """Templates assigned to one centroid: owner IDs, compact rows, per-row scales and squared norms"""
+    __slots__ = ("ids", "compact", "scales", "sq_norms")
+
+    def __init__(self, ids, compact, scales, sq_norms):
+        self.ids = ids
+        self.compact = compact
+        self.scales = scales
+        self.sq_norms = sq_norms
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class IVFIndex:
+    """Immutable IVF index over gallery templates in one encoding format
+
+    with_templates() and without() return a new index that shares every
+    untouched inverted list, so FaceGallery can swap it in together with its
+    own arrays. The index copies the gallery's compact rows, grouped by list.
+    """
+    def __init__(self, centroids, lists, encoding_format, trained_size):
+        self.centroids = centroids
+        self.centroid_sq = np.einsum("ij,ij->i", centroids, centroids)
+        self.lists = tuple(lists)
+        self.encoding_format = encoding_format
+        self.trained_size = trained_size
+
+    def __len__(self):
+        return sum(len(inverted_list) for inverted_list in self.lists)
+
+    @classmethod
+    def build(cls, employee_ids, counts, matrix, scales, sq_norms, encoding_format, n_lists=0, previous=None):
+        """Index every gallery row
+
+        The centroids of `previous` are reused while the gallery is within 4x
+        of the size they were trained on; otherwise k-means runs again.
+        """
+        rows = len(matrix)
+        if previous is not None and previous.trained_size / 4 <= rows <= previous.trained_size * 4:
+            centroids, trained_size = previous.centroids, previous.trained_size
+        else:
+            centroids, trained_size = train_centroids(matrix, scales, n_lists or default_list_count(rows)), rows
+        index = cls(centroids, (), encoding_format, trained_size)
+        assignment = index._assign(matrix, scales)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.cumsum(np.bincount(assignment, minlength=len(centroids)))[:-1]
+        row_ids = np.split(np.repeat(np.asarray(employee_ids, dtype=str), counts)[order], bounds)
+        row_compact = np.split(np.asarray(matrix)[order], bounds)
+        row_sq = np.split(np.asarray(sq_norms)[order], bounds)
+        row_scales = np.split(np.asarray(scales)[order], bounds) if scales is not None else [None] * len(centroids)
+        index.lists = tuple(InvertedList(*parts) for parts in zip(row_ids, row_compact, row_scales, row_sq))
+        return index
+
+    def with_templates(self, emp_id, compact, scales):
+        """New index with an employee's compact rows added to their nearest lists"""
+        lists = list(self.lists)
+        assignment = self._assign(compact, scales)
+        row_sq = encoding_format.sq_norms(compact, scales)
+        for list_no in np.unique(assignment):
+            rows = assignment == list_no
+            old = lists[list_no]
+            lists[list_no] = InvertedList(
+                np.concatenate([old.ids, np.full(int(rows.sum()), str(emp_id))]),
+                np.concatenate([old.compact, compact[rows]]),
+                None if scales is None else np.concatenate([old.scales, scales[rows]]),
+                np.concatenate([old.sq_norms, row_sq[rows]]))
+        return IVFIndex(self.centroids, lists, self.encoding_format, self.trained_size)
+
+    def without(self, emp_id, compact, scales):
+        """New index without an employee, whose rows are found again by assigning their templates"""
+        lists = list(self.lists)
+        for list_no in np.unique(self._assign(compact, scales)):
+            old = lists[list_no]
+            keep = old.ids != str(emp_id)
+            lists[list_no] = InvertedList(old.ids[keep], old.compact[keep],
+                                          None if old.scales is None else old.scales[keep], old.sq_norms[keep])
+        return IVFIndex(self.centroids, lists, self.encoding_format, self.trained_size)
+
+    def search(self, probes, n_probes=16):
+        """(best id, best squared distance, second id, second squared distance) per probe
+
+        The second candidate is the closest template of a different
+        employee, as in FaceGallery.identify_batch; it is (None, inf) when the
+        probed lists hold only one employee. A probe whose lists are all
+        empty gets None.
+        """
+        probes = np.asarray(probes, dtype=np.float64).reshape(-1, ENCODING_DIMENSIONS)
+        n_probes = max(1, min(n_probes, len(self.lists)))
+        coarse = self.centroid_sq[np.newaxis, :] - 2.0 * (probes.astype(np.float32) @ self.centroids.T)
+        nearest_lists = np.argpartition(coarse, n_probes - 1, axis=1)[:, :n_probes]
+
+        results = []
+        for probe, list_nos in zip(probes, nearest_lists):
+            probed = [self.lists[list_no] for list_no in list_nos if len(self.lists[list_no])]
+            if not probed:
+                results.append(None)
+                continue
+            ids = np.concatenate([inverted_list.ids for inverted_list in probed])
+            # Exact re-rank: ||g||^2 - 2 g.p + ||p||^2 over every candidate template
+            sq = np.concatenate([inverted_list.sq_norms
+                                 - 2.0 * encoding_format.dot(inverted_list.compact, inverted_list.scales,
+                                                             probe[np.newaxis, :])[0]
+                                 for inverted_list in probed])
+            sq += probe @ probe
+            best = int(np.argmin(sq))
+            best_id = str(ids[best])
+            others = np.where(ids != best_id, sq, np.inf)
+            second = int(np.argmin(others))
+            if np.isinf(others[second]):
+                results.append((best_id, float(sq[best]), None, np.inf))
+            else:
+                results.append((best_id, float(sq[best]), str(ids[second]), float(others[second])))
+        return results
+
+    def _assign(self, compact, scales):
+        """Nearest list of every compact row, widened a block at a time"""
+        out = np.empty(len(compact), dtype=np.intp)
+        for start in range(0, len(compact), ASSIGN_BLOCK_ROWS):
+            block = slice(start, start + ASSIGN_BLOCK_ROWS)
+            out[block] = _nearest(_widen(compact[block], None if scales is None else scales[block]),
+                                  self.centroids, self.centroid_sq)
+        return out
+
+
+def _widen(compact, scales):
+    """float32 copy of compact rows for centroid arithmetic"""
+    return encoding_format.dequantize(compact, scales, np.float32).reshape(-1, ENCODING_DIMENSIONS)
@@ -32,6 +32,7 @@ from tkinter import filedialog
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from dotenv import load_dotenv
+from encoding_format import decode_templates
 
 load_dotenv()
 
@@ -779,7 +780,8 @@ def setup_attendance_frame():
                     return
 
                 name = record[0]
-                known_face_encoding = np.frombuffer(record[1])
+                # Stored rows may be in any encoding_format version; the first template stands in for the employee
+                known_face_encoding = decode_templates(record[1])[0]
 
                 FACE_DISTANCE_THRESHOLD = 0.6
 
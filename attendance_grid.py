@@ -0,0 +1,155 @@
+"""
+Attendance Grid Module
+Virtualized Treeview that renders only the visible window of a large result set
+"""
+import tkinter as tk
+from collections import OrderedDict
+from tkinter import messagebox, ttk
+
+# (heading, sort key) for each column
+GRID_COLUMNS = (
+    ("Date", "date"),
+    ("EmpID", "employee_id"),
+    ("Name", "name"),
+    ("CheckIn", "checkin"),
+    ("CheckOut", "checkout"),
+    ("WorkTime", "worktime"),
+)
+
+
+class AttendanceGrid(tk.Frame):
+    """One Treeview with a fixed set of `visible_rows` items, reused for every query
+
+    Scrolling moves a window over the result set instead of the Treeview:
+    rows are fetched `page_size` at a time from the database, sorted and
+    filtered there, and the visible items are rewritten in place. Only
+    `max_cached_pages` pages are kept, so memory and redraw cost do not grow
+    with the size of the result.
+    """
+    def __init__(self, parent, visible_rows=20, page_size=200, max_cached_pages=20):
+        super().__init__(parent)
+        self.visible_rows = visible_rows
+        self.page_size = page_size
+        self.max_cached_pages = max_cached_pages
+        self.count_rows = None
+        self.fetch_rows = None
+        self.total_rows = 0
+        self.top = 0
+        self.sort_key = "date"
+        self.descending = False
+        self.pages = OrderedDict()
+
+        filter_frame = tk.Frame(self)
+        filter_frame.pack(fill=tk.X)
+        tk.Label(filter_frame, text="Filter by employee ID or name:").pack(side=tk.LEFT, padx=5)
+        self.filter_var = tk.StringVar()
+        filter_entry = tk.Entry(filter_frame, textvariable=self.filter_var)
+        filter_entry.pack(side=tk.LEFT, padx=5)
+        filter_entry.bind("<Return>", lambda event: self.refresh())
+        tk.Button(filter_frame, text="Apply", command=self.refresh).pack(side=tk.LEFT, padx=5)
+
+        table_frame = tk.Frame(self)
+        table_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+        self.tree = ttk.Treeview(table_frame, columns=[heading for heading, _ in GRID_COLUMNS],
+                                 show='headings', height=visible_rows, selectmode="browse")
+        for heading, sort_key in GRID_COLUMNS:
+            self.tree.heading(heading, text=heading, command=lambda key=sort_key: self.sort_by(key))
+            self.tree.column(heading, width=100)
+        self.items = [self.tree.insert('', tk.END, values=()) for _ in range(visible_rows)]
+        self.scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.status_label = tk.Label(self, text="No query", fg="gray")
+        self.status_label.pack()
+
+        for widget in (self.tree, self.scrollbar):
+            widget.bind("<MouseWheel>", lambda event: self.scroll_by(-1 if event.delta > 0 else 1, "units"))
+            widget.bind("<Button-4>", lambda event: self.scroll_by(-1, "units"))
+            widget.bind("<Button-5>", lambda event: self.scroll_by(1, "units"))
+        self.tree.bind("<Prior>", lambda event: self.scroll_by(-1, "pages"))
+        self.tree.bind("<Next>", lambda event: self.scroll_by(1, "pages"))
+
+    def set_source(self, count_rows, fetch_rows):
+        """Point the grid at a new query and show its first rows
+
+        count_rows(employee_filter) -> int
+        fetch_rows(offset, limit, sort_key, descending, employee_filter) -> [row tuples]
+        """
+        self.count_rows = count_rows
+        self.fetch_rows = fetch_rows
+        self.refresh()
+
+    def refresh(self):
+        """Re-run the query with the current sort and filter, back at the top"""
+        self.pages.clear()
+        self.top = 0
+        self.total_rows = 0
+        if self.count_rows is not None:
+            try:
+                self.total_rows = self.count_rows(self._filter())
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to fetch attendance data: {str(e)}")
+        self._render()
+
+    def sort_by(self, sort_key):
+        """Sort on a column; clicking the same heading again reverses the order"""
+        self.descending = not self.descending if sort_key == self.sort_key else False
+        self.sort_key = sort_key
+        for heading, key in GRID_COLUMNS:
+            arrow = (" ▼" if self.descending else " ▲") if key == sort_key else ""
+            self.tree.heading(heading, text=heading + arrow)
+        self.refresh()
+
+    def scroll_by(self, amount, what="units"):
+        step = self.visible_rows if what == "pages" else 1
+        self._scroll_to(self.top + amount * step)
+        return "break"
+
+    def _on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self._scroll_to(int(float(args[0]) * self.total_rows))
+        elif action == "scroll":
+            self.scroll_by(int(args[0]), args[1])
+
+    def _scroll_to(self, top):
+        top = max(0, min(top, self.total_rows - self.visible_rows))
+        if top != self.top:
+            self.top = top
+            self._render()
+
+    def _render(self):
+        for i, item in enumerate(self.items):
+            row = self._row(self.top + i)
+            self.tree.item(item, values=row if row is not None else ())
+
+        if self.total_rows:
+            last = min(self.top + self.visible_rows, self.total_rows)
+            self.scrollbar.set(self.top / self.total_rows, last / self.total_rows)
+            self.status_label.configure(text=f"Rows {self.top + 1}-{last} of {self.total_rows}")
+        else:
+            self.scrollbar.set(0, 1)
+            self.status_label.configure(text="No records" if self.count_rows is not None else "No query")
+
+    def _row(self, index):
+        if index >= self.total_rows:
+            return None
+        page_number, offset = divmod(index, self.page_size)
+        page = self.pages.get(page_number)
+        if page is None:
+            try:
+                page = self.fetch_rows(page_number * self.page_size, self.page_size,
+                                       self.sort_key, self.descending, self._filter())
+            except Exception as e:
+                self.total_rows = 0
+                messagebox.showerror("Error", f"Failed to fetch attendance data: {str(e)}")
+                return None
+            self.pages[page_number] = page
+            while len(self.pages) > self.max_cached_pages:
+                self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(page_number)
+        return page[offset] if offset < len(page) else None
+
+    def _filter(self):
+        return self.filter_var.get().strip() or None
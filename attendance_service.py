@@ -2,142 +2,507 @@
 Attendance Service Module
 Handles attendance marking and viewing operations
 """
-import os
-import pandas as pd
-import face_recognition
-from datetime import datetime, timedelta
+import threading
+from datetime import date, datetime, timedelta
 from tkinter import messagebox, filedialog
 
+import numpy as np
+
+import metrics
+from encoding_format import dequantize
+from face_gallery import unpack_templates
+from face_recognition_service import NO_FACE_MESSAGE
+from report_export import ExportJob, available_formats, export_format, file_types
+from storage_backend import DatabaseUnavailableError, StorageError
+
+class FacePunchResult:
+    """Outcome of a group punch for one face in the frame"""
+    def __init__(self, face_index, employee_id=None, name=None, success=False, message="", outcome=None):
+        self.face_index = face_index
+        self.employee_id = employee_id
+        self.name = name
+        self.success = success
+        self.message = message
+        # punch_outcomes_total label counted for this face
+        self.outcome = outcome
+
 class AttendanceService:
-    def __init__(self, database_service, face_recognition_service):
+    def __init__(self, database_service, face_recognition_service, punch_journal=None, gallery_snapshot=None):
         self.db = database_service
         self.face_service = face_recognition_service
+        # While the database is unreachable, punches go to the journal and
+        # employees are looked up in the gallery snapshot from the last sync
+        self.punch_journal = punch_journal
+        self.gallery_snapshot = gallery_snapshot
+        self.gallery_generation = None
+        self.sync_timer = None
+        self.sync_stopping = False
+        # (day, employee IDs checked in that day): lets offline check-ins refuse
+        # employees who checked in online before the outage
+        self.checkins_today = (None, set())
+        self.db.add_change_listener(self._on_database_change)
 
     def mark_attendance(self, emp_id, is_markin=True):
         """Mark attendance for an employee"""
+        with metrics.span("punch"):
+            return self._counted(self._mark_attendance, emp_id, is_markin)
+
+    def _mark_attendance(self, emp_id, is_markin):
         if not emp_id:
             return False, "Employee ID is required."
 
         # Process image for attendance
-        frame, face_encoding, error = self.face_service.process_attendance_image(emp_id)
+        detection, error = self.face_service.process_attendance_image(emp_id)
         if error:
-            return False, error
+            return self._outcome("no_face" if error == NO_FACE_MESSAGE else "poor_image", False, error)
 
         # Get employee record
-        employee_record = self.db.get_employee_by_id(emp_id)
+        employee_record = self._get_employee(emp_id)
         if not employee_record:
-            return False, "Employee not found."
+            return self._outcome("not_found", False, "Employee not found.")
 
-        name = employee_record[0]
-        known_face_encoding = employee_record[1]
+        name, known_face_encoding = employee_record
 
         # Validate face
-        is_match, face_distance = self.face_service.validate_employee_face(face_encoding, known_face_encoding)
+        is_match, face_distance = self.face_service.compare_faces(known_face_encoding, detection.face_encoding, emp_id)
         
         if is_match:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             date_today = datetime.now().strftime("%Y-%m-%d")
             
             if is_markin:
-                return self._handle_checkin(emp_id, name, timestamp, frame, face_encoding)
+                return self._recorded(self._handle_checkin(emp_id, name, timestamp, detection))
             else:
-                return self._handle_checkout(emp_id, name, timestamp, date_today, frame, face_encoding)
+                return self._recorded(self._handle_checkout(emp_id, name, timestamp, date_today, detection))
         else:
             # Save failed attempt image
-            self._save_failed_attempt(emp_id, frame, face_encoding)
-            return False, f"Face recognition failed. Distance: {face_distance:.3f}"
+            self._save_failed_attempt(emp_id, detection)
+            return self._outcome("mismatch", False, f"Face recognition failed. Distance: {face_distance:.3f}")
+
+    def _counted(self, punch, *args):
+        """Run a punch, counting storage failures that escape it as db_error outcomes"""
+        try:
+            return punch(*args)
+        except StorageError:
+            metrics.increment("punch_outcomes_total", outcome="db_error")
+            raise
+
+    def _outcome(self, outcome, success, message):
+        metrics.increment("punch_outcomes_total", outcome=outcome)
+        return success, message
+
+    def _recorded(self, result):
+        """Count a check-in/check-out result: success, or rejected (e.g. already checked in)"""
+        return self._outcome("success" if result[0] else "rejected", *result)
+
+    def _get_employee(self, emp_id):
+        """Name and decoded encoding for an employee, served from the encoding cache when possible"""
+        cached = self.face_service.encoding_cache.get(emp_id)
+        if cached is not None:
+            return cached
+
+        try:
+            with metrics.span("db_read"):
+                employee_record = self.db.get_employee_by_id(emp_id)
+        except DatabaseUnavailableError:
+            if self.punch_journal is None:
+                raise
+            return self.face_service.gallery.get(emp_id)
+        if not employee_record:
+            return None
+        if employee_record[1] is None:
+            return employee_record[0], None
+        return self.face_service.encoding_cache.put(emp_id, employee_record[0], employee_record[1])
+
+    def load_gallery(self):
+        """Load all active employee encodings into the identification gallery
+
+        With a gallery snapshot, the gallery is mapped from disk first and then
+        brought up to date with the employees changed since the snapshot's
+        watermark; the snapshot alone is used when the database is unreachable.
+        Without one, every encoding is read from the database.
+        """
+        if self.gallery_snapshot is None:
+            rows = self.db.get_active_face_encodings()
+            self.face_service.gallery.load(rows)
+            self.face_service.encoding_cache.warm(rows)
+        else:
+            if self.gallery_generation is None:
+                self.gallery_generation = self.gallery_snapshot.open()
+                if self.gallery_generation is not None:
+                    self._adopt_generation(self.gallery_generation)
+            try:
+                self.sync_gallery()
+            except DatabaseUnavailableError:
+                if self.gallery_generation is None:
+                    raise
+                return
+        self.face_service.employee_departments = {
+            str(emp_id): dept_id for emp_id, dept_id in self.db.get_active_employee_departments()}
+        self.refresh_checkins()
+
+    def refresh_checkins(self):
+        """Reload the IDs of employees checked in today from the database"""
+        today = date.today()
+        self.checkins_today = (today, {str(emp_id) for emp_id in self.db.get_present_employee_ids(today)})
+
+    def _on_database_change(self, event, *args):
+        """Storage change listener keeping checkins_today current between refreshes"""
+        if event != "attendance_in":
+            return
+        day, emp_ids = self.checkins_today
+        if day != date.today():
+            day, emp_ids = date.today(), set()
+            self.checkins_today = (day, emp_ids)
+        emp_ids.update(str(emp_id) for emp_id in args[0])
+
+    def _checked_in_offline(self, emp_id, date_today):
+        """Offline stand-in for check_attendance_exists on check-in: known check-ins today, or a journaled one"""
+        day, emp_ids = self.checkins_today
+        if day is not None and day.isoformat() == date_today and str(emp_id) in emp_ids:
+            return True
+        return self.punch_journal.has_punch(emp_id, date_today, "in")
+
+    def sync_gallery(self):
+        """Pull employees changed since the snapshot watermark and apply them to the gallery
+
+        A delta generation is applied through gallery.update() with just its
+        changed rows; only a full rebuild replaces the gallery's arrays.
+        """
+        generation = self.gallery_snapshot.sync(self.db, self.gallery_generation)
+        if generation is self.gallery_generation:
+            return
+        self.gallery_generation = generation
+        if generation.changes is not None and self.face_service.gallery.loaded:
+            self._apply_changes(generation.changes)
+        else:
+            self._adopt_generation(generation)
+
+    def start_gallery_sync(self, interval):
+        """Re-sync the gallery snapshot every `interval` seconds until stop_gallery_sync()"""
+        def run():
+            try:
+                self.sync_gallery()
+                self.refresh_checkins()
+            except DatabaseUnavailableError:
+                pass
+            except Exception as e:
+                print(f"Gallery sync failed: {e}")
+            schedule()
+
+        def schedule():
+            if not self.sync_stopping:
+                self.sync_timer = threading.Timer(interval, run)
+                self.sync_timer.daemon = True
+                self.sync_timer.start()
+        schedule()
+
+    def stop_gallery_sync(self):
+        self.sync_stopping = True
+        if self.sync_timer is not None:
+            self.sync_timer.cancel()
+
+    def _apply_changes(self, rows):
+        """Apply (id, name, encoding, active, updated at) rows of a delta generation to the gallery and cache"""
+        changes = [(emp_id, name, unpack_templates(encoding_bytes) if active and encoding_bytes is not None else None)
+                   for emp_id, name, encoding_bytes, active, _ in rows]
+        self.face_service.gallery.update(changes)
+        cache = self.face_service.encoding_cache
+        for emp_id, name, templates in changes:
+            if templates is None:
+                cache.invalidate(emp_id)
+            else:
+                cache.put_templates(emp_id, name, templates)
+
+    def _adopt_generation(self, generation):
+        """Replace the gallery with a snapshot generation and warm the encoding cache from it"""
+        self.face_service.gallery.load_arrays(generation.employee_ids, generation.names,
+                                              generation.matrix, generation.counts, generation.scales)
+        ends = np.cumsum(generation.counts)
+        self.face_service.encoding_cache.warm_templates(
+            (emp_id, name, dequantize(generation.matrix[end - count:end],
+                                      None if generation.scales is None else generation.scales[end - count:end]))
+            for emp_id, name, count, end in zip(generation.employee_ids, generation.names, generation.counts, ends))
+
+    def identify_and_mark_attendance(self, is_markin=True):
+        """Mark attendance by identifying the employee from the gallery (1:N)"""
+        with metrics.span("punch"):
+            return self._counted(self._identify_and_mark_attendance, is_markin)
+
+    def _identify_and_mark_attendance(self, is_markin):
+        if not self.face_service.gallery.loaded:
+            self.load_gallery()
+
+        detection, error = self.face_service.process_attendance_image(None)
+        if error:
+            return self._outcome("no_face" if error == NO_FACE_MESSAGE else "poor_image", False, error)
+
+        result = self.face_service.identify_face(detection.face_encoding)
+        if result is None:
+            return self._outcome("no_gallery", False, "No employees enrolled.")
+
+        if result.is_match:
+            emp_id = result.employee_id
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            date_today = datetime.now().strftime("%Y-%m-%d")
+
+            if is_markin:
+                return self._recorded(self._handle_checkin(emp_id, result.name, timestamp, detection))
+            else:
+                return self._recorded(self._handle_checkout(emp_id, result.name, timestamp, date_today, detection))
+        else:
+            self._save_failed_attempt("unidentified", detection)
+            return self._outcome("mismatch", False, f"Face not recognized. Distance: {result.distance:.3f}, margin: {result.margin:.3f}")
+
+    def mark_group_attendance(self, is_markin=True):
+        """Punch every recognised face in a single frame; returns (results, error)
+
+        One outcome is counted per face, or one for the frame when it is
+        rejected before identification.
+        """
+        with metrics.span("punch"):
+            return self._counted(self._mark_group_attendance, is_markin)
+
+    def _mark_group_attendance(self, is_markin):
+        if not self.face_service.gallery.loaded:
+            self.load_gallery()
 
-    def _handle_checkin(self, emp_id, name, timestamp, frame, face_encoding):
+        detection, error = self.face_service.process_attendance_image(None)
+        if error:
+            self._outcome("no_face" if error == NO_FACE_MESSAGE else "poor_image", False, error)
+            return [], error
+
+        # All faces were encoded in one call; identify them in one vectorized pass
+        matches = self.face_service.identify_faces(detection.face_encodings)
+        if not matches:
+            self._outcome("no_gallery", False, "No employees enrolled.")
+            return [], "No employees enrolled."
+
+        results = [FacePunchResult(i) for i in range(len(matches))]
+        claimed = {}
+        for i, match in enumerate(matches):
+            if not match.is_match:
+                results[i].message = f"Not recognized (distance {match.distance:.3f})"
+                results[i].outcome = "mismatch"
+                continue
+            results[i].employee_id, results[i].name = match.employee_id, match.name
+            # The same person matched twice: keep the closer face
+            other = claimed.get(match.employee_id)
+            if other is not None and matches[other].distance <= match.distance:
+                results[i].message = f"Duplicate of face {other + 1}"
+                results[i].outcome = "rejected"
+                continue
+            if other is not None:
+                results[other].message = f"Duplicate of face {i + 1}"
+                results[other].outcome = "rejected"
+            claimed[match.employee_id] = i
+
+        now = datetime.now()
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        date_today = now.strftime("%Y-%m-%d")
+        offline = False
+        try:
+            with metrics.span("db_read"):
+                existing = self.db.get_existing_attendance(list(claimed), date_today)
+        except DatabaseUnavailableError:
+            if self.punch_journal is None:
+                raise
+            offline = True
+            existing = self._offline_existing(list(claimed), date_today, is_markin)
+
+        rows = []
+        for emp_id, i in claimed.items():
+            result = results[i]
+            if is_markin and emp_id in existing:
+                result.message = "Attendance already marked for today."
+                result.outcome = "rejected"
+                continue
+            if not is_markin and emp_id not in existing:
+                result.message = "No check-in record found for today."
+                result.outcome = "rejected"
+                continue
+            image_path = self.face_service.save_face_image(detection, "checkin" if is_markin else "checkout", emp_id, face_index=i)
+            if is_markin:
+                rows.append((emp_id, timestamp, image_path))
+            else:
+                rows.append((emp_id, timestamp, image_path, date_today))
+            result.success = True
+            result.message = f"{'Checked in' if is_markin else 'Checked out'} {result.name} at {timestamp}"
+            result.outcome = "success"
+
+        if rows:
+            transaction_ids = None
+            try:
+                if offline:
+                    self._journal_rows(rows, is_markin, results)
+                else:
+                    with metrics.span("db_write"):
+                        if is_markin:
+                            transaction_ids = self.db.add_attendance_in_batch(rows)
+                        else:
+                            self.db.update_attendance_out_batch(rows)
+            except DatabaseUnavailableError:
+                if self.punch_journal is None:
+                    raise
+                self._journal_rows(rows, is_markin, results)
+            except Exception as e:
+                for result in results:
+                    if result.success:
+                        result.success = False
+                        result.message = f"Database error: {str(e)}"
+                        result.outcome = "db_error"
+            else:
+                if not offline:
+                    self._link_group_images(rows, is_markin, transaction_ids)
+
+        for result in results:
+            if result.employee_id is None:
+                self._save_failed_attempt("unidentified", detection, face_index=result.face_index)
+            metrics.increment("punch_outcomes_total", outcome=result.outcome)
+        return results, None
+
+    def _link_group_images(self, rows, is_markin, transaction_ids):
+        """Index each written punch's image against its transaction, as the single-face path does"""
+        image_store = self.face_service.image_store
+        if is_markin:
+            for (emp_id, timestamp, image_path), transaction_id in zip(rows, transaction_ids):
+                image_store.link_transaction(transaction_id, "in", image_path)
+        else:
+            for emp_id, timestamp, image_path, date_today in rows:
+                image_store.link_checkout(emp_id, date_today, image_path)
+
+    def _offline_existing(self, emp_ids, date_today, is_markin):
+        """Offline stand-in for get_existing_attendance
+
+        Check-ins are refused for employees known to have checked in today,
+        online or journaled; check-outs are always accepted, since replay only
+        closes an open check-in.
+        """
+        if is_markin:
+            return {emp_id for emp_id in emp_ids if self._checked_in_offline(emp_id, date_today)}
+        return set(emp_ids)
+
+    def _journal_rows(self, rows, is_markin, results):
+        """Write a group's punches to the journal in one durable batch"""
+        kind = "in" if is_markin else "out"
+        self.punch_journal.append_many([(kind, row[0], row[1], row[2]) for row in rows])
+        for result in results:
+            if result.success:
+                result.message += " (offline, will sync)"
+
+    def format_group_results(self, results):
+        """One line per face for display"""
+        return "\n".join(f"Face {r.face_index + 1}: {r.message}" for r in results)
+
+    def _handle_checkin(self, emp_id, name, timestamp, detection):
         """Handle employee check-in"""
         date_today = datetime.now().strftime("%Y-%m-%d")
         
-        # Check if already checked in today
-        existing_record = self.db.check_attendance_exists(emp_id, date_today)
-        if existing_record:
-            return False, "Attendance already marked for today."
-        
-        # Save image and add attendance record
-        output_dir = "C:\\Users\\kumar\\Desktop\\attend"
-        output_dir = os.path.join(output_dir, date_today)
-        
-        image_path = self.face_service.save_face_image(frame, face_recognition.face_locations(frame), emp_id, output_dir)
-        transaction_id = self.db.add_attendance_in(emp_id, timestamp, image_path)
+        image_path = None
+        try:
+            # Check if already checked in today
+            with metrics.span("db_read"):
+                existing_record = self.db.check_attendance_exists(emp_id, date_today)
+            if existing_record:
+                return False, "Attendance already marked for today."
+            
+            # Save image and add attendance record
+            image_path = self.face_service.save_face_image(detection, "checkin", emp_id)
+            with metrics.span("db_write"):
+                transaction_id = self.db.add_attendance_in(emp_id, timestamp, image_path)
+        except DatabaseUnavailableError:
+            if self.punch_journal is None:
+                raise
+            if self._checked_in_offline(emp_id, date_today):
+                return False, "Attendance already marked for today."
+            if image_path is None:
+                image_path = self.face_service.save_face_image(detection, "checkin", emp_id)
+            self.punch_journal.append("in", emp_id, timestamp, image_path)
+            return True, f"Checked in {name} at {timestamp} (offline, will sync)"
+        self.face_service.image_store.link_transaction(transaction_id, "in", image_path)
         
         return True, f"Checked in {name} at {timestamp}"
 
-    def _handle_checkout(self, emp_id, name, timestamp, date_today, frame, face_encoding):
+    def _handle_checkout(self, emp_id, name, timestamp, date_today, detection):
         """Handle employee check-out"""
-        # Check if there's a check-in record for today
-        existing_record = self.db.check_attendance_exists(emp_id, date_today)
-        if not existing_record:
-            return False, "No check-in record found for today."
-        
-        # Save checkout image
-        output_dir_out = "C:\\Users\\kumar\\Desktop\\attend"
-        output_dir_out = os.path.join(output_dir_out, date_today)
-        
-        image_path = self.face_service.save_face_image(frame, face_recognition.face_locations(frame), f"{emp_id}_out", output_dir_out)
-        self.db.update_attendance_out(emp_id, timestamp, image_path, date_today)
+        image_path = None
+        try:
+            # Check if there's a check-in record for today
+            with metrics.span("db_read"):
+                existing_record = self.db.check_attendance_exists(emp_id, date_today)
+            if not existing_record:
+                return False, "No check-in record found for today."
+            
+            # Save checkout image
+            image_path = self.face_service.save_face_image(detection, "checkout", emp_id)
+            with metrics.span("db_write"):
+                self.db.update_attendance_out(emp_id, timestamp, image_path, date_today)
+        except DatabaseUnavailableError:
+            if self.punch_journal is None:
+                raise
+            if image_path is None:
+                image_path = self.face_service.save_face_image(detection, "checkout", emp_id)
+            self.punch_journal.append("out", emp_id, timestamp, image_path)
+            return True, f"Checked out {name} at {timestamp} (offline, will sync)"
+        self.face_service.image_store.link_checkout(emp_id, date_today, image_path)
         
         return True, f"Checked out {name} at {timestamp}"
 
-    def _save_failed_attempt(self, emp_id, frame, face_encoding):
+    def _save_failed_attempt(self, emp_id, detection, face_index=0):
         """Save failed attendance attempt image"""
-        output_dir = "C:\\Users\\kumar\\Desktop\\failed_attempts"
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        output_dir = os.path.join(output_dir, emp_id)
-        
-        self.face_service.save_face_image(frame, face_recognition.face_locations(frame), timestamp, output_dir)
+        self.face_service.save_face_image(detection, "failed", emp_id, face_index=face_index)
+
+    def count_attendance(self, selected_department, start_date, end_date, employee_filter=None):
+        """Number of attendance rows for a department and date range, for the paged grid"""
+        start_datetime, end_datetime = self._date_range(start_date, end_date)
+        return self.db.count_attendance_records(selected_department, start_datetime, end_datetime, employee_filter)
+
+    def get_attendance_page(self, selected_department, start_date, end_date, offset, limit,
+                            sort_key="date", descending=False, employee_filter=None):
+        """One window of display rows, sorted and filtered by the database"""
+        start_datetime, end_datetime = self._date_range(start_date, end_date)
+        records = self.db.get_attendance_page(selected_department, start_datetime, end_datetime, offset, limit,
+                                              sort_key, descending, employee_filter)
+        return [self._display_row(record) for record in records]
+
+    def _date_range(self, start_date, end_date):
+        start_datetime = datetime.combine(start_date, datetime.min.time())
+        end_datetime = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1)
+        return start_datetime, end_datetime
 
-    def get_attendance_records(self, selected_department, start_date, end_date):
-        """Get attendance records for a department within date range"""
+    def _display_row(self, record):
+        day, emp_id, emp_name, checkin_time, checkout_time, worktime = record
+        checkin_display = checkin_time.strftime('%H:%M:%S') if checkin_time else "N/A"
+        checkout_display = checkout_time.strftime('%H:%M:%S') if checkout_time else "N/A"
+        worktime_display = str(worktime) if worktime else "N/A"
+        return (day.strftime('%Y-%m-%d'), emp_id, emp_name, checkin_display, checkout_display, worktime_display)
+
+    def export_attendance(self, selected_department, start_date, end_date, chunk_size=5000):
+        """Ask for a file and stream a department's attendance for the date range into it
+
+        Rows are read from the database and written `chunk_size` at a time on
+        a background thread, so memory stays flat however long the range.
+        Returns the running ExportJob, or None if nothing was exported.
+        """
+        start_datetime, end_datetime = self._date_range(start_date, end_date)
         try:
-            start_datetime = datetime.combine(start_date, datetime.min.time())
-            end_datetime = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1)
-            
-            export_records = self.db.get_attendance_records(selected_department, start_datetime, end_datetime)
-            
-            # Generate full date range for display
-            attendance_display_data = []
-            full_date_range = [start_datetime + timedelta(days=i) for i in range((end_datetime - start_datetime).days)]
-
-            for single_date in full_date_range:
-                date_str = single_date.strftime('%Y-%m-%d')
-                daily_records = self.db.get_daily_attendance_records(selected_department, single_date.date())
-                
-                if daily_records:
-                    for record in daily_records:
-                        emp_id, emp_name, checkin_time, checkout_time, worktime = record
-                        
-                        checkin_display = checkin_time.strftime('%H:%M:%S') if checkin_time else "N/A"
-                        checkout_display = checkout_time.strftime('%H:%M:%S') if checkout_time else "N/A"
-                        worktime_display = str(worktime) if worktime else "N/A"
-                        
-                        attendance_display_data.append((date_str, emp_id, emp_name, checkin_display, checkout_display, worktime_display))
-                else:
-                    attendance_display_data.append((date_str, "No records", "", "", "", ""))
-            
-            return attendance_display_data, export_records
-            
+            total_rows = self.db.count_attendance_records(selected_department, start_datetime, end_datetime)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to fetch attendance data: {str(e)}")
-            return [], []
-
-    def export_attendance_to_excel(self, records):
-        """Export attendance records to Excel file"""
-        if not records:
+            return None
+        if not total_rows:
             messagebox.showerror("Error", "No data available to export.")
-            return False
+            return None
         
-        df = pd.DataFrame(records, columns=['Date', 'Employee ID', 'Name', 'Checkin Time', 'Checkout Time', 'Worked For'])
+        # Formats whose package is missing are left out of the dialog
+        file_path = filedialog.asksaveasfilename(defaultextension=f".{available_formats()[0]}", filetypes=file_types())
+        if not file_path:
+            return None
+        try:
+            export_format(file_path)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return None
         
-        file_path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")])
-        if file_path:
-            try:
-                df.to_excel(file_path, index=False)
-                messagebox.showinfo("Success", f"Attendance data has been exported to {file_path}")
-                return True
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to export data: {str(e)}")
-                return False
-        return False
\ No newline at end of file
+        chunks = self.db.iter_attendance_records(selected_department, start_datetime, end_datetime, chunk_size)
+        return ExportJob(chunks, file_path, total_rows).start()
\ No newline at end of file
@@ -0,0 +1,299 @@
+"""
+Benchmark Module
+Headless punch-path benchmark with synthetic or recorded frames and a local SQLite stand-in
+
+Run `python benchmark.py --output bench.json` to time each stage of a punch
+(capture, detection, encoding, matching, database write, image write), 1:1
+and 1:N matching throughput at several gallery sizes, and recall@1 against
+latency of the IVF index for several probe counts. Pass `--baseline` with an
+earlier results file to print the change per stage.
+"""
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+DEFAULT_GALLERY_SIZES = (1000, 10000, 100000)
+DEFAULT_ANN_SIZES = (100000,)
+DEFAULT_ANN_PROBES = (1, 2, 4, 8, 16, 32, 64)
+
+
+def summarize(samples):
+    """count, mean and p50/p95/p99 in milliseconds for a list of durations in seconds"""
+    if not samples:
+        return {"count": 0}
+    millis = np.asarray(samples, dtype=np.float64) * 1000.0
+    summary = {"count": len(samples), "mean_ms": float(millis.mean())}
+    for p, value in zip(PERCENTILES, np.percentile(millis, PERCENTILES)):
+        summary[f"p{p}_ms"] = float(value)
+    return summary
+
+
+def timed(samples, func, *args):
+    """Call func(*args), append its duration to `samples` and return its result"""
+    started = time.perf_counter()
+    result = func(*args)
+    samples.append(time.perf_counter() - started)
+    return result
+
+
+def synthetic_gallery(size, seed=0):
+    """(employee_ids, encodings) shaped like dlib encodings: 128-d, entries around +-0.1"""
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0.0, 0.09, (size, 128))
+    return [str(i) for i in range(size)], encodings
+
+
+def bench_matching(face_service, gallery_sizes, iterations=200, seed=0):
+    """1:1 (compare_faces against one claimed employee) and 1:N (gallery identification) per gallery size"""
+    from face_gallery import FaceGallery
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in gallery_sizes:
+        employee_ids, encodings = synthetic_gallery(size, seed)
+        gallery = FaceGallery(face_service.FACE_DISTANCE_THRESHOLD, face_service.gallery.min_margin)
+        gallery.load((emp_id, f"Employee {emp_id}", encoding.tobytes())
+                     for emp_id, encoding in zip(employee_ids, encodings))
+        claimed = rng.integers(0, size, iterations)
+        probes = encodings[claimed] + rng.normal(0.0, 0.02, (iterations, 128))
+
+        for mode in ("1:1", "1:N"):
+            samples = []
+            for i in range(iterations):
+                if mode == "1:1":
+                    _, known = gallery.get(employee_ids[claimed[i]])
+                    timed(samples, face_service.compare_faces, known, probes[i], employee_ids[claimed[i]])
+                else:
+                    timed(samples, gallery.identify_batch, probes[i:i + 1])
+            summary = summarize(samples)
+            summary.update(mode=mode, gallery_size=size, ops_per_second=len(samples) / sum(samples))
+            results.append(summary)
+            print(f"  {mode} @ {size:>7}: {summary['ops_per_second']:>10.0f} ops/s, p99 {summary['p99_ms']:.3f} ms")
+    return results
+
+
+def bench_ann(gallery_sizes, probe_counts, iterations=200, encoding_format="float32", seed=0):
+    """recall@1 and latency of IVF identification per probe count, against exact search on the same gallery
+
+    Recall@1 is the share of queries whose best match equals the exhaustive
+    scan's. Queries are enrolled encodings with capture noise added.
+    """
+    from face_gallery import FaceGallery
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in gallery_sizes:
+        employee_ids, encodings = synthetic_gallery(size, seed)
+        names = [f"Employee {emp_id}" for emp_id in employee_ids]
+        exact = FaceGallery(encoding_format=encoding_format)
+        exact.load_arrays(employee_ids, names, encodings)
+        started = time.perf_counter()
+        approximate = FaceGallery(encoding_format=encoding_format, ann_min_size=0)
+        approximate.load_arrays(employee_ids, names, encodings)
+        build_seconds = time.perf_counter() - started
+        lists = len(approximate.index.lists)
+
+        claimed = rng.integers(0, size, iterations)
+        probes = encodings[claimed] + rng.normal(0.0, 0.02, (iterations, 128))
+        samples, truth = [], []
+        for probe in probes:
+            truth.append(timed(samples, exact.identify, probe).employee_id)
+        summary = summarize(samples)
+        summary.update(mode="exact", gallery_size=size, recall_at_1=1.0)
+        results.append(summary)
+        print(f"  exact     @ {size:>7}: p50 {summary['p50_ms']:.3f} ms, p99 {summary['p99_ms']:.3f} ms")
+
+        for probe_count in probe_counts:
+            approximate.ann_probes = probe_count
+            samples, hits = [], 0
+            for probe, expected in zip(probes, truth):
+                hits += timed(samples, approximate.identify, probe).employee_id == expected
+            summary = summarize(samples)
+            summary.update(mode="ivf", gallery_size=size, lists=lists, n_probes=probe_count,
+                           build_seconds=build_seconds, recall_at_1=hits / len(probes))
+            results.append(summary)
+            print(f"  ivf {probe_count:>5} @ {size:>7}: recall@1 {summary['recall_at_1']:.4f}, "
+                  f"p50 {summary['p50_ms']:.3f} ms, p99 {summary['p99_ms']:.3f} ms")
+    return results
+
+
+def bench_stages(face_service, db, iterations=50):
+    """Per-stage latency of the punch path, each stage timed on its own"""
+    import face_recognition
+
+    stages = {name: [] for name in ("capture", "detection", "encoding", "matching", "db_write", "image_write")}
+    dept_id = db.get_department_id_by_name("Benchmark")
+    known = None
+    for i in range(iterations):
+        frames = timed(stages["capture"], face_service.camera.recent_frames, face_service.quality_frames)
+        if not frames:
+            raise RuntimeError(face_service.camera.last_error or "No frames from the camera source")
+        frame = frames[0]
+
+        rgb_small_frame = face_service.downscale(frame)
+        face_locations = timed(stages["detection"], face_recognition.face_locations, rgb_small_frame)
+        if not face_locations:
+            # Synthetic frames have no face; encode the centre of the frame so the stage is still timed
+            height, width = rgb_small_frame.shape[:2]
+            side = min(height, width) // 2
+            top, left = (height - side) // 2, (width - side) // 2
+            face_locations = [(top, left + side, top + side, left)]
+        encodings = timed(stages["encoding"], face_recognition.face_encodings, rgb_small_frame, face_locations[:1])
+        encoding = encodings[0]
+
+        if known is None:
+            known = encoding
+        timed(stages["matching"], face_service.compare_faces, known, encoding)
+
+        emp_id = f"bench-{i}"
+        db.add_employee(emp_id, f"Benchmark {i}", dept_id, "Benchmark", encoding.tobytes())
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timed(stages["db_write"], db.add_attendance_in, emp_id, now, None)
+
+        # Unique pixels per sample, so the content-addressed store writes every image
+        crop = np.ascontiguousarray(frame[:128, :128]).copy()
+        crop.reshape(-1)[:8] = np.frombuffer(np.int64(i).tobytes(), dtype=np.uint8)
+        started = time.perf_counter()
+        face_service.image_store.put("checkin", crop, emp_id)
+        face_service.image_writer.flush()
+        stages["image_write"].append(time.perf_counter() - started)
+    return {name: summarize(samples) for name, samples in stages.items()}
+
+
+def bench_punches(attendance_service, db, encoding, iterations=50):
+    """End-to-end mark_attendance latency; every punch is a fresh employee's check-in"""
+    dept_id = db.get_department_id_by_name("Benchmark")
+    samples, outcomes = [], {}
+    for i in range(iterations):
+        emp_id = f"punch-{i}"
+        db.add_employee(emp_id, f"Punch {i}", dept_id, "Benchmark", encoding.tobytes())
+        success, message = timed(samples, attendance_service.mark_attendance, emp_id, True)
+        outcome = "success" if success else message
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    summary = summarize(samples)
+    summary["outcomes"] = outcomes
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Lines showing the p50/p99 change per stage and matching mode against a baseline results file"""
+    lines = [f"{'stage':<24} {'p50 ms':>10} {'was':>10} {'p99 ms':>10} {'was':>10}"]
+
+    def row(name, current, previous):
+        if current.get("count") and previous and previous.get("count"):
+            lines.append(f"{name:<24} {current['p50_ms']:>10.3f} {previous['p50_ms']:>10.3f} "
+                         f"{current['p99_ms']:>10.3f} {previous['p99_ms']:>10.3f}")
+
+    for name, current in results.get("stages", {}).items():
+        row(name, current, baseline.get("stages", {}).get(name))
+    if "punch" in results:
+        row("punch", results["punch"], baseline.get("punch"))
+    previous_matching = {(m["mode"], m["gallery_size"]): m for m in baseline.get("matching", [])}
+    for current in results.get("matching", []):
+        row(f"{current['mode']} @ {current['gallery_size']}", current,
+            previous_matching.get((current["mode"], current["gallery_size"])))
+    previous_ann = {(a["mode"], a["gallery_size"], a.get("n_probes")): a for a in baseline.get("ann", [])}
+    for current in results.get("ann", []):
+        name = f"{current['mode']} {current['n_probes']}" if "n_probes" in current else current["mode"]
+        name = f"{name} @ {current['gallery_size']}"
+        row(name, current, previous_ann.get((current["mode"], current["gallery_size"], current.get("n_probes"))))
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the punch path without a webcam or MySQL")
+    parser.add_argument("--frames", default="synthetic",
+                        help="camera_source to replay: an image, image directory, video file or synthetic[:WxH]")
+    parser.add_argument("--iterations", type=int, default=50, help="samples per stage")
+    parser.add_argument("--match-iterations", type=int, default=200, help="samples per matching mode and gallery size")
+    parser.add_argument("--gallery-sizes", default=",".join(str(n) for n in DEFAULT_GALLERY_SIZES))
+    parser.add_argument("--ann-sizes", default=",".join(str(n) for n in DEFAULT_ANN_SIZES),
+                        help="gallery sizes for the IVF recall/latency benchmark")
+    parser.add_argument("--ann-probes", default=",".join(str(n) for n in DEFAULT_ANN_PROBES),
+                        help="IVF lists scanned per query")
+    parser.add_argument("--skip-ann", action="store_true", help="skip the IVF recall/latency benchmark")
+    parser.add_argument("--skip-stages", action="store_true", help="only benchmark matching")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="earlier results file to compare with")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="attendance-bench-")
+    # Everything the services write goes to the scratch directory, and no calibrated thresholds apply
+    os.environ.update(image_store_root=os.path.join(workdir, "images"),
+                      threshold_file=os.path.join(workdir, "thresholds.json"))
+
+    from camera_service import CameraSession
+    from face_recognition_service import FaceRecognitionService
+
+    face_service = FaceRecognitionService(CameraSession(args.frames))
+    results = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "frames": args.frames,
+    }
+    try:
+        if not args.skip_stages:
+            from attendance_service import AttendanceService
+            from sqlite_storage import SQLiteStorage
+
+            db = SQLiteStorage(os.path.join(workdir, "attendance.sqlite3"), departments=["Benchmark"])
+            print(f"Timing punch stages over {args.iterations} frames from {args.frames}")
+            results["stages"] = bench_stages(face_service, db, args.iterations)
+            detection, error = face_service.process_attendance_image(None)
+            if detection is not None:
+                results["punch"] = bench_punches(AttendanceService(db, face_service), db,
+                                                 detection.face_encoding, args.iterations)
+            else:
+                print(f"Skipping end-to-end punches: {error}")
+            db.close()
+
+        sizes = [int(size) for size in args.gallery_sizes.split(",") if size.strip()]
+        print(f"Timing matching at gallery sizes {sizes}")
+        results["matching"] = bench_matching(face_service, sizes, args.match_iterations)
+        if not args.skip_ann:
+            ann_sizes = [int(size) for size in args.ann_sizes.split(",") if size.strip()]
+            probe_counts = [int(count) for count in args.ann_probes.split(",") if count.strip()]
+            print(f"Timing IVF recall@1 against exact search at gallery sizes {ann_sizes}")
+            results["ann"] = bench_ann(ann_sizes, probe_counts, args.match_iterations,
+                                       face_service.gallery.encoding_format)
+    finally:
+        face_service.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    for name, summary in results.get("stages", {}).items():
+        print(f"{name:<12} p50 {summary['p50_ms']:>9.3f} ms  p95 {summary['p95_ms']:>9.3f} ms  p99 {summary['p99_ms']:>9.3f} ms")
+    if "punch" in results:
+        punch = results["punch"]
+        print(f"{'punch':<12} p50 {punch['p50_ms']:>9.3f} ms  p95 {punch['p95_ms']:>9.3f} ms  p99 {punch['p99_ms']:>9.3f} ms")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(compare(results, json.load(f)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Camera Service Module
+Handles the long-lived camera session shared by attendance and registration
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+import metrics
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class DeviceFrameSource:
+    """Frames from a local capture device (webcam)"""
+    def __init__(self, device_index=0):
+        self.device_index = device_index
+        self.cap = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.device_index)
+        return self.cap.isOpened()
+
+    def read(self):
+        return self.cap.read()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class FileFrameSource:
+    """Frames replayed from an image, a directory of images or a video file"""
+    def __init__(self, path, loop=True):
+        self.path = path
+        self.loop = loop
+        self.images = []
+        self.index = 0
+        self.cap = None
+
+    def open(self):
+        self.index = 0
+        if os.path.isdir(self.path):
+            names = sorted(n for n in os.listdir(self.path) if n.lower().endswith(IMAGE_EXTENSIONS))
+            self.images = [cv2.imread(os.path.join(self.path, n)) for n in names]
+            self.images = [img for img in self.images if img is not None]
+            return len(self.images) > 0
+        if self.path.lower().endswith(IMAGE_EXTENSIONS):
+            image = cv2.imread(self.path)
+            self.images = [image] if image is not None else []
+            return len(self.images) > 0
+        self.cap = cv2.VideoCapture(self.path)
+        return self.cap.isOpened()
+
+    def read(self):
+        if self.cap is not None:
+            ret, frame = self.cap.read()
+            if not ret and self.loop:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self.cap.read()
+            return ret, frame
+
+        if self.index >= len(self.images):
+            if not self.loop or not self.images:
+                return False, None
+            self.index = 0
+        frame = self.images[self.index]
+        self.index += 1
+        return True, frame.copy()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class SyntheticFrameSource:
+    """Frames produced in-process, for headless runs and tests
+
+    `generator` may be a callable returning a BGR frame (or None when
+    exhausted), a single frame that is repeated, or None for random noise.
+    """
+    def __init__(self, generator=None, width=640, height=480):
+        self.generator = generator
+        self.width = width
+        self.height = height
+        self.rng = np.random.default_rng()
+
+    def open(self):
+        return True
+
+    def read(self):
+        if self.generator is None:
+            frame = self.rng.integers(0, 256, (self.height, self.width, 3), dtype=np.uint8)
+        elif callable(self.generator):
+            frame = self.generator()
+        else:
+            frame = self.generator.copy()
+        return frame is not None, frame
+
+    def release(self):
+        pass
+
+
+def create_frame_source(source):
+    """Build a frame source from a device index, path, 'synthetic[:WxH]' spec, frame or callable"""
+    if hasattr(source, "read") and hasattr(source, "open"):
+        return source
+    if isinstance(source, np.ndarray) or callable(source):
+        return SyntheticFrameSource(source)
+    if isinstance(source, int):
+        return DeviceFrameSource(source)
+
+    source = str(source).strip()
+    if source.isdigit():
+        return DeviceFrameSource(int(source))
+    if source.startswith("synthetic"):
+        width, height = 640, 480
+        if ":" in source:
+            width, height = (int(v) for v in source.split(":", 1)[1].lower().split("x"))
+        return SyntheticFrameSource(width=width, height=height)
+    return FileFrameSource(source)
+
+
+class CameraSession:
+    """Long-lived camera owned by the face recognition service
+
+    A background grabber thread keeps reading from the frame source and
+    holds the most recent frames in a small ring buffer, so callers get the
+    freshest frame without paying for opening the device on every punch.
+    Frames in the buffer are shared and must not be modified in place.
+    """
+    def __init__(self, source=0, buffer_size=5, warmup_frames=5, frame_interval=None, reopen_delay=1.0):
+        self.source = create_frame_source(source)
+        self.buffer = deque(maxlen=buffer_size)
+        self.warmup_frames = warmup_frames
+        # Device reads block until the next frame; replayed sources are paced instead
+        if frame_interval is None:
+            frame_interval = 0.0 if isinstance(self.source, DeviceFrameSource) else 1.0 / 30
+        self.frame_interval = frame_interval
+        self.reopen_delay = reopen_delay
+        self.frame_count = 0
+        self.last_error = None
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start the background grabber thread if it is not already running"""
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+            self.thread = threading.Thread(target=self._grab_loop, name="camera-grabber", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop the grabber thread and release the device"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+        with self.condition:
+            self.buffer.clear()
+
+    def is_running(self):
+        return self.running
+
+    @property
+    def buffer_size(self):
+        """Most frames recent_frames() can return"""
+        return self.buffer.maxlen
+
+    def get_latest_frame(self):
+        """Return (ret, frame) for the freshest buffered frame without blocking"""
+        with self.condition:
+            if not self.buffer:
+                return False, None
+            return True, self.buffer[-1][1]
+
+    def read(self, timeout=3.0):
+        """Return the freshest frame, waiting up to `timeout` only if none is buffered yet"""
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while not self.buffer and self.running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            if not self.buffer:
+                return False, None
+            return True, self.buffer[-1][1]
+
+    def recent_frames(self, count=None, timeout=3.0):
+        """Up to `count` buffered frames, newest first, waiting up to `timeout` only if none is buffered yet"""
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while not self.buffer and self.running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            frames = [frame for _, frame in reversed(self.buffer)]
+        return frames[:count] if count is not None else frames
+
+    def read_new(self, last_count=0, timeout=3.0):
+        """Return (ret, frame, frame_count) for a frame newer than `last_count`, waiting up to `timeout`
+
+        Used for bursts, where reading the same buffered frame twice would
+        give duplicate samples.
+        """
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while (not self.buffer or self.frame_count <= last_count) and self.running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            if not self.buffer or self.frame_count <= last_count:
+                return False, None, self.frame_count
+            return True, self.buffer[-1][1], self.frame_count
+
+    def _grab_loop(self):
+        """Background loop: (re)open the source and keep the ring buffer filled"""
+        while self.running:
+            with metrics.span("camera_open"):
+                opened = self._open_source()
+            if not opened:
+                time.sleep(self.reopen_delay)
+                continue
+
+            skipped = 0
+            while self.running:
+                ret, frame = self.source.read()
+                if not ret or frame is None:
+                    self.last_error = "Failed to read frame from camera."
+                    break
+                if skipped < self.warmup_frames:
+                    # First frames after opening are often underexposed
+                    skipped += 1
+                    continue
+
+                with self.condition:
+                    self.frame_count += 1
+                    self.buffer.append((time.monotonic(), frame))
+                    self.condition.notify_all()
+                if self.frame_interval:
+                    time.sleep(self.frame_interval)
+
+            self.source.release()
+            if self.running:
+                time.sleep(self.reopen_delay)
+        self.source.release()
+
+    def _open_source(self):
+        try:
+            if self.source.open():
+                self.last_error = None
+                return True
+            self.last_error = "Failed to access camera."
+        except Exception as e:
+            self.last_error = f"Failed to access camera: {str(e)}"
+        self.source.release()
+        return False
@@ -0,0 +1,135 @@
+"""
+Dashboard Service Module
+Keeps today's per-department attendance counters in memory for the admin dashboard
+"""
+import threading
+from datetime import date
+
+
+class DashboardAggregates:
+    """Per-department present/total counters for today
+
+    Counters are updated from storage change events as punches and
+    registrations succeed, and periodically reconciled against the database
+    to correct any drift. Reading the dashboard costs O(departments).
+    """
+    def __init__(self, database_service, reconcile_interval=300):
+        self.db = database_service
+        self.reconcile_interval = reconcile_interval
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.day = None
+        self.department_names = {}   # dept_id -> description (active departments only)
+        self.employee_departments = {}   # emp_id -> dept_id (active employees only)
+        self.present = {}   # dept_id -> set of emp_ids checked in today
+        self.pending_events = None
+        self.timer = None
+        self.db.add_change_listener(self.on_database_change)
+
+    def start(self):
+        """Load the counters and schedule periodic reconciliation"""
+        if not self.loaded:
+            self.reconcile()
+        if self.timer is None and self.reconcile_interval:
+            self._schedule()
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def reconcile(self):
+        """Rebuild the counters from the database"""
+        with self.lock:
+            self.pending_events = []
+        try:
+            today = date.today()
+            department_names = dict(self.db.get_active_departments_with_ids())
+            employee_departments = {str(emp_id): dept_id for emp_id, dept_id in self.db.get_active_employee_departments()}
+            present_ids = self.db.get_present_employee_ids(today)
+        except Exception:
+            with self.lock:
+                self.pending_events = None
+            raise
+
+        present = {dept_id: set() for dept_id in department_names}
+        for emp_id in present_ids:
+            dept_id = employee_departments.get(str(emp_id))
+            if dept_id in present:
+                present[dept_id].add(str(emp_id))
+
+        with self.lock:
+            events, self.pending_events = self.pending_events, None
+            self.day = today
+            self.department_names = department_names
+            self.employee_departments = employee_departments
+            self.present = present
+            self.loaded = True
+            # Events that raced with the reload are applied on top of it
+            for event, args in events:
+                self._apply(event, *args)
+
+    def on_database_change(self, event, *args):
+        """Storage change listener; applies successful writes to the counters"""
+        with self.lock:
+            if self.pending_events is not None:
+                self.pending_events.append((event, args))
+            if self.loaded:
+                self._apply(event, *args)
+
+    def get_dashboard_data(self):
+        """(total_employees, attendance_rate, [(dept, present_count, percentage)]) from memory"""
+        self.start()
+        with self.lock:
+            self._roll_over_day()
+            totals = {dept_id: 0 for dept_id in self.department_names}
+            for dept_id in self.employee_departments.values():
+                if dept_id in totals:
+                    totals[dept_id] += 1
+
+            total_employees = len(self.employee_departments)
+            present_count = sum(len(ids) for ids in self.present.values())
+            attendance_rate = (present_count / total_employees) * 100 if total_employees else 0
+            attendance_data = [
+                (self.department_names[dept_id], len(self.present[dept_id]),
+                 (len(self.present[dept_id]) / totals[dept_id]) * 100 if totals[dept_id] > 0 else 0)
+                for dept_id in self.department_names
+            ]
+        return total_employees, attendance_rate, attendance_data
+
+    def _apply(self, event, *args):
+        self._roll_over_day()
+        if event in ("attendance_in", "attendance_out"):
+            for emp_id in args[0]:
+                dept_id = self.employee_departments.get(str(emp_id))
+                if dept_id in self.present:
+                    self.present[dept_id].add(str(emp_id))
+        elif event == "employee_added":
+            emp_id, dept_id = args
+            self.employee_departments[str(emp_id)] = dept_id
+        elif event == "employee_active":
+            emp_id, active = args
+            if not active:
+                dept_id = self.employee_departments.pop(str(emp_id), None)
+                if dept_id in self.present:
+                    self.present[dept_id].discard(str(emp_id))
+
+    def _roll_over_day(self):
+        today = date.today()
+        if self.day != today:
+            self.day = today
+            self.present = {dept_id: set() for dept_id in self.department_names}
+
+    def _schedule(self):
+        self.timer = threading.Timer(self.reconcile_interval, self._on_timer)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _on_timer(self):
+        try:
+            self.reconcile()
+        except Exception as e:
+            print(f"Dashboard reconcile failed: {e}")
+        finally:
+            if self.timer is not None:
+                self._schedule()
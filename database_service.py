@@ -1,185 +1,653 @@
 """
 Database Service Module
-Handles all database operations for the Biometric Attendance System
+MySQL storage backend for the Biometric Attendance System
 """
 import mysql.connector
+from mysql.connector import pooling
 import os
-from dotenv import load_dotenv
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
 import bcrypt
 
-class DatabaseService:
+from storage_backend import (StorageBackend, StorageError, IntegrityError, DatabaseUnavailableError,
+                             day_bounds, like_pattern, attendance_order_by)
+
+# (table, index name, columns) managed by initialize_tables
+INDEXES = [
+    ("employee_transactions", "idx_et_employee_in_time", "et_employee_id, et_employee_in_time"),
+    ("employee_transactions", "idx_et_in_time", "et_employee_in_time"),
+    ("employee_master", "idx_em_dept_active", "em_employee_dept, em_employee_active"),
+    ("employee_master", "idx_em_updated_at", "em_updated_at"),
+    ("department_master", "idx_dm_dept_desc", "dm_dept_desc"),
+]
+
+class DatabaseService(StorageBackend):
+    # Hot queries, shared with explain_hot_queries so the EXPLAIN check covers the SQL that actually runs
+    CHECK_ATTENDANCE_SQL = """
+        SELECT * FROM employee_transactions
+        WHERE et_employee_id=%s
+          AND et_employee_in_time >= %s AND et_employee_in_time < %s
+          AND et_employee_out_time >= %s AND et_employee_out_time < %s
+    """
+
+    UPDATE_ATTENDANCE_OUT_SQL = """
+        UPDATE employee_transactions 
+        SET et_employee_out_time=%s, et_employee_out_imgpth=%s, et_worktime = TIMEDIFF(et_employee_out_time, et_employee_in_time) 
+        WHERE et_employee_id=%s AND et_employee_in_time >= %s AND et_employee_in_time < %s AND et_employee_out_time IS NULL
+    """
+
+    ATTENDANCE_RECORDS_SQL = '''
+        SELECT DATE(et.et_employee_in_time), et.et_employee_id, em.em_employee_name, et.et_employee_in_time, et.et_employee_out_time, et.et_worktime
+        FROM employee_transactions et
+        JOIN employee_master em ON et.et_employee_id = em.em_employee_id
+        JOIN department_master d ON em.em_employee_dept = d.dm_dept_id
+        WHERE d.dm_dept_desc = %s AND et.et_employee_in_time >= %s AND et.et_employee_in_time < %s
+        ORDER BY et.et_employee_in_time
+    '''
+
+    ATTENDANCE_PAGE_COLUMNS = """
+        SELECT DATE(et.et_employee_in_time), et.et_employee_id, em.em_employee_name, et.et_employee_in_time, et.et_employee_out_time, et.et_worktime
+    """
+
+    DAILY_ATTENDANCE_SQL = '''
+        SELECT et.et_employee_id, em.em_employee_name, et.et_employee_in_time, et.et_employee_out_time, et.et_worktime
+        FROM employee_transactions et
+        JOIN employee_master em ON et.et_employee_id = em.em_employee_id
+        JOIN department_master d ON em.em_employee_dept = d.dm_dept_id
+        WHERE d.dm_dept_desc = %s AND et.et_employee_in_time >= %s AND et.et_employee_in_time < %s
+    '''
+
+    ATTENDANCE_BY_DEPARTMENT_SQL = """ 
+        SELECT 
+            dm.dm_dept_desc AS department_desc,
+            COUNT(em.em_employee_id) AS employee_count,
+            COUNT(DISTINCT et.et_employee_id) AS attendance_count
+        FROM 
+            department_master dm
+        LEFT JOIN 
+            employee_master em ON dm.dm_dept_id = em.em_employee_dept AND em.em_employee_active = 1
+        LEFT JOIN 
+            employee_transactions et ON em.em_employee_id = et.et_employee_id 
+            AND et.et_employee_in_time >= CURRENT_DATE AND et.et_employee_in_time < CURRENT_DATE + INTERVAL 1 DAY
+        WHERE 
+            dm.dm_dept_active = 1
+        GROUP BY 
+            dm.dm_dept_desc
+    """
+
+    ATTENDANCE_RATE_SQL = """ 
+        SELECT 
+            (SELECT COUNT(DISTINCT et_employee_id) 
+            FROM employee_transactions 
+            WHERE et_employee_in_time >= CURRENT_DATE AND et_employee_in_time < CURRENT_DATE + INTERVAL 1 DAY) / 
+            (SELECT COUNT(*) 
+            FROM employee_master 
+            WHERE em_employee_active = 1) * 100 AS attendance_rate
+    """
+
     def __init__(self):
-        load_dotenv()
+        super().__init__()
         self.host = os.getenv("host")
         self.user = os.getenv("user")
         self.password = os.getenv("password")
         self.database = os.getenv("database")
-        self.conn = None
-        self.cursor = None
-        self.connect()
-        self.initialize_tables()
+        self.pool_size = int(os.getenv("pool_size", "5"))
+        self.pool_timeout = float(os.getenv("pool_timeout", "10"))
+        self.connect_timeout = int(os.getenv("db_connect_timeout", "5"))
+        self.reconnect_interval = float(os.getenv("db_reconnect_interval", "5"))
+        self.pool = None
+        # Serializes connect and go-offline transitions; borrows read self.pool once, without it
+        self.pool_lock = threading.RLock()
+        self.tables_initialized = False
+        self.next_connect_attempt = 0.0
+        try:
+            self.connect()
+        except (mysql.connector.Error, StorageError) as err:
+            # Start offline; punches go to the local journal and the pool is
+            # created on the first successful borrow
+            print(f"Database unavailable at startup: {err}")
 
     def connect(self):
-        """Establish database connection"""
-        self.conn = mysql.connector.connect(
-            host=self.host,
-            user=self.user,
-            password=self.password,
-            database=self.database
-        )
-        self.cursor = self.conn.cursor()
+        """Create the database connection pool and initialize tables on first connect"""
+        with self.pool_lock:
+            self.pool = pooling.MySQLConnectionPool(
+                pool_name=f"attendance_{id(self)}",
+                pool_size=self.pool_size,
+                pool_reset_session=True,
+                connection_timeout=self.connect_timeout,
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database
+            )
+            if not self.tables_initialized:
+                self.tables_initialized = True
+                try:
+                    self.initialize_tables()
+                except Exception:
+                    # Leave no half-initialized pool behind; the next borrow connects again
+                    self.tables_initialized = False
+                    self.pool = None
+                    raise
+                self.report_index_usage()
+
+    def is_available(self):
+        """True if a connection can be borrowed right now"""
+        try:
+            self._get_connection().close()
+            return True
+        except StorageError:
+            # Unreachable, or every pooled connection stayed busy past pool_timeout
+            return False
+
+    def _get_connection(self):
+        """Borrow a pooled connection, waiting for one to free up and reconnecting it if it went stale"""
+        # One read: another thread may drop self.pool at any moment
+        pool = self.pool
+        if pool is None:
+            pool = self._reconnect()
+        deadline = time.monotonic() + self.pool_timeout
+        while True:
+            try:
+                conn = pool.get_connection()
+                break
+            except mysql.connector.errors.PoolError as err:
+                if time.monotonic() >= deadline:
+                    raise StorageError(f"No pooled connection became free within {self.pool_timeout}s") from err
+                time.sleep(0.05)
+
+        try:
+            # Health check on borrow; one reconnect attempt for a connection the server dropped
+            conn.ping(reconnect=True, attempts=1, delay=0)
+        except mysql.connector.Error as err:
+            try:
+                conn.close()
+            except mysql.connector.Error:
+                pass
+            # The server is gone: fail fast until reconnect_interval has passed instead of
+            # paying for another health check on every borrow
+            self._go_offline(pool)
+            raise DatabaseUnavailableError(str(err)) from err
+        return conn
+
+    def _reconnect(self):
+        """Pool to borrow from while self.pool is None: one thread connects, the others wait and share it"""
+        with self.pool_lock:
+            if self.pool is not None:
+                return self.pool
+            # While offline, only try to reconnect every reconnect_interval seconds
+            if time.monotonic() < self.next_connect_attempt:
+                raise DatabaseUnavailableError("Database is offline.")
+            try:
+                self.connect()
+            except DatabaseUnavailableError:
+                self._go_offline()
+                raise
+            except (mysql.connector.Error, StorageError) as err:
+                self._go_offline()
+                raise DatabaseUnavailableError(str(err)) from err
+            return self.pool
+
+    def _go_offline(self, pool=None):
+        """Drop the pool; borrows raise DatabaseUnavailableError at once until the next reconnect attempt
+
+        With `pool`, only if it is still the current one, so a failure seen on
+        an old pool does not drop one another thread has just connected.
+        """
+        with self.pool_lock:
+            if pool is not None and self.pool is not pool:
+                return
+            self.pool = None
+            self.next_connect_attempt = time.monotonic() + self.reconnect_interval
+
+    @contextmanager
+    def _cursor(self, commit=False):
+        """Cursor on a connection borrowed for the duration of the block
+
+        Commits on success when `commit` is set, rolls back on error and
+        always hands the connection back to the pool. Driver errors are
+        raised as the storage_backend exception types.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            if commit:
+                conn.commit()
+        except Exception as err:
+            try:
+                conn.rollback()
+            except mysql.connector.Error:
+                pass
+            if isinstance(err, (mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError)):
+                raise DatabaseUnavailableError(str(err)) from err
+            if isinstance(err, mysql.connector.IntegrityError):
+                raise IntegrityError(str(err)) from err
+            if isinstance(err, mysql.connector.Error):
+                raise StorageError(str(err)) from err
+            raise
+        finally:
+            cursor.close()
+            conn.close()
 
     def initialize_tables(self):
         """Create necessary tables if they don't exist"""
-        # Create admins table
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS admins (
-                id INT PRIMARY KEY AUTO_INCREMENT,
-                username VARCHAR(255) UNIQUE,
-                password VARCHAR(255)
-            )
-        ''')
+        with self._cursor(commit=True) as cursor:
+            # Create admins table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS admins (
+                    id INT PRIMARY KEY AUTO_INCREMENT,
+                    username VARCHAR(255) UNIQUE,
+                    password VARCHAR(255)
+                )
+            ''')
+            
+            # Check if default admin exists, if not create one
+            cursor.execute("SELECT * FROM admins")
+            if cursor.fetchone() is None:
+                hashed_password = bcrypt.hashpw("admin123".encode('utf-8'), bcrypt.gensalt())
+                cursor.execute("INSERT INTO admins (username, password) VALUES (%s, %s)", ('admin', hashed_password))
+            
+            self._ensure_schema(cursor)
+
+    def _ensure_schema(self, cursor):
+        """Add missing columns and any missing index from INDEXES on tables that exist"""
+        cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()")
+        tables = {row[0].lower() for row in cursor.fetchall()}
+        
+        if "employee_transactions" in tables:
+            cursor.execute("""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = DATABASE() AND table_name = 'employee_transactions'
+            """)
+            columns = {row[0].lower() for row in cursor.fetchall()}
+            if "et_idempotency_key" not in columns:
+                # Lets journaled offline punches be replayed without double counting
+                cursor.execute("""
+                    ALTER TABLE employee_transactions
+                    ADD COLUMN et_idempotency_key VARCHAR(64) NULL,
+                    ADD UNIQUE INDEX uq_et_idempotency_key (et_idempotency_key)
+                """)
+        
+        if "employee_master" in tables:
+            cursor.execute("""
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = DATABASE() AND table_name = 'employee_master'
+            """)
+            columns = {row[0].lower() for row in cursor.fetchall()}
+            if "em_updated_at" not in columns:
+                # Watermark for gallery snapshot delta sync; MySQL bumps it on every change to the row
+                cursor.execute("""
+                    ALTER TABLE employee_master
+                    ADD COLUMN em_updated_at TIMESTAMP(6) NOT NULL
+                        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)
+                """)
         
-        # Check if default admin exists, if not create one
-        self.cursor.execute("SELECT * FROM admins")
-        if self.cursor.fetchone() is None:
-            hashed_password = bcrypt.hashpw("admin123".encode('utf-8'), bcrypt.gensalt())
-            self.cursor.execute("INSERT INTO admins (username, password) VALUES (%s, %s)", ('admin', hashed_password))
-            self.conn.commit()
+        cursor.execute("""
+            SELECT DISTINCT table_name, index_name FROM information_schema.statistics
+            WHERE table_schema = DATABASE()
+        """)
+        existing = {(row[0].lower(), row[1].lower()) for row in cursor.fetchall()}
+        
+        for table, index_name, columns in INDEXES:
+            if table in tables and (table, index_name.lower()) not in existing:
+                cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+
+    def explain_hot_queries(self):
+        """EXPLAIN the hot attendance queries; returns {query: [(table, access type, key, rows)]}"""
+        start, end = day_bounds(date.today())
+        queries = {
+            "check_attendance_exists": (self.CHECK_ATTENDANCE_SQL, ("0", start, end, start, end)),
+            "update_attendance_out": (self.UPDATE_ATTENDANCE_OUT_SQL, (end, "", "0", start, end)),
+            "get_daily_attendance_records": (self.DAILY_ATTENDANCE_SQL, ("", start, end)),
+            "get_attendance_by_department": (self.ATTENDANCE_BY_DEPARTMENT_SQL, ()),
+            "get_attendance_rate": (self.ATTENDANCE_RATE_SQL, ()),
+        }
+        plans = {}
+        with self._cursor() as cursor:
+            for name, (sql, params) in queries.items():
+                cursor.execute("EXPLAIN " + sql, params)
+                columns = [c.lower() for c in cursor.column_names]
+                plans[name] = [
+                    (row[columns.index("table")], row[columns.index("type")], row[columns.index("key")], row[columns.index("rows")])
+                    for row in cursor.fetchall()
+                ]
+        return plans
 
     def get_admin_by_username(self, username):
         """Get admin by username"""
-        self.cursor.execute("SELECT * FROM admins WHERE username=%s", (username,))
-        return self.cursor.fetchone()
+        with self._cursor() as cursor:
+            cursor.execute("SELECT * FROM admins WHERE username=%s", (username,))
+            return cursor.fetchone()
 
     def add_admin(self, username, password):
         """Add new admin"""
         hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        self.cursor.execute("INSERT INTO admins (username, password) VALUES (%s, %s)", (username, hashed_password))
-        self.conn.commit()
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("INSERT INTO admins (username, password) VALUES (%s, %s)", (username, hashed_password))
 
     def update_admin_password(self, username, new_password):
         """Update admin password"""
         hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
-        self.cursor.execute("UPDATE admins SET password=%s WHERE username=%s", (hashed_password, username))
-        self.conn.commit()
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("UPDATE admins SET password=%s WHERE username=%s", (hashed_password, username))
 
     def get_employee_by_id(self, emp_id):
-        """Get employee by ID"""
-        self.cursor.execute("SELECT em_employee_name, em_employee_face_encoding FROM employee_master WHERE em_employee_id=%s", (emp_id,))
-        return self.cursor.fetchone()
+        """Get active employee by ID"""
+        with self._cursor() as cursor:
+            cursor.execute("SELECT em_employee_name, em_employee_face_encoding FROM employee_master WHERE em_employee_id=%s AND em_employee_active = 1", (emp_id,))
+            return cursor.fetchone()
+
+    def get_active_face_encodings(self):
+        """Get ID, name and face encoding of every active employee"""
+        with self._cursor() as cursor:
+            cursor.execute("""
+                SELECT em_employee_id, em_employee_name, em_employee_face_encoding
+                FROM employee_master
+                WHERE em_employee_active = 1 AND em_employee_face_encoding IS NOT NULL
+            """)
+            return cursor.fetchall()
+
+    def get_face_encoding_changes(self, since=None):
+        """(employee id, name, encoding, active, updated at) of employees changed after `since`, or every active one"""
+        with self._cursor() as cursor:
+            if since is None:
+                cursor.execute("""
+                    SELECT em_employee_id, em_employee_name, em_employee_face_encoding, em_employee_active, em_updated_at
+                    FROM employee_master
+                    WHERE em_employee_active = 1 AND em_employee_face_encoding IS NOT NULL
+                """)
+            else:
+                cursor.execute("""
+                    SELECT em_employee_id, em_employee_name, em_employee_face_encoding, em_employee_active, em_updated_at
+                    FROM employee_master
+                    WHERE em_updated_at > %s
+                    ORDER BY em_updated_at
+                """, (since,))
+            return cursor.fetchall()
+
+    def get_face_encodings_after(self, last_id, limit):
+        """(employee id, encoding) of up to `limit` employees after `last_id`, in ID order"""
+        with self._cursor() as cursor:
+            if last_id is None:
+                cursor.execute("""
+                    SELECT em_employee_id, em_employee_face_encoding FROM employee_master
+                    ORDER BY em_employee_id LIMIT %s
+                """, (limit,))
+            else:
+                cursor.execute("""
+                    SELECT em_employee_id, em_employee_face_encoding FROM employee_master
+                    WHERE em_employee_id > %s ORDER BY em_employee_id LIMIT %s
+                """, (last_id, limit))
+            return cursor.fetchall()
+
+    def update_face_encodings(self, rows):
+        """Replace the encodings of (employee id, encoding) rows in one transaction"""
+        with self._cursor(commit=True) as cursor:
+            cursor.executemany("UPDATE employee_master SET em_employee_face_encoding=%s WHERE em_employee_id=%s",
+                               [(encoding, emp_id) for emp_id, encoding in rows])
 
     def add_employee(self, emp_id, emp_name, emp_dept_id, emp_designation, face_encoding):
         """Add new employee"""
-        self.cursor.execute("""
-            INSERT INTO employee_master 
-            (em_employee_id, em_employee_name, em_employee_dept, em_employee_designation, em_employee_face_encoding, em_employee_active) 
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (emp_id, emp_name, emp_dept_id, emp_designation, face_encoding, 1))
-        self.conn.commit()
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("""
+                INSERT INTO employee_master 
+                (em_employee_id, em_employee_name, em_employee_dept, em_employee_designation, em_employee_face_encoding, em_employee_active) 
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (emp_id, emp_name, emp_dept_id, emp_designation, face_encoding, 1))
+        self._notify("employee_added", emp_id, emp_dept_id)
+
+    def set_employee_active(self, emp_id, active):
+        """Activate or deactivate an employee; returns True if the employee exists"""
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("UPDATE employee_master SET em_employee_active=%s WHERE em_employee_id=%s",
+                           (1 if active else 0, emp_id))
+            updated = cursor.rowcount > 0
+        if updated:
+            self._notify("employee_active", emp_id, active)
+        return updated
 
     def get_department_id_by_name(self, dept_name):
         """Get department ID by name"""
-        self.cursor.execute("SELECT dm_dept_id FROM department_master WHERE dm_dept_desc=%s", (dept_name,))
-        result = self.cursor.fetchone()
-        return result[0] if result else None
+        with self._cursor() as cursor:
+            cursor.execute("SELECT dm_dept_id FROM department_master WHERE dm_dept_desc=%s", (dept_name,))
+            result = cursor.fetchone()
+            return result[0] if result else None
 
     def get_all_departments(self):
         """Get all active departments"""
-        self.cursor.execute("SELECT dm_dept_desc FROM department_master WHERE dm_dept_active = 1")
-        return [row[0] for row in self.cursor.fetchall()]
+        with self._cursor() as cursor:
+            cursor.execute("SELECT dm_dept_desc FROM department_master WHERE dm_dept_active = 1")
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_active_departments_with_ids(self):
+        """Get (id, description) of all active departments"""
+        with self._cursor() as cursor:
+            cursor.execute("SELECT dm_dept_id, dm_dept_desc FROM department_master WHERE dm_dept_active = 1")
+            return cursor.fetchall()
+
+    def get_active_employee_departments(self):
+        """Get (employee id, department id) of all active employees"""
+        with self._cursor() as cursor:
+            cursor.execute("SELECT em_employee_id, em_employee_dept FROM employee_master WHERE em_employee_active = 1")
+            return cursor.fetchall()
+
+    def get_present_employee_ids(self, day):
+        """Get IDs of employees with a check-in on the given day"""
+        start, end = day_bounds(day)
+        with self._cursor() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT et_employee_id FROM employee_transactions
+                WHERE et_employee_in_time >= %s AND et_employee_in_time < %s
+            """, (start, end))
+            return [row[0] for row in cursor.fetchall()]
 
     def get_total_employees(self):
         """Get total number of active employees"""
-        self.cursor.execute("SELECT COUNT(*) FROM employee_master WHERE em_employee_active = 1")
-        return self.cursor.fetchone()[0]
+        with self._cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM employee_master WHERE em_employee_active = 1")
+            return cursor.fetchone()[0]
 
     def get_attendance_rate(self):
         """Get today's attendance rate"""
-        self.cursor.execute(""" 
-            SELECT 
-                (SELECT COUNT(DISTINCT et_employee_id) 
-                FROM employee_transactions 
-                WHERE DATE(et_employee_in_time) = CURRENT_DATE) / 
-                (SELECT COUNT(*) 
-                FROM employee_master 
-                WHERE em_employee_active = 1) * 100 AS attendance_rate;
-        """)
-        result = self.cursor.fetchone()[0]
-        return result or 0
+        with self._cursor() as cursor:
+            cursor.execute(self.ATTENDANCE_RATE_SQL)
+            result = cursor.fetchone()[0]
+            return result or 0
 
     def get_attendance_by_department(self):
         """Get attendance data by department"""
-        self.cursor.execute(""" 
-            SELECT 
-                dm.dm_dept_desc AS department_desc,
-                COUNT(em.em_employee_id) AS employee_count,
-                COUNT(DISTINCT et.et_employee_id) AS attendance_count
-            FROM 
-                department_master dm
-            LEFT JOIN 
-                employee_master em ON dm.dm_dept_id = em.em_employee_dept AND em.em_employee_active = 1
-            LEFT JOIN 
-                employee_transactions et ON em.em_employee_id = et.et_employee_id 
-                AND DATE(et.et_employee_in_time) = CURRENT_DATE
-            WHERE 
-                dm.dm_dept_active = 1
-            GROUP BY 
-                dm.dm_dept_desc;
-        """)
-        return self.cursor.fetchall()
+        with self._cursor() as cursor:
+            cursor.execute(self.ATTENDANCE_BY_DEPARTMENT_SQL)
+            return cursor.fetchall()
 
     def check_attendance_exists(self, emp_id, date_today):
         """Check if attendance already exists for employee today"""
-        self.cursor.execute("""
-            SELECT * FROM employee_transactions
-            WHERE et_employee_id=%s AND DATE(et_employee_in_time)=%s AND DATE(et_employee_out_time)=%s
-        """, (emp_id, date_today, date_today))
-        return self.cursor.fetchone()
+        start, end = day_bounds(date_today)
+        with self._cursor() as cursor:
+            cursor.execute(self.CHECK_ATTENDANCE_SQL, (emp_id, start, end, start, end))
+            return cursor.fetchone()
+
+    def get_existing_attendance(self, emp_ids, date_today):
+        """Batch form of check_attendance_exists: IDs among emp_ids with a record for today"""
+        if not emp_ids:
+            return set()
+        placeholders = ", ".join(["%s"] * len(emp_ids))
+        start, end = day_bounds(date_today)
+        with self._cursor() as cursor:
+            cursor.execute(f"""
+                SELECT DISTINCT et_employee_id FROM employee_transactions
+                WHERE et_employee_id IN ({placeholders})
+                  AND et_employee_in_time >= %s AND et_employee_in_time < %s
+                  AND et_employee_out_time >= %s AND et_employee_out_time < %s
+            """, (*emp_ids, start, end, start, end))
+            return {str(row[0]) for row in cursor.fetchall()}
+
+    def add_attendance_in_batch(self, rows):
+        """Add several check-ins, given as (emp_id, timestamp, image_path) rows, in one transaction
+
+        Returns their transaction IDs, in row order. Rows are inserted one by
+        one, since a multi-row insert only reports the first ID.
+        """
+        transaction_ids = []
+        with self._cursor(commit=True) as cursor:
+            for row in rows:
+                cursor.execute("""
+                    INSERT INTO employee_transactions (et_employee_id, et_employee_in_time, et_employee_in_imgpth) 
+                    VALUES (%s, %s, %s)
+                """, row)
+                transaction_ids.append(cursor.lastrowid)
+        self._notify("attendance_in", [row[0] for row in rows])
+        return transaction_ids
+
+    def replay_attendance_in_batch(self, rows):
+        """Insert journaled check-ins, given as (emp_id, timestamp, image_path, idempotency_key) rows
+
+        Rows whose idempotency key is already present are left untouched, so
+        replaying the same journal entries twice does not double count; a
+        check-in for an employee who already checked in that day (e.g. online,
+        before the outage) is skipped too. Returns {idempotency_key:
+        transaction_id} for the rows stored under their key.
+        """
+        params = []
+        for emp_id, timestamp, image_path, key in rows:
+            start, end = day_bounds(str(timestamp)[:10])
+            params.append((emp_id, timestamp, image_path, key, emp_id, start, end))
+        with self._cursor(commit=True) as cursor:
+            cursor.executemany("""
+                INSERT INTO employee_transactions (et_employee_id, et_employee_in_time, et_employee_in_imgpth, et_idempotency_key) 
+                SELECT %s, %s, %s, %s FROM DUAL
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM employee_transactions
+                    WHERE et_employee_id = %s AND et_employee_in_time >= %s AND et_employee_in_time < %s
+                )
+                ON DUPLICATE KEY UPDATE et_idempotency_key = et_idempotency_key
+            """, params)
+            keys = [row[3] for row in rows]
+            cursor.execute(f"""
+                SELECT et_idempotency_key, et_transaction_id FROM employee_transactions
+                WHERE et_idempotency_key IN ({", ".join(["%s"] * len(keys))})
+            """, keys)
+            transaction_ids = dict(cursor.fetchall())
+        self._notify("attendance_in", [row[0] for row in rows])
+        return transaction_ids
+
+    def update_attendance_out_batch(self, rows):
+        """Apply several check-outs, given as (emp_id, timestamp, image_path, date_today) rows, in one transaction"""
+        params = []
+        for emp_id, timestamp, image_path, date_today in rows:
+            start, end = day_bounds(date_today)
+            params.append((timestamp, image_path, emp_id, start, end))
+        with self._cursor(commit=True) as cursor:
+            cursor.executemany(self.UPDATE_ATTENDANCE_OUT_SQL, params)
+        self._notify("attendance_out", [row[0] for row in rows])
 
     def add_attendance_in(self, emp_id, timestamp, image_path):
         """Add check-in attendance"""
-        self.cursor.execute("""
-            INSERT INTO employee_transactions (et_employee_id, et_employee_in_time, et_employee_in_imgpth) 
-            VALUES (%s, %s, %s)
-        """, (emp_id, timestamp, image_path))
-        self.conn.commit()
-        return self.cursor.lastrowid
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("""
+                INSERT INTO employee_transactions (et_employee_id, et_employee_in_time, et_employee_in_imgpth) 
+                VALUES (%s, %s, %s)
+            """, (emp_id, timestamp, image_path))
+            transaction_id = cursor.lastrowid
+        self._notify("attendance_in", [emp_id])
+        return transaction_id
 
     def update_attendance_out(self, emp_id, timestamp, image_path, date_today):
         """Update check-out attendance"""
-        self.cursor.execute("""
-            UPDATE employee_transactions 
-            SET et_employee_out_time=%s, et_employee_out_imgpth=%s, et_worktime = TIMEDIFF(et_employee_out_time, et_employee_in_time) 
-            WHERE et_employee_id=%s AND DATE(et_employee_in_time)=%s AND et_employee_out_time IS NULL
-        """, (timestamp, image_path, emp_id, date_today))
-        self.conn.commit()
+        start, end = day_bounds(date_today)
+        with self._cursor(commit=True) as cursor:
+            cursor.execute(self.UPDATE_ATTENDANCE_OUT_SQL, (timestamp, image_path, emp_id, start, end))
+            updated = cursor.rowcount > 0
+        if updated:
+            self._notify("attendance_out", [emp_id])
 
     def get_attendance_records(self, department, start_datetime, end_datetime):
         """Get attendance records for a department within date range"""
-        self.cursor.execute('''
-            SELECT DATE(et.et_employee_in_time), et.et_employee_id, em.em_employee_name, et.et_employee_in_time, et.et_employee_out_time, et.et_worktime
+        with self._cursor() as cursor:
+            cursor.execute(self.ATTENDANCE_RECORDS_SQL, (department, start_datetime, end_datetime))
+            return cursor.fetchall()
+
+    def count_attendance_records(self, department, start_datetime, end_datetime, employee_filter=None):
+        """Number of rows get_attendance_records would return, optionally filtered by employee ID or name"""
+        query, params = self._attendance_filter(department, start_datetime, end_datetime, employee_filter)
+        with self._cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) " + query, params)
+            return cursor.fetchone()[0]
+
+    def get_attendance_page(self, department, start_datetime, end_datetime, offset, limit,
+                            sort_key="date", descending=False, employee_filter=None):
+        """One sorted, filtered window of get_attendance_records rows"""
+        query, params = self._attendance_filter(department, start_datetime, end_datetime, employee_filter)
+        with self._cursor() as cursor:
+            cursor.execute(self.ATTENDANCE_PAGE_COLUMNS + query + " " + attendance_order_by(sort_key, descending)
+                           + " LIMIT %s OFFSET %s", (*params, limit, offset))
+            return cursor.fetchall()
+
+    def _attendance_filter(self, department, start_datetime, end_datetime, employee_filter):
+        query = '''
             FROM employee_transactions et
             JOIN employee_master em ON et.et_employee_id = em.em_employee_id
             JOIN department_master d ON em.em_employee_dept = d.dm_dept_id
-            WHERE d.dm_dept_desc = %s AND et.et_employee_in_time >= %s AND et.et_employee_in_time < %s;
-        ''', (department, start_datetime, end_datetime))
-        return self.cursor.fetchall()
+            WHERE d.dm_dept_desc = %s AND et.et_employee_in_time >= %s AND et.et_employee_in_time < %s
+        '''
+        params = [department, start_datetime, end_datetime]
+        if employee_filter:
+            query += " AND (et.et_employee_id LIKE %s ESCAPE '!' OR em.em_employee_name LIKE %s ESCAPE '!')"
+            pattern = like_pattern(employee_filter)
+            params += [pattern, pattern]
+        return query, params
+
+    def iter_attendance_records(self, department, start_datetime, end_datetime, chunk_size=1000):
+        """get_attendance_records in chunks, streamed from the server as they are consumed"""
+        conn = self._get_connection()
+        # Unbuffered: the result set stays on the server until fetched
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(self.ATTENDANCE_RECORDS_SQL, (department, start_datetime, end_datetime))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        except mysql.connector.Error as err:
+            raise StorageError(str(err)) from err
+        finally:
+            # Abandoned part way: drain what the server still has queued so
+            # the connection can go back to the pool
+            try:
+                conn.consume_results()
+            except mysql.connector.Error:
+                pass
+            cursor.close()
+            conn.close()
 
     def get_daily_attendance_records(self, department, single_date):
         """Get daily attendance records for a department"""
-        self.cursor.execute('''
-            SELECT et.et_employee_id, em.em_employee_name, et.et_employee_in_time, et.et_employee_out_time, et.et_worktime
-            FROM employee_transactions et
-            JOIN employee_master em ON et.et_employee_id = em.em_employee_id
-            JOIN department_master d ON em.em_employee_dept = d.dm_dept_id
-            WHERE d.dm_dept_desc = %s AND DATE(et.et_employee_in_time) = %s;
-        ''', (department, single_date))
-        return self.cursor.fetchall()
+        start, end = day_bounds(single_date)
+        with self._cursor() as cursor:
+            cursor.execute(self.DAILY_ATTENDANCE_SQL, (department, start, end))
+            return cursor.fetchall()
 
     def close(self):
-        """Close database connection"""
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
\ No newline at end of file
+        """Disconnect the pool's idle connections and drop the pool
+
+        Connections still borrowed go back to the dropped pool when their
+        cursor block ends and are closed with it.
+        """
+        with self.pool_lock:
+            pool, self.pool = self.pool, None
+        if pool is None:
+            return
+        # At most pool_size borrows: a connection that fails to reconnect is put back in the queue
+        for _ in range(pool.pool_size):
+            try:
+                conn = pool.get_connection()
+            except mysql.connector.Error:
+                break
+            try:
+                conn.disconnect()
+            except mysql.connector.Error:
+                pass
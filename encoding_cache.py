@@ -0,0 +1,112 @@
+"""
+Encoding Cache Module
+LRU cache of decoded employee face encodings keyed by employee ID
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from encoding_format import decode_templates
+
+
+class EncodingCache:
+    """Bounded LRU cache of (name, read-only encoding) per employee
+
+    Bounded both by entry count and by the bytes held in decoded arrays.
+    Misses are the only time a caller has to go back to employee_master,
+    so the counters show whether steady-state punches touch the database.
+    """
+    def __init__(self, max_entries=100000, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.decodes = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, emp_id):
+        """Return (name, encoding) for an employee, or None on a miss"""
+        emp_id = str(emp_id)
+        with self.lock:
+            entry = self.entries.get(emp_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(emp_id)
+            self.hits += 1
+            return entry
+
+    def put(self, emp_id, name, encoding_bytes):
+        """Decode a stored encoding once and cache it; returns the cached entry"""
+        if encoding_bytes is None:
+            return None
+        with self.lock:
+            self.decodes += 1
+        return self.put_templates(emp_id, name, decode_templates(encoding_bytes))
+
+    def put_templates(self, emp_id, name, templates):
+        """Cache already decoded (templates x 128) float64 templates; returns the cached entry"""
+        encoding = templates[0].copy() if len(templates) == 1 else np.array(templates)
+        encoding.setflags(write=False)
+        entry = (name, encoding)
+
+        emp_id = str(emp_id)
+        with self.lock:
+            old = self.entries.pop(emp_id, None)
+            if old is not None:
+                self.bytes -= old[1].nbytes
+            self.entries[emp_id] = entry
+            self.bytes += encoding.nbytes
+            while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evictions += 1
+        return entry
+
+    def warm(self, rows):
+        """Pre-populate from (employee_id, name, encoding_bytes) rows"""
+        for emp_id, name, encoding_bytes in rows:
+            if len(self.entries) >= self.max_entries:
+                break
+            self.put(emp_id, name, encoding_bytes)
+
+    def warm_templates(self, rows):
+        """Pre-populate from (employee_id, name, templates) rows, e.g. a mapped gallery snapshot"""
+        for emp_id, name, templates in rows:
+            if len(self.entries) >= self.max_entries:
+                break
+            self.put_templates(emp_id, name, templates)
+
+    def invalidate(self, emp_id):
+        """Drop one employee, e.g. after re-registration or deactivation"""
+        with self.lock:
+            entry = self.entries.pop(str(emp_id), None)
+            if entry is not None:
+                self.bytes -= entry[1].nbytes
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Hit/miss counters; misses equal employee_master reads made for lookups"""
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "decodes": self.decodes,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,255 @@
+"""
+Encoding Format Module
+Versioned, self-describing storage format for face templates, with float32, float16 and int8 variants
+
+A stored encoding is an 8-byte header followed by the template data:
+
+    magic b"FE"  version (uint8)  format code (uint8)  templates (uint16)  dimensions (uint16)
+
+then, for int8, one float32 scale per template, then the templates row by
+row in the format's dtype (little endian). Rows written before this format
+existed are headerless float64 templates back to back; their length is a
+multiple of 1024 bytes, which no headed encoding of fewer than 62 templates
+can be, so both decode.
+
+Run `python encoding_format.py measure` for the distance error of each
+format, and `python encoding_format.py migrate --format float32` to rewrite
+stored encodings in batches.
+"""
+import struct
+
+import numpy as np
+
+ENCODING_DIMENSIONS = 128
+MAGIC = b"FE"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<2sBBHH")
+FORMATS = {"float64": 0, "float32": 1, "float16": 2, "int8": 3}
+FORMAT_NAMES = {code: name for name, code in FORMATS.items()}
+DTYPES = {"float64": "<f8", "float32": "<f4", "float16": "<f2", "int8": "i1"}
+# Quantized galleries are widened to float32 this many rows at a time, so the full matrix is never expanded
+DOT_BLOCK_ROWS = 8192
+
+
+def quantize(templates, fmt):
+    """(compact matrix, per-row scales or None) of a (templates x 128) array in format `fmt`"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown encoding format '{fmt}'; use one of {tuple(FORMATS)}")
+    templates = np.asarray(templates, dtype=np.float64).reshape(-1, ENCODING_DIMENSIONS)
+    if fmt != "int8":
+        return np.ascontiguousarray(templates, dtype=DTYPES[fmt]), None
+    # Symmetric per-template scale: the largest magnitude maps to 127
+    scales = np.abs(templates).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    compact = np.rint(templates / scales[:, np.newaxis]).astype(np.int8)
+    return compact, scales.astype(np.float32)
+
+
+def dequantize(compact, scales=None, dtype=np.float64):
+    """Float templates from a compact matrix"""
+    templates = np.asarray(compact, dtype=dtype)
+    if scales is not None:
+        templates = templates * np.asarray(scales, dtype=dtype)[:, np.newaxis]
+    return templates
+
+
+def compact_format(compact, scales=None):
+    """Format name of a compact matrix"""
+    if scales is not None:
+        return "int8"
+    return {np.dtype(np.float64): "float64", np.dtype(np.float32): "float32",
+            np.dtype(np.float16): "float16"}[np.asarray(compact).dtype]
+
+
+def dot(compact, scales, probes):
+    """probes @ templates.T computed from the compact matrix
+
+    float64 and float32 matrices go straight to BLAS. float16 and int8 ones
+    are widened to float32 in blocks of DOT_BLOCK_ROWS, so the per-query
+    memory traffic is that of the compact form, not of a float copy.
+    """
+    probes = np.asarray(probes)
+    if compact.dtype == np.float64:
+        return probes.astype(np.float64) @ compact.T
+    probes32 = probes.astype(np.float32)
+    if compact.dtype == np.float32:
+        return (probes32 @ compact.T).astype(np.float64)
+    out = np.empty((len(probes32), len(compact)), dtype=np.float64)
+    for start in range(0, len(compact), DOT_BLOCK_ROWS):
+        block = compact[start:start + DOT_BLOCK_ROWS].astype(np.float32)
+        products = probes32 @ block.T
+        if scales is not None:
+            products *= scales[start:start + DOT_BLOCK_ROWS]
+        out[:, start:start + DOT_BLOCK_ROWS] = products
+    return out
+
+
+def sq_norms(compact, scales=None):
+    """Squared norm of every template, widened a block at a time"""
+    out = np.empty(len(compact), dtype=np.float64)
+    for start in range(0, len(compact), DOT_BLOCK_ROWS):
+        block = dequantize(compact[start:start + DOT_BLOCK_ROWS],
+                           None if scales is None else scales[start:start + DOT_BLOCK_ROWS])
+        out[start:start + DOT_BLOCK_ROWS] = np.einsum("ij,ij->i", block, block)
+    return out
+
+
+def encode_templates(templates, fmt="float32"):
+    """Stored bytes for one 128-vector or a (templates x 128) array"""
+    compact, scales = quantize(templates, fmt)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, FORMATS[fmt], len(compact), ENCODING_DIMENSIONS)
+    parts = [header]
+    if scales is not None:
+        parts.append(scales.astype("<f4").tobytes())
+    parts.append(compact.astype(DTYPES[fmt], copy=False).tobytes())
+    return b"".join(parts)
+
+
+def _header(data):
+    """(format, templates, dimensions) if `data` starts with a valid header matching its length, else None"""
+    if len(data) < HEADER.size:
+        return None
+    magic, version, code, count, dimensions = HEADER.unpack_from(data)
+    fmt = FORMAT_NAMES.get(code)
+    if magic != MAGIC or version != FORMAT_VERSION or fmt is None:
+        return None
+    scale_bytes = 4 * count if fmt == "int8" else 0
+    if len(data) != HEADER.size + scale_bytes + count * dimensions * np.dtype(DTYPES[fmt]).itemsize:
+        return None
+    return fmt, count, dimensions
+
+
+def decode_compact(data):
+    """(compact matrix, scales or None, format name) of stored encoding bytes; legacy rows are (.., "legacy")"""
+    data = bytes(data)
+    header = _header(data)
+    if header is not None:
+        fmt, count, dimensions = header
+        offset = HEADER.size
+        scales = None
+        if fmt == "int8":
+            scales = np.frombuffer(data, dtype="<f4", count=count, offset=offset).astype(np.float32)
+            offset += 4 * count
+        compact = np.frombuffer(data, dtype=DTYPES[fmt], offset=offset).reshape(count, dimensions)
+        return compact.astype(compact.dtype.newbyteorder("=")), scales, fmt
+    if len(data) % (8 * ENCODING_DIMENSIONS) == 0:
+        return np.frombuffer(data, dtype=np.float64).reshape(-1, ENCODING_DIMENSIONS), None, "legacy"
+    raise ValueError(f"Unrecognized face encoding of {len(data)} bytes")
+
+
+def decode_templates(data):
+    """Stored encoding bytes as a float64 (templates x 128) array"""
+    compact, scales, _ = decode_compact(data)
+    return dequantize(compact, scales)
+
+
+def measure(templates, probes, formats=("float32", "float16", "int8"), threshold=0.6):
+    """Distance error and rank-1 agreement of each format against float64 templates
+
+    Returns {format: {max_abs_error, mean_abs_error, rank1_agreement,
+    decision_flips, bytes_per_template}} where the errors are in distance
+    units and decision_flips counts best matches whose accept/reject outcome
+    at `threshold` changes.
+    """
+    templates = np.asarray(templates, dtype=np.float64)
+    probes = np.asarray(probes, dtype=np.float64)
+    exact = _distances(templates, None, probes)
+    exact_best = exact.argmin(axis=1)
+    exact_accept = exact[np.arange(len(probes)), exact_best] <= threshold
+    results = {}
+    for fmt in formats:
+        compact, scales = quantize(templates, fmt)
+        approx = _distances(compact, scales, probes)
+        best = approx.argmin(axis=1)
+        error = np.abs(approx - exact)
+        results[fmt] = {
+            "max_abs_error": float(error.max()),
+            "mean_abs_error": float(error.mean()),
+            "rank1_agreement": float(np.mean(best == exact_best)),
+            "decision_flips": int(np.sum((approx[np.arange(len(probes)), best] <= threshold) != exact_accept)),
+            "bytes_per_template": len(encode_templates(templates[0], fmt)),
+        }
+    return results
+
+
+def _distances(compact, scales, probes):
+    sq = sq_norms(compact, scales)[np.newaxis, :] - 2.0 * dot(compact, scales, probes)
+    sq += np.einsum("ij,ij->i", probes, probes)[:, np.newaxis]
+    return np.sqrt(np.maximum(sq, 0.0))
+
+
+def migrate(db, fmt="float32", batch_size=1000, progress=None):
+    """Rewrite every stored encoding in format `fmt`, `batch_size` employees per transaction
+
+    Employees are walked in ID order with keyset paging, so only one batch
+    is in memory and an interrupted migration can simply be run again.
+    Returns the number of encodings rewritten.
+    """
+    rewritten = 0
+    last_id = None
+    while True:
+        rows = db.get_face_encodings_after(last_id, batch_size)
+        if not rows:
+            return rewritten
+        last_id = rows[-1][0]
+        updates = []
+        for emp_id, encoding_bytes in rows:
+            if encoding_bytes is None:
+                continue
+            compact, scales, current = decode_compact(encoding_bytes)
+            if current == fmt:
+                continue
+            updates.append((emp_id, encode_templates(dequantize(compact, scales), fmt)))
+        if updates:
+            db.update_face_encodings(updates)
+            rewritten += len(updates)
+        if progress is not None:
+            progress(rewritten, last_id)
+
+
+def main():
+    import argparse
+    import os
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Measure or migrate the stored face encoding format")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    measure_parser = subparsers.add_parser("measure", help="distance error of each format over the enrolled gallery")
+    measure_parser.add_argument("--synthetic", type=int, default=0,
+                                help="use this many synthetic encodings instead of the database")
+    measure_parser.add_argument("--probes", type=int, default=500)
+    migrate_parser = subparsers.add_parser("migrate", help="rewrite stored encodings in another format")
+    migrate_parser.add_argument("--format", choices=tuple(FORMATS), default=os.getenv("encoding_format", "float32"))
+    migrate_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    from storage_backend import create_storage
+
+    if args.command == "migrate":
+        db = create_storage()
+        count = migrate(db, args.format, args.batch_size,
+                        lambda rewritten, last_id: print(f"\r{rewritten} rewritten (up to {last_id})", end=""))
+        db.close()
+        print(f"\n{count} encodings rewritten as {args.format}")
+        return
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        templates = rng.normal(0.0, 0.09, (args.synthetic, ENCODING_DIMENSIONS))
+    else:
+        db = create_storage()
+        templates = np.concatenate([decode_templates(row[2]) for row in db.get_active_face_encodings()
+                                    if row[2] is not None])
+        db.close()
+    # Probes near enrolled templates, like a genuine capture of the same person
+    chosen = rng.integers(0, len(templates), args.probes)
+    probes = templates[chosen] + rng.normal(0.0, 0.02, (args.probes, ENCODING_DIMENSIONS))
+    print(f"{'format':<8} {'bytes':>6} {'max error':>10} {'mean error':>11} {'rank-1 agree':>13} {'flips':>6}")
+    for fmt, result in measure(templates, probes).items():
+        print(f"{fmt:<8} {result['bytes_per_template']:>6} {result['max_abs_error']:>10.5f} "
+              f"{result['mean_abs_error']:>11.6f} {result['rank1_agreement']:>13.4f} {result['decision_flips']:>6}")
+
+
+if __name__ == "__main__":
+    main()
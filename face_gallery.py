@@ -0,0 +1,252 @@
+"""
+Face Gallery Module
+Holds every active employee encoding in memory for 1:N identification
+"""
+import threading
+import numpy as np
+
+import encoding_format
+from ann_index import IVFIndex
+from encoding_format import ENCODING_DIMENSIONS
+
+
+class IdentificationResult:
+    """Best and second-best gallery candidates for one probe encoding"""
+    def __init__(self, employee_id, name, distance, second_employee_id, second_distance, is_match):
+        self.employee_id = employee_id
+        self.name = name
+        self.distance = distance
+        self.second_employee_id = second_employee_id
+        self.second_distance = second_distance
+        self.margin = second_distance - distance
+        self.is_match = is_match
+
+    def __repr__(self):
+        return (f"IdentificationResult(employee_id={self.employee_id!r}, distance={self.distance:.3f}, "
+                f"margin={self.margin:.3f}, is_match={self.is_match})")
+
+
+def unpack_templates(encoding_bytes):
+    """Stored encoding bytes as a float64 (templates x 128) array; one row for single-template employees"""
+    return encoding_format.decode_templates(encoding_bytes)
+
+
+def _inliers(encodings, outlier_distance):
+    """Samples within `outlier_distance` of the elementwise median, in capture order"""
+    encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, ENCODING_DIMENSIONS)
+    median = np.median(encodings, axis=0)
+    keep = np.linalg.norm(encodings - median, axis=1) <= outlier_distance
+    return encodings[keep] if keep.sum() >= 2 else median[np.newaxis, :]
+
+
+def robust_mean_template(encodings, outlier_distance=0.3):
+    """One template from several samples: the mean of the samples near their median"""
+    return _inliers(encodings, outlier_distance).mean(axis=0)
+
+
+def select_templates(encodings, max_templates=5, outlier_distance=0.3):
+    """Up to `max_templates` samples to keep as separate templates, outliers dropped"""
+    return _inliers(encodings, outlier_distance)[:max_templates]
+
+
+class FaceGallery:
+    """Contiguous R x 128 matrix of enrolled templates in `encoding_format`
+
+    float32 halves the memory of float64 with no measurable change in
+    distances; float16 and int8 (with a scale per row) cut it 4x and 8x, and
+    products are taken on the compact rows (see encoding_format.dot).
+
+    Each employee owns one or more consecutive rows. Identification computes
+    every probe/template distance in one matrix product and, when some
+    employee has several templates, reduces each employee's rows to their
+    closest one with a single np.minimum.reduceat, so the best and
+    second-best candidates are always different employees.
+
+    From `ann_min_size` employees on, identification goes through an IVF
+    index (see ann_index.py) that scans the `ann_probes` nearest of
+    `ann_lists` lists (0: sized from the gallery) instead of every row.
+    Adds, removals and sync deltas (update()) update the index in place of
+    a rebuild.
+
+    The arrays are replaced as a whole on every change, so identification
+    reads a consistent snapshot without taking the lock.
+    """
+    def __init__(self, threshold=0.6, min_margin=0.0, encoding_format="float64",
+                 ann_min_size=None, ann_probes=16, ann_lists=0):
+        self.threshold = threshold
+        self.min_margin = min_margin
+        self.encoding_format = encoding_format
+        self.ann_min_size = ann_min_size
+        self.ann_probes = ann_probes
+        self.ann_lists = ann_lists
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self._set_snapshot([], [], np.empty((0, ENCODING_DIMENSIONS), dtype=np.float64))
+
+    def __len__(self):
+        return len(self.snapshot[0])
+
+    @property
+    def index(self):
+        """The IVF index in use, or None while identification scans the whole gallery"""
+        return self.snapshot[8]
+
+    def load(self, rows):
+        """Build the gallery from (employee_id, name, encoding_bytes) rows"""
+        employee_ids, names, blocks = [], [], []
+        for emp_id, name, encoding_bytes in rows:
+            if encoding_bytes is None:
+                continue
+            employee_ids.append(str(emp_id))
+            names.append(name)
+            blocks.append(unpack_templates(encoding_bytes))
+        matrix = np.concatenate(blocks) if blocks else np.empty((0, ENCODING_DIMENSIONS), dtype=np.float64)
+        counts = np.array([len(block) for block in blocks], dtype=np.intp)
+
+        with self.lock:
+            self._set_snapshot(employee_ids, names, matrix, counts)
+            self.loaded = True
+
+    def load_arrays(self, employee_ids, names, matrix, counts=None, scales=None):
+        """Adopt prepared arrays, e.g. a memory-mapped snapshot; a matrix already in the gallery's format is not copied"""
+        with self.lock:
+            self._set_snapshot(list(employee_ids), list(names), matrix, counts, scales)
+            self.loaded = True
+
+    def get(self, emp_id):
+        """(name, read-only templates) for an enrolled employee, or None
+
+        The templates are a 128-vector for single-template employees and a
+        (templates x 128) array otherwise.
+        """
+        employee_ids, names, matrix, _, index_by_id, counts, starts, scales, _ = self.snapshot
+        i = index_by_id.get(str(emp_id))
+        if i is None:
+            return None
+        rows = slice(starts[i], starts[i] + counts[i])
+        templates = encoding_format.dequantize(matrix[rows], None if scales is None else scales[rows])
+        templates = templates[0] if counts[i] == 1 else templates
+        templates.setflags(write=False)
+        return names[i], templates
+
+    def add(self, emp_id, name, face_encoding):
+        """Add or replace one employee's template(s)"""
+        self.update([(emp_id, name, face_encoding)])
+
+    def remove(self, emp_id):
+        """Drop an employee from the gallery, e.g. on deactivation"""
+        self.update([(emp_id, None, None)])
+
+    def update(self, changes):
+        """Apply (employee_id, name, templates) changes in one swap; templates of None drop the employee
+
+        Unchanged rows keep their squared norms, only the changed employees
+        are quantized, and an IVF index is updated in place of a rebuild, so
+        a sync touching a few employees costs one copy of the arrays.
+        """
+        latest = {}
+        for emp_id, name, templates in changes:
+            latest[str(emp_id)] = (name, templates)
+        with self.lock:
+            employee_ids, names, matrix, sq_norms, index_by_id, counts, starts, scales, index = self.snapshot
+            if all(templates is None and emp_id not in index_by_id for emp_id, (_, templates) in latest.items()):
+                return
+            keep = np.array([emp_id not in latest for emp_id in employee_ids], dtype=bool)
+            for emp_id in latest:
+                i = index_by_id.get(emp_id)
+                if index is not None and i is not None:
+                    rows = slice(starts[i], starts[i] + counts[i])
+                    index = index.without(emp_id, matrix[rows], None if scales is None else scales[rows])
+
+            kept_rows = np.repeat(keep, counts)
+            new_ids = [emp_id for emp_id, kept in zip(employee_ids, keep) if kept]
+            new_names = [name for name, kept in zip(names, keep) if kept]
+            blocks, norm_blocks, count_blocks = [matrix[kept_rows]], [sq_norms[kept_rows]], [counts[keep]]
+            scale_blocks = None if scales is None else [scales[kept_rows]]
+            for emp_id, (name, templates) in latest.items():
+                if templates is None:
+                    continue
+                compact, template_scales = encoding_format.quantize(templates, self.encoding_format)
+                new_ids.append(emp_id)
+                new_names.append(name)
+                blocks.append(compact)
+                norm_blocks.append(encoding_format.sq_norms(compact, template_scales))
+                count_blocks.append(np.array([len(compact)], dtype=np.intp))
+                if scale_blocks is not None:
+                    scale_blocks.append(template_scales)
+                if index is not None:
+                    index = index.with_templates(emp_id, compact, template_scales)
+            self._set_snapshot(new_ids, new_names, np.concatenate(blocks), np.concatenate(count_blocks),
+                               None if scale_blocks is None else np.concatenate(scale_blocks),
+                               index, np.concatenate(norm_blocks))
+
+    def identify(self, face_encoding):
+        """Match one probe against the whole gallery in a single vectorized pass"""
+        if face_encoding is None:
+            return None
+        results = self.identify_batch([face_encoding])
+        return results[0] if results else None
+
+    def identify_batch(self, face_encodings):
+        """Match M probes against the gallery with one M x N distance computation, or through the IVF index"""
+        employee_ids, names, matrix, sq_norms, index_by_id, _, starts, scales, index = self.snapshot
+        if len(employee_ids) == 0 or len(face_encodings) == 0:
+            return []
+
+        probes = np.asarray(face_encodings, dtype=np.float64).reshape(-1, ENCODING_DIMENSIONS)
+        if index is not None:
+            candidates = index.search(probes, self.ann_probes)
+            if all(candidate is not None for candidate in candidates):
+                return [self._result(best_id, names[index_by_id[best_id]], best_sq, second_id, second_sq)
+                        for best_id, best_sq, second_id, second_sq in candidates]
+
+        # ||g - p||^2 = ||g||^2 - 2 g.p + ||p||^2, one matrix product for every probe/template pair
+        sq_distances = sq_norms[np.newaxis, :] - 2.0 * encoding_format.dot(matrix, scales, probes)
+        sq_distances += np.einsum("ij,ij->i", probes, probes)[:, np.newaxis]
+        if len(matrix) != len(employee_ids):
+            # Closest template per employee
+            sq_distances = np.minimum.reduceat(sq_distances, starts, axis=1)
+
+        rows = np.arange(len(probes))
+        if len(employee_ids) == 1:
+            best = np.zeros(len(probes), dtype=np.intp)
+            second = None
+        else:
+            top_two = np.argpartition(sq_distances, 1, axis=1)[:, :2]
+            swap = sq_distances[rows, top_two[:, 0]] > sq_distances[rows, top_two[:, 1]]
+            top_two[swap] = top_two[swap][:, ::-1]
+            best, second = top_two[:, 0], top_two[:, 1]
+
+        best_sq = sq_distances[rows, best]
+        second_sq = np.full(len(probes), np.inf) if second is None else sq_distances[rows, second]
+        return [self._result(employee_ids[best[i]], names[best[i]], best_sq[i],
+                             employee_ids[second[i]] if second is not None else None, second_sq[i])
+                for i in range(len(probes))]
+
+    def _result(self, employee_id, name, best_sq, second_id, second_sq):
+        distance = float(np.sqrt(max(best_sq, 0.0)))
+        second_distance = float(np.sqrt(max(second_sq, 0.0)))
+        is_match = distance <= self.threshold and (second_distance - distance) >= self.min_margin
+        return IdentificationResult(employee_id, name, distance, second_id, second_distance, is_match)
+
+    def _set_snapshot(self, employee_ids, names, matrix, counts=None, scales=None, index=None, sq_norms=None):
+        """Swap in new arrays; without an updated `index`, one is built once the gallery reaches ann_min_size"""
+        if encoding_format.compact_format(matrix, scales) != self.encoding_format:
+            matrix, scales = encoding_format.quantize(encoding_format.dequantize(matrix, scales), self.encoding_format)
+            sq_norms = None
+        matrix = np.ascontiguousarray(matrix)
+        if counts is None:
+            counts = np.ones(len(employee_ids), dtype=np.intp)
+        counts = np.asarray(counts, dtype=np.intp)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.intp) if len(counts) else counts
+        if sq_norms is None:
+            sq_norms = encoding_format.sq_norms(matrix, scales)
+        index_by_id = {emp_id: i for i, emp_id in enumerate(employee_ids)}
+        if (index is None and self.ann_min_size is not None and len(matrix)
+                and len(employee_ids) >= self.ann_min_size):
+            # Reuse the previous centroids when reloading a gallery of similar size
+            previous = self.index if self.snapshot is not None else None
+            index = IVFIndex.build(employee_ids, counts, matrix, scales, sq_norms, self.encoding_format,
+                                   self.ann_lists, previous)
+        self.snapshot = (employee_ids, names, matrix, sq_norms, index_by_id, counts, starts, scales, index)
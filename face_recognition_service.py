@@ -4,25 +4,108 @@ Handles all face detection, encoding, and recognition operations
 """
 import cv2
 import face_recognition
+import logging
 import numpy as np
 import os
 from datetime import datetime
 
+import metrics
+
+from camera_service import CameraSession
+from encoding_format import decode_templates
+from face_gallery import FaceGallery, robust_mean_template, select_templates
+from frame_quality import QualityGate, sharpness
+from encoding_cache import EncodingCache
+from image_writer import ImageWriter
+from image_store import ImageStore, parse_retention
+from threshold_calibration import ThresholdPolicy
+
+NO_FACE_MESSAGE = "No face detected."
+
+logger = logging.getLogger(__name__)
+
+class FaceDetection:
+    """Result of one detection pass over a captured frame
+
+    `face_locations` are in the coordinates of the downscaled detection frame;
+    `scale` maps them back onto the full-resolution `frame`.
+    """
+    def __init__(self, frame, face_locations, face_encodings, scale):
+        self.frame = frame
+        self.face_locations = face_locations
+        self.face_encodings = face_encodings
+        self.scale = scale
+
+    @property
+    def face_encoding(self):
+        return self.face_encodings[0] if len(self.face_encodings) > 0 else None
+
+    def full_resolution_location(self, index=0):
+        """Face box (top, right, bottom, left) in full-resolution frame coordinates"""
+        top, right, bottom, left = self.face_locations[index]
+        height, width = self.frame.shape[:2]
+        factor = 1.0 / self.scale
+        return (max(int(top * factor), 0), min(int(right * factor), width),
+                min(int(bottom * factor), height), max(int(left * factor), 0))
+
+    def face_image(self, index=0):
+        """Crop the face at `index` from the full-resolution frame"""
+        top, right, bottom, left = self.full_resolution_location(index)
+        return self.frame[top:bottom, left:right]
+
 class FaceRecognitionService:
-    def __init__(self):
-        self.FACE_DISTANCE_THRESHOLD = 0.6
+    def __init__(self, camera_session=None):
+        # Calibrated by threshold_calibration.py; 0.6 until a thresholds file exists
+        self.threshold_policy = ThresholdPolicy.load(
+            os.getenv("threshold_file", os.path.join(os.path.expanduser("~"), "attendance_thresholds.json")), 0.6)
+        self.FACE_DISTANCE_THRESHOLD = self.threshold_policy.site_threshold
+        self.employee_departments = {}
+        self.DETECTION_SCALE = 0.25
+        self.image_writer = ImageWriter(int(os.getenv("image_queue_size", "256")),
+                                        int(os.getenv("image_jpeg_quality", "90")),
+                                        os.getenv("image_flush_on_shutdown", "drain"))
+        self.image_store = ImageStore(os.getenv("image_store_root", os.path.join(os.path.expanduser("~"), "attendance_images")),
+                                      self.image_writer,
+                                      int(os.getenv("image_jpeg_quality", "90")),
+                                      parse_retention(os.getenv("image_retention_days", "failed=90")))
+        self.quality_frames = int(os.getenv("quality_frames", "5"))
+        # The ring buffer must hold every frame a punch ranks
+        self.camera = camera_session or CameraSession(os.getenv("camera_source", "0"),
+                                                      buffer_size=max(5, self.quality_frames))
+        if self.quality_frames > self.camera.buffer_size:
+            logger.warning("quality_frames=%d exceeds the camera buffer of %d frames; using %d",
+                           self.quality_frames, self.camera.buffer_size, self.camera.buffer_size)
+            self.quality_frames = self.camera.buffer_size
+        self.gallery = FaceGallery(self.FACE_DISTANCE_THRESHOLD, float(os.getenv("identify_min_margin", "0.0")),
+                                   os.getenv("gallery_format", "float32"),
+                                   int(os.getenv("ann_min_gallery", "100000")),
+                                   int(os.getenv("ann_probes", "16")),
+                                   int(os.getenv("ann_lists", "0")))
+        self.enrollment_samples = int(os.getenv("enrollment_samples", "5"))
+        self.enrollment_mode = os.getenv("enrollment_mode", "multi")
+        self.enrollment_max_templates = int(os.getenv("enrollment_max_templates", "5"))
+        self.quality_gate = QualityGate(float(os.getenv("min_face_sharpness", "40")),
+                                        float(os.getenv("min_face_brightness", "40")),
+                                        float(os.getenv("max_face_brightness", "220")),
+                                        int(os.getenv("min_face_size", "30")))
+        # Detection is the next most expensive step; frames past the sharpest few rarely help
+        self.quality_max_detections = int(os.getenv("quality_max_detections", "2"))
+        self.quality_rejections = {reason: 0 for reason in QualityGate.REASONS}
+        self.encoding_cache = EncodingCache(int(os.getenv("encoding_cache_size", "100000")),
+                                            int(os.getenv("encoding_cache_max_bytes", str(256 * 1024 * 1024))))
 
     def capture_image_from_camera(self):
-        """Capture image from camera"""
-        cap = cv2.VideoCapture(0)
-        ret, frame = cap.read()
-        cap.release()
-        return ret, frame
+        """Capture the freshest frame from the shared camera session"""
+        return self.camera.read()
+
+    def downscale(self, frame):
+        """RGB detection frame at DETECTION_SCALE"""
+        small_frame = cv2.resize(frame, (0, 0), fx=self.DETECTION_SCALE, fy=self.DETECTION_SCALE)
+        return cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
 
     def detect_faces(self, frame):
         """Detect faces in the frame and return face locations"""
-        small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        rgb_small_frame = self.downscale(frame)
         face_locations = face_recognition.face_locations(rgb_small_frame)
         return face_locations, rgb_small_frame
 
@@ -38,80 +121,174 @@ class FaceRecognitionService:
             return face_encodings[0], None
         return None, "Could not encode face."
 
-    def compare_faces(self, known_face_encoding, face_encoding):
-        """Compare face encodings and determine if they match"""
+    def capture_enrollment_samples(self, count=None, max_frames=30, timeout=3.0):
+        """Encode up to `count` usable frames from the live camera for enrollment
+
+        Frames with no face, several faces or a face failing the quality gate
+        (judged on the downscaled detection frame, before encoding) are skipped. Returns
+        (encodings, best_frame, best_locations, rejected) where `rejected`
+        counts skipped frames by reason; best_frame is the sharpest accepted
+        frame, used for the registration image.
+        """
+        count = count or self.enrollment_samples
+        encodings = []
+        rejected = dict({"no_face": 0, "multiple_faces": 0}, **{reason: 0 for reason in QualityGate.REASONS})
+        best_frame, best_locations, best_sharpness = None, None, -1.0
+        frame_count = 0
+        for _ in range(max_frames):
+            if len(encodings) >= count:
+                break
+            ret, frame, frame_count = self.camera.read_new(frame_count, timeout)
+            if not ret:
+                break
+            face_locations, rgb_small_frame = self.detect_faces(frame)
+            if len(face_locations) == 0:
+                rejected["no_face"] += 1
+                continue
+            if len(face_locations) > 1:
+                rejected["multiple_faces"] += 1
+                continue
+            face_sharpness, reason = self.quality_gate.check_face(rgb_small_frame, face_locations[0])
+            if reason is not None:
+                rejected[reason] += 1
+                continue
+            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+            if len(face_encodings) == 0:
+                continue
+            encodings.append(face_encodings[0])
+            if face_sharpness > best_sharpness:
+                best_frame, best_locations, best_sharpness = frame, face_locations, face_sharpness
+        return encodings, best_frame, best_locations, rejected
+
+    def build_enrollment_template(self, encodings):
+        """Stored form of a burst: several templates (enrollment_mode=multi) or one robust mean (mean)"""
+        if self.enrollment_mode == "mean":
+            return robust_mean_template(encodings)
+        return select_templates(encodings, self.enrollment_max_templates)
+
+    def threshold_for(self, emp_id=None):
+        """Match threshold for an employee: their department's calibrated one, else the site's"""
+        dept_id = self.employee_departments.get(str(emp_id)) if emp_id is not None else None
+        if dept_id is None:
+            return self.FACE_DISTANCE_THRESHOLD
+        return self.threshold_policy.threshold_for_department(dept_id)
+
+    def compare_faces(self, known_face_encoding, face_encoding, emp_id=None):
+        """Compare face encodings and determine if they match, using the claimed employee's threshold"""
         if known_face_encoding is None or face_encoding is None:
             return False, 1.0
         
-        face_distance = face_recognition.face_distance([known_face_encoding], face_encoding)[0]
-        matches = face_distance <= self.FACE_DISTANCE_THRESHOLD
+        # Multi-sample enrollments store several templates; the closest one decides
+        with metrics.span("matching"):
+            known_face_encodings = np.asarray(known_face_encoding, dtype=np.float64).reshape(-1, 128)
+            face_distance = float(face_recognition.face_distance(known_face_encodings, face_encoding).min())
+        matches = face_distance <= self.threshold_for(emp_id)
         return matches, face_distance
 
-    def extract_and_save_face(self, frame, face_locations, emp_id, output_dir):
-        """Extract face from frame and save to directory"""
+    def extract_and_save_face(self, frame, face_locations, emp_id):
+        """Extract face from frame and store it as the registration image"""
         if len(face_locations) > 0:
-            y1, x2, y2, x1 = face_locations[0]
-            face_image = frame[y1*4:y2*4, x1*4:x2*4]
-
-            if not os.path.exists(output_dir):
-                os.makedirs(output_dir)
-            
-            image_path = os.path.join(output_dir, f"{emp_id}.jpg")
-            cv2.imwrite(image_path, face_image)
-            return image_path
+            face_image = FaceDetection(frame, face_locations, [], self.DETECTION_SCALE).face_image()
+            return self.image_store.put("register", face_image, emp_id)
         return None
 
-    def save_face_image(self, frame, face_loc, id, output_dir):
-        """Save face image for attendance tracking"""
-        y1, x2, y2, x1 = face_loc[0], face_loc[1], face_loc[2], face_loc[3]
-        face_image = frame[y1*4:y2*4, x1*4:x2*4]
-
-        # Display captured image briefly
-        cv2.imshow("Captured image", frame)
-        cv2.waitKey(2000)
-        cv2.destroyAllWindows()
-
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        image_path = os.path.join(output_dir, f"{id}.jpg")
-        cv2.imwrite(image_path, face_image)
-        return image_path
+    def save_face_image(self, detection, kind, emp_id, face_index=0):
+        """Store the face image for attendance tracking; returns its final path without waiting for the write"""
+        return self.image_store.put(kind, detection.face_image(face_index), emp_id)
 
     def process_attendance_image(self, emp_id):
-        """Process image for attendance marking"""
-        cap = cv2.VideoCapture(0)
-        ret, frame = cap.read()
-        cap.release()
-        
-        if not ret:
-            return None, None, "Failed to capture image."
-        
-        face_locations, rgb_small_frame = self.detect_faces(frame)
-        
-        if len(face_locations) == 0:
-            return None, None, "No face detected."
+        """Capture, detect and encode once; the FaceDetection is reused for the rest of the punch
+
+        The last `quality_frames` buffered frames are ranked by sharpness and
+        the first whose faces pass the quality gate is encoded. Faces that
+        fail it (too small, badly exposed, blurry) are never encoded, and a
+        punch with no acceptable face returns the reason as its error.
+        """
+        with metrics.span("capture"):
+            frames = self.camera.recent_frames(self.quality_frames)
+        if not frames:
+            return None, "Failed to capture image."
         
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        # Cheapest check first: rank whole frames by sharpness, then detect in that order
+        with metrics.span("quality"):
+            candidates = [(frame, self.downscale(frame)) for frame in frames]
+            candidates.sort(key=lambda candidate: sharpness(candidate[1]), reverse=True)
         
-        if len(face_encodings) > 0:
-            face_encoding = face_encodings[0]
-            return frame, face_encoding, None
+        reason = None
+        any_face = False
+        for frame, rgb_small_frame in candidates[:self.quality_max_detections]:
+            with metrics.span("detection"):
+                face_locations = face_recognition.face_locations(rgb_small_frame)
+            if len(face_locations) == 0:
+                continue
+            any_face = True
+            accepted = []
+            for face_location in face_locations:
+                _, face_reason = self.quality_gate.check_face(rgb_small_frame, face_location)
+                if face_reason is None:
+                    accepted.append(face_location)
+                else:
+                    reason = reason or face_reason
+            if not accepted:
+                continue
+            
+            with metrics.span("encoding"):
+                face_encodings = face_recognition.face_encodings(rgb_small_frame, accepted)
+            if len(face_encodings) > 0:
+                return FaceDetection(frame, accepted, face_encodings, self.DETECTION_SCALE), None
+            return None, "Could not encode face."
         
-        return None, None, "Could not encode face."
+        if not any_face:
+            return None, NO_FACE_MESSAGE
+        self.quality_rejections[reason] += 1
+        metrics.increment("quality_rejections_total", reason=reason)
+        return None, self.quality_gate.message(reason)
 
     def validate_employee_face(self, face_encoding, known_face_encoding_bytes):
         """Validate employee face against stored encoding"""
         if known_face_encoding_bytes is None:
             return False, 1.0
         
-        known_face_encoding = np.frombuffer(known_face_encoding_bytes)
+        known_face_encoding = decode_templates(known_face_encoding_bytes)
         return self.compare_faces(known_face_encoding, face_encoding)
 
-    def create_camera_window_update_function(self, lmain, cap, capture_window):
+    def employee_registered(self, emp_id, emp_name, face_encoding, dept_id=None):
+        """Refresh cached state after an employee's row was written"""
+        self.encoding_cache.invalidate(emp_id)
+        if dept_id is not None:
+            self.employee_departments[str(emp_id)] = dept_id
+        if self.gallery.loaded:
+            self.gallery.add(emp_id, emp_name, face_encoding)
+
+    def employee_deactivated(self, emp_id):
+        """Drop cached state for an employee who can no longer punch"""
+        self.encoding_cache.invalidate(emp_id)
+        self.gallery.remove(emp_id)
+
+    def identify_face(self, face_encoding):
+        """Identify a face against the in-memory gallery (1:N)"""
+        results = self.identify_faces([face_encoding]) if face_encoding is not None else []
+        return results[0] if results else None
+
+    def identify_faces(self, face_encodings):
+        """Identify several faces in one gallery pass, judging each best match by its department's threshold"""
+        with metrics.span("identification"):
+            results = self.gallery.identify_batch(face_encodings)
+        if self.threshold_policy.department_thresholds:
+            for result in results:
+                result.is_match = (result.distance <= self.threshold_for(result.employee_id)
+                                   and result.margin >= self.gallery.min_margin)
+        return results
+
+    def create_camera_window_update_function(self, lmain, camera, capture_window):
         """Create update function for camera preview window"""
+        camera.start()
+        started_at = datetime.now()
+
         def update_frame():
-            ret, frame = cap.read()
+            if not capture_window.winfo_exists():
+                return
+            ret, frame = camera.get_latest_frame()
             if ret:
                 cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
                 from PIL import Image, ImageTk
@@ -119,10 +296,18 @@ class FaceRecognitionService:
                 imgtk = ImageTk.PhotoImage(image=img)
                 lmain.imgtk = imgtk
                 lmain.configure(image=imgtk)
-                lmain.after(10, update_frame)
-            else:
-                cap.release()
+                lmain.after(30, update_frame)
+            elif camera.last_error and (datetime.now() - started_at).total_seconds() > 3:
                 capture_window.destroy()
                 from tkinter import messagebox
-                messagebox.showerror("Error", "Failed to access camera.")
-        return update_frame
\ No newline at end of file
+                messagebox.showerror("Error", camera.last_error)
+            else:
+                # Grabber is still opening the device
+                lmain.after(30, update_frame)
+        return update_frame
+
+    def close(self):
+        """Release the camera session and finish pending image writes"""
+        self.camera.stop()
+        self.image_writer.shutdown()
+        self.image_store.close()
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+Frame Quality Module
+Cheap checks that reject unusable frames before the expensive face encoding step
+"""
+import cv2
+import numpy as np
+
+
+def sharpness(image):
+    """Variance of the Laplacian; low values mean a blurry or motion-smeared image"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    return float(cv2.Laplacian(image, cv2.CV_64F).var())
+
+
+def brightness(image):
+    """Mean intensity (0-255); too low is underexposed, too high is washed out"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    return float(np.mean(image))
+
+
+def face_crop(image, face_location):
+    """Crop a (top, right, bottom, left) face box from an image"""
+    top, right, bottom, left = face_location
+    return image[max(top, 0):max(bottom, 0), max(left, 0):max(right, 0)]
+
+
+class QualityGate:
+    """Accepts or rejects detected faces before they are encoded
+
+    All checks run on the downscaled RGB detection frame, so they cost a
+    small fraction of one face_encodings call. Sizes are in detection-frame
+    pixels.
+    """
+    REASONS = {
+        "small": "Face too small, move closer to the camera.",
+        "dark": "Image too dark.",
+        "bright": "Image too bright.",
+        "blurry": "Image too blurry, hold still.",
+    }
+
+    def __init__(self, min_sharpness=40.0, min_brightness=40.0, max_brightness=220.0, min_face_size=30):
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_face_size = min_face_size
+
+    def check_face(self, rgb_small_frame, face_location):
+        """(face sharpness, None) for an acceptable face, else (sharpness or 0.0, rejection reason)"""
+        top, right, bottom, left = face_location
+        if min(bottom - top, right - left) < self.min_face_size:
+            return 0.0, "small"
+        gray = cv2.cvtColor(face_crop(rgb_small_frame, face_location), cv2.COLOR_RGB2GRAY)
+        if gray.size == 0:
+            return 0.0, "small"
+        face_brightness = brightness(gray)
+        if face_brightness < self.min_brightness:
+            return 0.0, "dark"
+        if face_brightness > self.max_brightness:
+            return 0.0, "bright"
+        face_sharpness = sharpness(gray)
+        if face_sharpness < self.min_sharpness:
+            return face_sharpness, "blurry"
+        return face_sharpness, None
+
+    def message(self, reason):
+        return self.REASONS.get(reason, "Poor image quality.")
@@ -0,0 +1,183 @@
+"""
+Gallery Snapshot Module
+Memory-mapped on-disk gallery shared between kiosk processes and kept current by delta sync
+"""
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import encoding_format
+from face_gallery import ENCODING_DIMENSIONS, unpack_templates
+
+SNAPSHOT_VERSION = 2
+CURRENT_FILE = "CURRENT"
+
+
+class SnapshotData:
+    """One published generation: ids, names, per-employee template counts and the template matrix
+
+    `matrix` is a read-only memory map in the snapshot's encoding format
+    (with per-row `scales` for int8), so every process that opens the same
+    generation shares one copy in the page cache.
+    """
+    def __init__(self, path, employee_ids, names, counts, matrix, scales, watermark):
+        self.path = path
+        self.employee_ids = employee_ids
+        self.names = names
+        self.counts = counts
+        self.matrix = matrix
+        self.scales = scales
+        self.watermark = watermark
+        # Rows this generation applied on top of the previous one, when sync() published it as a delta
+        self.changes = None
+        self.index_by_id = None
+
+    def __len__(self):
+        return len(self.employee_ids)
+
+    def templates(self, emp_id):
+        """An employee's rows of the matrix and their scales, or None if they are not in this generation"""
+        if self.index_by_id is None:
+            self.index_by_id = {emp_id: i for i, emp_id in enumerate(self.employee_ids)}
+        index = self.index_by_id.get(str(emp_id))
+        if index is None:
+            return None
+        rows = slice(int(self.counts[:index].sum()), int(self.counts[:index + 1].sum()))
+        return self.matrix[rows], None if self.scales is None else self.scales[rows]
+
+
+class GallerySnapshot:
+    """Gallery persisted as .npy files under `root`, refreshed from the database by watermark
+
+    Each sync pulls only employees whose em_updated_at is past the stored
+    watermark (less `overlap_seconds`, to catch rows committed late with an
+    earlier timestamp; re-applying a row is harmless). If anything changed, a
+    new generation directory is written and published by atomically
+    replacing the CURRENT file. Readers keep the generation they mapped, so a
+    generation is only deleted once it is `keep_seconds` old.
+    """
+    def __init__(self, root, encoding_format="float32", overlap_seconds=60, keep_seconds=3600):
+        self.root = root
+        self.encoding_format = encoding_format
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.keep_seconds = keep_seconds
+        os.makedirs(root, exist_ok=True)
+
+    def open(self):
+        """Map the current generation, or None if none has been published"""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        path = os.path.join(self.root, name)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != SNAPSHOT_VERSION:
+            return None
+        watermark = datetime.fromisoformat(meta["watermark"]) if meta.get("watermark") else None
+        scales_path = os.path.join(path, "scales.npy")
+        return SnapshotData(path,
+                            np.load(os.path.join(path, "ids.npy")).tolist(),
+                            np.load(os.path.join(path, "names.npy")).tolist(),
+                            np.load(os.path.join(path, "counts.npy")),
+                            np.load(os.path.join(path, "matrix.npy"), mmap_mode="r"),
+                            np.load(scales_path) if os.path.exists(scales_path) else None,
+                            watermark)
+
+    def sync(self, db, current=None):
+        """Apply database changes since the watermark; returns the (possibly new) current generation
+
+        `current` is the generation already opened by the caller, if any. A
+        generation published on top of it carries the applied rows in
+        `changes`, so a gallery built from `current` can take just those.
+        """
+        current = current if current is not None else self.open()
+        if (current is None or current.watermark is None
+                or encoding_format.compact_format(current.matrix, current.scales) != self.encoding_format):
+            rows = db.get_face_encoding_changes(None)
+            empty, empty_scales = encoding_format.quantize(np.empty((0, ENCODING_DIMENSIONS)), self.encoding_format)
+            return self._publish(*self._build([], [], np.empty(0, dtype=np.intp), empty, empty_scales, rows))
+        rows = db.get_face_encoding_changes(current.watermark - self.overlap)
+        changed = [row for row in rows if not self._already_applied(current, row)]
+        if not changed:
+            return current
+        generation = self._publish(*self._build(current.employee_ids, current.names, current.counts, current.matrix,
+                                                current.scales, changed, current.watermark))
+        generation.changes = changed
+        return generation
+
+    def _already_applied(self, current, row):
+        """True if the generation already reflects this row, e.g. one re-read through the overlap window"""
+        emp_id, name, encoding_bytes, active, _ = row
+        stored = current.templates(emp_id)
+        if not active or encoding_bytes is None:
+            return stored is None
+        if stored is None or current.names[current.index_by_id[str(emp_id)]] != name:
+            return False
+        compact, scales = encoding_format.quantize(unpack_templates(encoding_bytes), self.encoding_format)
+        return np.array_equal(stored[0], compact) and (scales is None or np.array_equal(stored[1], scales))
+
+    def _build(self, employee_ids, names, counts, matrix, scales, rows, watermark=None):
+        """Arrays for the next generation: unchanged employees first, then every changed one still enrolled"""
+        changed_ids = {str(row[0]) for row in rows}
+        keep = np.array([emp_id not in changed_ids for emp_id in employee_ids], dtype=bool)
+        kept_rows = np.repeat(keep, counts) if len(employee_ids) else np.zeros(0, dtype=bool)
+        blocks = [np.asarray(matrix)[kept_rows]]
+        scale_blocks = None if scales is None else [np.asarray(scales)[kept_rows]]
+        new_ids = [emp_id for emp_id, kept in zip(employee_ids, keep) if kept]
+        new_names = [name for name, kept in zip(names, keep) if kept]
+        new_counts = [np.asarray(counts)[keep]] if len(employee_ids) else []
+
+        latest = {}
+        for row in rows:
+            latest[str(row[0])] = row
+            if row[4] is not None and (watermark is None or row[4] > watermark):
+                watermark = row[4]
+        added_counts = []
+        for emp_id, (_, name, encoding_bytes, active, _) in latest.items():
+            if not active or encoding_bytes is None:
+                continue
+            templates, template_scales = encoding_format.quantize(unpack_templates(encoding_bytes), self.encoding_format)
+            new_ids.append(emp_id)
+            new_names.append(name)
+            blocks.append(templates)
+            if scale_blocks is not None:
+                scale_blocks.append(template_scales)
+            added_counts.append(len(templates))
+        new_counts.append(np.array(added_counts, dtype=np.intp))
+        return (new_ids, new_names, np.concatenate(new_counts).astype(np.intp), np.concatenate(blocks),
+                None if scale_blocks is None else np.concatenate(scale_blocks), watermark)
+
+    def _publish(self, employee_ids, names, counts, matrix, scales, watermark):
+        name = f"gen-{time.time_ns()}-{os.getpid()}"
+        path = os.path.join(self.root, name)
+        os.makedirs(path)
+        np.save(os.path.join(path, "ids.npy"), np.array(employee_ids, dtype=str))
+        np.save(os.path.join(path, "names.npy"), np.array(names, dtype=str))
+        np.save(os.path.join(path, "counts.npy"), counts)
+        np.save(os.path.join(path, "matrix.npy"), np.ascontiguousarray(matrix))
+        if scales is not None:
+            np.save(os.path.join(path, "scales.npy"), scales)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "employees": len(employee_ids), "templates": len(matrix),
+                       "encoding_format": self.encoding_format,
+                       "watermark": watermark.isoformat() if watermark else None}, f)
+
+        temp_path = os.path.join(self.root, f"{CURRENT_FILE}.{name}.tmp")
+        with open(temp_path, "w") as f:
+            f.write(name)
+        os.replace(temp_path, os.path.join(self.root, CURRENT_FILE))
+        self._remove_old_generations(name)
+        return self.open()
+
+    def _remove_old_generations(self, current_name):
+        cutoff = time.time() - self.keep_seconds
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith("gen-") and name != current_name and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,206 @@
+"""
+Image Store Module
+Content-addressed, date/hash-sharded evidence image store with an index
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import cv2
+
+import metrics
+
+KINDS = ("checkin", "checkout", "failed", "register")
+
+
+def parse_retention(spec):
+    """Parse 'kind=days,kind=days' into {kind: days}"""
+    retention = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            kind, days = part.split("=", 1)
+            retention[kind.strip()] = int(days)
+    return retention
+
+
+class ImageStore:
+    """Evidence images named by the SHA-256 of their JPEG bytes
+
+    Layout: <root>/<kind>/<YYYY>/<MM>/<DD>/<hash[:2]>/<hash>.jpg. Day and
+    hash-prefix sharding keeps every directory small however many images
+    accumulate, and identical frames of the same kind and day are stored
+    once. A SQLite index maps transactions and employees to their images,
+    so lookups, retention and compaction never list directories.
+    """
+    def __init__(self, root, image_writer, jpeg_quality=90, retention_days=None):
+        self.root = root
+        self.image_writer = image_writer
+        self.jpeg_quality = jpeg_quality
+        self.retention_days = retention_days or {}
+        self.lock = threading.Lock()
+        self.timer = None
+        os.makedirs(root, exist_ok=True)
+        self.index = sqlite3.connect(os.path.join(root, "index.sqlite3"), check_same_thread=False)
+        self.index.execute("PRAGMA journal_mode=WAL")
+        self.index.execute("PRAGMA synchronous=NORMAL")
+        self.index.executescript("""
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                employee_id TEXT,
+                day TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                refs INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE INDEX IF NOT EXISTS idx_images_employee_day ON images (employee_id, day);
+            CREATE INDEX IF NOT EXISTS idx_images_kind_created ON images (kind, created_at);
+            CREATE TABLE IF NOT EXISTS transaction_images (
+                transaction_id INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                path TEXT NOT NULL,
+                PRIMARY KEY (transaction_id, role)
+            );
+            CREATE INDEX IF NOT EXISTS idx_transaction_images_path ON transaction_images (path);
+        """)
+        self.index.commit()
+
+    def put(self, kind, image, emp_id=None, captured_at=None):
+        """Encode, hash and queue an image; returns its final path straight away"""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown image kind: {kind}")
+        with metrics.span("image_encode"):
+            ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return None
+        data = buffer.tobytes()
+        digest = hashlib.sha256(data).hexdigest()
+        captured_at = captured_at or datetime.now()
+        day = captured_at.strftime("%Y-%m-%d")
+        path = os.path.join(self.root, kind, captured_at.strftime("%Y"), captured_at.strftime("%m"),
+                            captured_at.strftime("%d"), digest[:2], f"{digest}.jpg")
+
+        with self.lock:
+            cursor = self.index.execute("UPDATE images SET refs = refs + 1 WHERE path = ?", (path,))
+            is_new = cursor.rowcount == 0
+            if is_new:
+                self.index.execute("""
+                    INSERT INTO images (path, sha256, kind, employee_id, day, created_at, size)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (path, digest, kind, None if emp_id is None else str(emp_id), day, captured_at.timestamp(), len(data)))
+            self.index.commit()
+
+        if is_new and self.image_writer.submit_bytes(path, data) is None:
+            self._forget(path)
+            return None
+        return path
+
+    def link_transaction(self, transaction_id, role, path):
+        """Record that `path` is the `role` ('in' or 'out') image of a transaction"""
+        if transaction_id is None or path is None:
+            return
+        with self.lock:
+            self.index.execute("INSERT OR REPLACE INTO transaction_images (transaction_id, role, path) VALUES (?, ?, ?)",
+                               (transaction_id, role, path))
+            self.index.commit()
+
+    def link_checkout(self, emp_id, day, path):
+        """Attach a check-out image to the transaction of the same employee's check-in that day"""
+        with self.lock:
+            row = self.index.execute("""
+                SELECT ti.transaction_id FROM images i
+                JOIN transaction_images ti ON ti.path = i.path AND ti.role = 'in'
+                WHERE i.employee_id = ? AND i.day = ? AND i.kind = 'checkin'
+                ORDER BY i.created_at DESC LIMIT 1
+            """, (str(emp_id), day)).fetchone()
+        if row:
+            self.link_transaction(row[0], "out", path)
+
+    def get_transaction_images(self, transaction_id):
+        """{role: path} for a transaction"""
+        with self.lock:
+            rows = self.index.execute("SELECT role, path FROM transaction_images WHERE transaction_id = ?",
+                                      (transaction_id,)).fetchall()
+        return dict(rows)
+
+    def find_images(self, emp_id, day=None, kind=None):
+        """Paths of an employee's images, optionally for one day and kind, oldest first"""
+        query = "SELECT path FROM images WHERE employee_id = ?"
+        params = [str(emp_id)]
+        if day is not None:
+            query += " AND day = ?"
+            params.append(day)
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        with self.lock:
+            return [row[0] for row in self.index.execute(query + " ORDER BY created_at", params).fetchall()]
+
+    def apply_retention(self, now=None):
+        """Delete images older than their kind's retention period; returns the number removed"""
+        now = now or datetime.now()
+        removed = 0
+        for kind, days in self.retention_days.items():
+            cutoff = (now - timedelta(days=days)).timestamp()
+            with self.lock:
+                paths = [row[0] for row in self.index.execute(
+                    "SELECT path FROM images WHERE kind = ? AND created_at < ?", (kind, cutoff)).fetchall()]
+            for path in paths:
+                self._delete(path)
+                removed += 1
+        return removed
+
+    def compact(self):
+        """Drop index rows whose files are gone and reclaim index space"""
+        # Files still queued in the writer are not missing yet
+        self.image_writer.flush()
+        with self.lock:
+            paths = [row[0] for row in self.index.execute("SELECT path FROM images").fetchall()]
+        missing = [path for path in paths if not os.path.exists(path)]
+        for path in missing:
+            self._forget(path)
+        with self.lock:
+            self.index.execute("VACUUM")
+        return len(missing)
+
+    def start_maintenance(self, interval=24 * 60 * 60):
+        """Apply retention now and then every `interval` seconds"""
+        def run():
+            try:
+                self.apply_retention()
+            except Exception as e:
+                print(f"Image retention failed: {e}")
+            self.timer = threading.Timer(interval, run)
+            self.timer.daemon = True
+            self.timer.start()
+        threading.Thread(target=run, name="image-retention", daemon=True).start()
+
+    def close(self):
+        if self.timer is not None:
+            self.timer.cancel()
+        with self.lock:
+            self.index.close()
+
+    def _delete(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        self._forget(path)
+        # Remove now-empty shard directories up to (not including) the root
+        directory = os.path.dirname(path)
+        while os.path.abspath(directory) != os.path.abspath(self.root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    def _forget(self, path):
+        with self.lock:
+            self.index.execute("DELETE FROM images WHERE path = ?", (path,))
+            self.index.execute("DELETE FROM transaction_images WHERE path = ?", (path,))
+            self.index.commit()
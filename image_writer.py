@@ -0,0 +1,135 @@
+"""
+Image Writer Module
+Writes evidence images on a background thread behind a bounded queue
+"""
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+import metrics
+
+FLUSH_POLICIES = ("drain", "drop")
+
+
+class ImageWriter:
+    """Bounded-queue background writer for check-in, check-out, failed-attempt and registration crops
+
+    Callers get the final path back immediately and can store it in the
+    database before the bytes reach the disk. When the queue is full,
+    submit() waits up to `block_timeout` seconds (backpressure) and then drops
+    the image. On shutdown, the "drain" policy writes everything still queued
+    and the "drop" policy discards it.
+    """
+    def __init__(self, max_queue=256, jpeg_quality=90, flush_on_shutdown="drain", block_timeout=0.5):
+        if flush_on_shutdown not in FLUSH_POLICIES:
+            raise ValueError(f"flush_on_shutdown must be one of {FLUSH_POLICIES}")
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.jpeg_quality = jpeg_quality
+        self.flush_on_shutdown = flush_on_shutdown
+        self.block_timeout = block_timeout
+        self.lock = threading.Lock()
+        self.metrics = {
+            "submitted": 0,
+            "written": 0,
+            "failed": 0,
+            "dropped": 0,
+            "max_queue_depth": 0,
+            "blocked_seconds": 0.0,
+            "write_seconds": 0.0,
+        }
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, name="image-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, path, image):
+        """Queue an image for writing to `path`; returns the path, or None if it was dropped"""
+        # Detach the crop from the full frame so the frame can be freed
+        return self._enqueue((path, image.copy()))
+
+    def submit_bytes(self, path, data):
+        """Queue already-encoded bytes for writing to `path`; returns the path, or None if it was dropped"""
+        return self._enqueue((path, data))
+
+    def _enqueue(self, job):
+        if self.stopping:
+            return None
+        path = job[0]
+        started = time.perf_counter()
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            try:
+                self.queue.put(job, timeout=self.block_timeout)
+            except queue.Full:
+                self._count("dropped")
+                return None
+            finally:
+                self._count("blocked_seconds", time.perf_counter() - started)
+
+        with self.lock:
+            self.metrics["submitted"] += 1
+            self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], self.queue.qsize())
+        return path
+
+    def flush(self):
+        """Block until every queued image has been written"""
+        self.queue.join()
+
+    def shutdown(self):
+        """Stop the writer, applying the flush-on-shutdown policy"""
+        if self.stopping:
+            return
+        self.stopping = True
+        if self.flush_on_shutdown == "drop":
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._count("dropped")
+                self.queue.task_done()
+        self.queue.put(None)
+        self.thread.join()
+
+    def stats(self):
+        """Backpressure and throughput counters plus the current queue depth"""
+        with self.lock:
+            stats = dict(self.metrics)
+        stats["queue_depth"] = self.queue.qsize()
+        return stats
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                self.queue.task_done()
+                return
+            path, image = job
+            started = time.perf_counter()
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                if isinstance(image, bytes):
+                    # Write-then-rename so readers never see a partial file
+                    temp_path = f"{path}.tmp"
+                    with open(temp_path, "wb") as f:
+                        f.write(image)
+                    os.replace(temp_path, path)
+                    self._count("written")
+                elif cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]):
+                    self._count("written")
+                else:
+                    self._count("failed")
+            except Exception as e:
+                print(f"Failed to write image {path}: {e}")
+                self._count("failed")
+            finally:
+                self._count("write_seconds", time.perf_counter() - started)
+                metrics.observe("image_write", time.perf_counter() - started)
+                self.queue.task_done()
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.metrics[name] += amount
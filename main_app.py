@@ -3,46 +3,136 @@ Main Application File
 Biometric Attendance System - Microservices Architecture
 This file orchestrates all the services and provides the GUI interface
 """
+from startup_profiler import StartupProfiler
 import tkinter as tk
+import logging
 import os
 import sys
-import cv2
-import numpy as np
+import queue
+import threading
 from tkinter import messagebox, ttk
-from PIL import Image, ImageTk
-from tkcalendar import DateEntry
-from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
-# Import our microservices
-from database_service import DatabaseService
-from face_recognition_service import FaceRecognitionService
-from admin_service import AdminService, InvalidDepartmentSelectionError
-from attendance_service import AttendanceService
+# Heavy modules (cv2, face_recognition/dlib, mysql, matplotlib, openpyxl) and our
+# microservices are imported by the warm-up thread or on first use, so the
+# main window appears before they load.
+from punch_pipeline import PunchPipeline
+from dotenv import load_dotenv
+import metrics
+
+logger = logging.getLogger(__name__)
 
 class BiometricAttendanceApp:
     def __init__(self):
-        # Initialize services
-        self.db_service = DatabaseService()
-        self.face_service = FaceRecognitionService()
-        self.admin_service = AdminService(self.db_service)
-        self.attendance_service = AttendanceService(self.db_service, self.face_service)
+        self.profiler = StartupProfiler()
+        self.db_service = None
+        self.face_service = None
+        self.admin_service = None
+        self.attendance_service = None
+        self.punch_pipeline = None
+        self.ready = False
         
         # Initialize GUI
-        self.root = tk.Tk()
-        self.root.title("Biometric Attendance System")
-        self.root.geometry("800x600")
-        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
-        
-        # Create frames
-        self.setup_frames()
-        self.setup_main_frame()
-        self.setup_admin_login_frame()
-        self.setup_attendance_frame()
-        
-        # Show initial frame
-        self.show_frame(self.main_frame)
+        with self.profiler.stage("create main window"):
+            self.root = tk.Tk()
+            self.root.title("Biometric Attendance System")
+            self.root.geometry("800x600")
+            self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+            
+            # Create frames
+            self.setup_frames()
+            self.setup_main_frame()
+            self.setup_admin_login_frame()
+            self.setup_attendance_frame()
+            
+            # Show initial frame
+            self.show_frame(self.main_frame)
+        self.root.after_idle(lambda: self.profiler.mark("main window shown"))
+        
+        self.start_warm_up()
+
+    def start_warm_up(self):
+        """Load services, database and face models on a background thread"""
+        self.warm_up_results = queue.Queue()
+        threading.Thread(target=self._warm_up, name="warm-up", daemon=True).start()
+        self.root.after(100, self._check_warm_up)
+
+    def _warm_up(self):
+        try:
+            with self.profiler.stage("import cv2, numpy"):
+                import cv2
+                import numpy
+            with self.profiler.stage("import face_recognition (dlib models)"):
+                import face_recognition
+            with self.profiler.stage("import matplotlib"):
+                import matplotlib.figure
+                import matplotlib.backends.backend_tkagg
+            with self.profiler.stage("import services"):
+                from storage_backend import create_storage
+                from face_recognition_service import FaceRecognitionService
+                from admin_service import AdminService
+                from attendance_service import AttendanceService
+                from punch_journal import PunchJournal
+                from gallery_snapshot import GallerySnapshot
+            with self.profiler.stage("connect database, initialize tables"):
+                # Comes up offline if the database is unreachable
+                db_service = create_storage()
+            with self.profiler.stage("open punch journal"):
+                journal_dir = os.getenv("punch_journal_dir", os.path.join(os.path.expanduser("~"), "attendance_journal"))
+                punch_journal = PunchJournal(os.path.join(journal_dir, "punches.sqlite3"),
+                                             float(os.getenv("punch_journal_flush_ms", "20")) / 1000,
+                                             float(os.getenv("punch_replay_seconds", "5")),
+                                             int(os.getenv("punch_replay_batch_size", "500")))
+            with self.profiler.stage("create services"):
+                face_service = FaceRecognitionService()
+                admin_service = AdminService(db_service, face_service)
+                gallery_snapshot = GallerySnapshot(
+                    os.getenv("gallery_snapshot_dir", os.path.join(journal_dir, "gallery")),
+                    face_service.gallery.encoding_format)
+                attendance_service = AttendanceService(db_service, face_service, punch_journal, gallery_snapshot)
+            if metrics.configure_from_env():
+                metrics.add_gauge("image_queue_depth", face_service.image_writer.queue.qsize,
+                                  "Evidence images waiting to be written")
+                metrics.add_gauge("punch_journal_pending", punch_journal.pending_count,
+                                  "Offline punches not yet replayed to the database")
+            with self.profiler.stage("load gallery and encoding cache"):
+                attendance_service.load_gallery()
+            with self.profiler.stage("start camera session"):
+                face_service.camera.start()
+            face_service.image_store.start_maintenance()
+            punch_journal.start_replay(db_service, face_service.image_store)
+            attendance_service.start_gallery_sync(float(os.getenv("gallery_sync_seconds", "300")))
+            self.warm_up_results.put(((db_service, face_service, admin_service, attendance_service), None))
+        except Exception as e:
+            self.warm_up_results.put((None, e))
+
+    def _check_warm_up(self):
+        """Poll the warm-up thread from the Tk thread and switch to ready when it finishes"""
+        try:
+            services, error = self.warm_up_results.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self._check_warm_up)
+            return
+        
+        if error is not None:
+            self.ready_label.configure(text=f"Startup failed: {error}", fg="red")
+            messagebox.showerror("Startup Error", f"Failed to start services: {str(error)}")
+            return
+        
+        self.db_service, self.face_service, self.admin_service, self.attendance_service = services
+        
+        # Punches run on a worker thread so the window stays responsive
+        self.punch_pipeline = PunchPipeline(self.attendance_service, self.root)
+        
+        self.ready = True
+        self.profiler.mark("ready")
+        self.ready_label.configure(text="Ready", fg="green")
+        self.btn_admin.configure(state=tk.NORMAL)
+        self.btn_attendance.configure(state=tk.NORMAL)
+        
+        logger.info("Start-up breakdown:\n%s", self.profiler.report())
+        report_path = os.getenv("startup_report")
+        if report_path:
+            self.profiler.write_report(report_path)
 
     def setup_frames(self):
         """Setup main container frames"""
@@ -61,13 +151,41 @@ class BiometricAttendanceApp:
     def on_closing(self):
         """Handle application closing"""
         if messagebox.askokcancel("Quit", "Do you want to quit?"):
-            try:
-                self.db_service.close()
-            except:
-                pass
+            if self.ready:
+                self.shutdown_services()
             self.root.destroy()
             sys.exit()
 
+    def shutdown_services(self):
+        """Stop every service in order; a failing step is logged and the rest still run"""
+        journal = self.attendance_service.punch_journal
+        steps = [
+            ("punch pipeline", self.punch_pipeline.shutdown),
+            ("dashboard", self.admin_service.dashboard.stop),
+            ("run statistics", self.log_run_stats),
+            ("punch journal", journal.close if journal is not None else None),
+            ("gallery sync", self.attendance_service.stop_gallery_sync),
+            ("metrics", metrics.REGISTRY.stop),
+            ("face service", self.face_service.close),
+            ("database", self.db_service.close),
+        ]
+        for name, step in steps:
+            if step is None:
+                continue
+            try:
+                step()
+            except Exception:
+                logger.exception("Shutting down %s failed", name)
+
+    def log_run_stats(self):
+        """Log the counters collected during this run"""
+        logger.info("Punch throughput: %s", self.punch_pipeline.stats.summary())
+        logger.info("Encoding cache: %s", self.face_service.encoding_cache.stats())
+        logger.info("Image writer: %s", self.face_service.image_writer.stats())
+        journal = self.attendance_service.punch_journal
+        if journal is not None:
+            logger.info("Punch journal: %s", journal.stats())
+
     def setup_main_frame(self):
         """Setup main welcome frame"""
         for widget in self.main_frame.winfo_children():
@@ -75,13 +193,18 @@ class BiometricAttendanceApp:
         
         tk.Label(self.main_frame, text="Biometric Attendance System", font=("Arial", 24)).pack(pady=50)
         
-        btn_admin = tk.Button(self.main_frame, text="Admin Panel", font=("Arial", 16), 
-                             command=lambda: self.show_frame(self.admin_login_frame))
-        btn_admin.pack(pady=20)
+        state = tk.NORMAL if self.ready else tk.DISABLED
+        self.btn_admin = tk.Button(self.main_frame, text="Admin Panel", font=("Arial", 16), state=state,
+                                   command=lambda: self.show_frame(self.admin_login_frame))
+        self.btn_admin.pack(pady=20)
         
-        btn_attendance = tk.Button(self.main_frame, text="Mark Attendance", font=("Arial", 16),
-                                  command=lambda: self.show_frame(self.attendance_frame))
-        btn_attendance.pack(pady=20)
+        self.btn_attendance = tk.Button(self.main_frame, text="Mark Attendance", font=("Arial", 16), state=state,
+                                        command=lambda: self.show_frame(self.attendance_frame))
+        self.btn_attendance.pack(pady=20)
+        
+        self.ready_label = tk.Label(self.main_frame, text="Ready" if self.ready else "Starting up, loading face models...",
+                                    fg="green" if self.ready else "gray")
+        self.ready_label.pack(pady=10)
 
     def setup_admin_login_frame(self):
         """Setup admin login frame"""
@@ -147,16 +270,23 @@ class BiometricAttendanceApp:
         
         tk.Button(btn_frame, text="View Attendance", command=self.setup_view_attendance_frame).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Register Employee", command=self.setup_registration_frame).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Deactivate Employee", command=self.setup_deactivate_employee_frame).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Add Admin", command=self.setup_add_admin_frame).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Change Password", command=self.setup_change_password_frame).pack(side=tk.LEFT, padx=5)
+        tk.Button(btn_frame, text="Refresh", command=self.setup_admin_dashboard).pack(side=tk.LEFT, padx=5)
         tk.Button(btn_frame, text="Logout", command=lambda: self.show_frame(self.main_frame)).pack(side=tk.LEFT, padx=5)
 
     def create_dashboard_plot(self, attendance_data):
         """Create attendance dashboard plot"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        
         departments = [data[0] for data in attendance_data]
         attendance_percentages = [data[2] for data in attendance_data]
         
-        fig, ax = plt.subplots(figsize=(8, 4))
+        # A plain Figure (not pyplot) so refreshed dashboards don't accumulate open figures
+        fig = Figure(figsize=(8, 4))
+        ax = fig.add_subplot()
         ax.bar(departments, attendance_percentages)
         ax.set_ylabel('Attendance Percentage')
         ax.set_title('Department-wise Attendance Today')
@@ -168,6 +298,10 @@ class BiometricAttendanceApp:
 
     def setup_view_attendance_frame(self):
         """Setup view attendance frame"""
+        from tkcalendar import DateEntry
+        from admin_service import InvalidDepartmentSelectionError
+        from attendance_grid import AttendanceGrid
+        
         view_window = tk.Toplevel(self.root)
         view_window.title("View Attendance")
         view_window.geometry("800x600")
@@ -194,33 +328,70 @@ class BiometricAttendanceApp:
         end_date.grid(row=0, column=3, padx=5)
         
         # Display button
+        query = {}
+        
         def display_attendance():
             selected_department = department_var.get()
             try:
                 self.admin_service.validate_department_selection(selected_department)
-                attendance_data, export_records = self.attendance_service.get_attendance_records(
-                    selected_department, start_date.get(), end_date.get())
-                
-                # Create treeview for display
-                tree = ttk.Treeview(view_window, columns=('Date', 'EmpID', 'Name', 'CheckIn', 'CheckOut', 'WorkTime'), show='headings')
-                
-                for col in tree['columns']:
-                    tree.heading(col, text=col)
-                    tree.column(col, width=100)
-                
-                for record in attendance_data:
-                    tree.insert('', tk.END, values=record)
-                
-                tree.pack(fill=tk.BOTH, expand=True, pady=10)
-                
-                # Export button
-                tk.Button(view_window, text="Export to Excel", 
-                         command=lambda: self.attendance_service.export_attendance_to_excel(export_records)).pack(pady=5)
-                
             except InvalidDepartmentSelectionError as e:
                 messagebox.showerror("Error", str(e))
+                return
+            
+            query.update(department=selected_department, start=start_date.get_date(), end=end_date.get_date())
+            # The grid asks for just the rows it shows; sorting and filtering run in the database
+            grid.set_source(
+                lambda employee_filter: self.attendance_service.count_attendance(
+                    query["department"], query["start"], query["end"], employee_filter),
+                lambda offset, limit, sort_key, descending, employee_filter: self.attendance_service.get_attendance_page(
+                    query["department"], query["start"], query["end"], offset, limit, sort_key, descending, employee_filter))
+            export_button.configure(state=tk.NORMAL)
+        
+        def export_attendance():
+            job = self.attendance_service.export_attendance(query["department"], query["start"], query["end"])
+            self.show_export_progress(view_window, job)
         
         tk.Button(view_window, text="Display Attendance", command=display_attendance).pack(pady=10)
+        
+        # One grid and one export button, reused for every query
+        export_button = tk.Button(view_window, text="Export", command=export_attendance, state=tk.DISABLED)
+        export_button.pack(side=tk.BOTTOM, pady=5)
+        grid = AttendanceGrid(view_window)
+        grid.pack(fill=tk.BOTH, expand=True, pady=10)
+
+    def show_export_progress(self, parent, job):
+        """Progress window for a running export, with a Cancel button"""
+        if job is None:
+            return
+        
+        progress_window = tk.Toplevel(parent)
+        progress_window.title("Exporting")
+        progress_window.geometry("360x130")
+        
+        progress_label = tk.Label(progress_window, text="Starting export...")
+        progress_label.pack(pady=10)
+        progress_bar = ttk.Progressbar(progress_window, length=300, maximum=100)
+        progress_bar.pack(pady=5)
+        tk.Button(progress_window, text="Cancel", command=job.cancel).pack(pady=5)
+        progress_window.protocol("WM_DELETE_WINDOW", job.cancel)
+        
+        def poll():
+            fraction = job.fraction()
+            if fraction is not None:
+                progress_bar["value"] = fraction * 100
+            progress_label.configure(text=f"{job.rows_written} of {job.total_rows} rows written")
+            if not job.done:
+                progress_window.after(200, poll)
+                return
+            progress_window.destroy()
+            if job.error is not None:
+                messagebox.showerror("Error", f"Failed to export data: {str(job.error)}")
+            elif job.cancelled:
+                messagebox.showinfo("Export Cancelled", "The export was cancelled.")
+            else:
+                messagebox.showinfo("Success", f"Attendance data has been exported to {job.path}")
+        
+        poll()
 
     def setup_registration_frame(self):
         """Setup employee registration frame"""
@@ -257,46 +428,72 @@ class BiometricAttendanceApp:
             lmain = tk.Label(capture_window)
             lmain.pack()
             
-            cap = cv2.VideoCapture(0)
+            update_frame = self.face_service.create_camera_window_update_function(
+                lmain, self.face_service.camera, capture_window)
+            
+            status_label = tk.Label(capture_window, text="Look at the camera and press Capture")
+            status_label.pack()
+            results = queue.Queue()
             
-            update_frame = self.face_service.create_camera_window_update_function(lmain, cap, capture_window)
+            def capture_burst():
+                try:
+                    results.put(self.face_service.capture_enrollment_samples())
+                except Exception as e:
+                    results.put(e)
             
             def capture_and_save():
-                ret, frame = cap.read()
-                if ret:
-                    cap.release()
+                # The burst takes a few seconds; run it off the Tk thread and poll for the result
+                capture_button.configure(state=tk.DISABLED)
+                status_label.configure(text=f"Capturing {self.face_service.enrollment_samples} samples, hold still...")
+                threading.Thread(target=capture_burst, name="enrollment-burst", daemon=True).start()
+                capture_window.after(100, finish_capture)
+            
+            def finish_capture():
+                if not capture_window.winfo_exists():
+                    return
+                try:
+                    result = results.get_nowait()
+                except queue.Empty:
+                    capture_window.after(100, finish_capture)
+                    return
+                if isinstance(result, Exception):
                     capture_window.destroy()
-                    
-                    face_locations, rgb_frame = self.face_service.detect_faces(frame)
-                    face_encoding, error = self.face_service.encode_face(rgb_frame, face_locations)
-                    
-                    if error:
-                        messagebox.showerror("Error", error)
-                        return
-                    
-                    emp_id = emp_id_entry.get()
-                    emp_name = name_entry.get()
-                    emp_department = dept_var.get()
-                    emp_designation = designation_entry.get()
-                    
-                    # Save face image
-                    output_dir = "C:\\Users\\kumar\\Desktop\\register"
-                    self.face_service.extract_and_save_face(frame, face_locations, emp_id, output_dir)
-                    
-                    # Register employee
-                    success, message = self.admin_service.register_employee(
-                        emp_id, emp_name, emp_department, emp_designation, face_encoding)
-                    
-                    if success:
-                        messagebox.showinfo("Success", message)
-                        reg_window.destroy()
-                    else:
-                        messagebox.showerror("Error", message)
+                    messagebox.showerror("Error", f"Capture failed: {str(result)}")
+                    return
+                
+                encodings, frame, face_locations, rejected = result
+                if len(encodings) < self.face_service.enrollment_samples:
+                    capture_button.configure(state=tk.NORMAL)
+                    status_label.configure(
+                        text=f"Only {len(encodings)} usable samples ("
+                             + ", ".join(f"{reason.replace('_', ' ')}: {n}" for reason, n in rejected.items() if n)
+                             + "). Try again.")
+                    return
+                capture_window.destroy()
+                
+                emp_id = emp_id_entry.get()
+                emp_name = name_entry.get()
+                emp_department = dept_var.get()
+                emp_designation = designation_entry.get()
+                
+                # Save the sharpest sample as the face image
+                self.face_service.extract_and_save_face(frame, face_locations, emp_id)
+                
+                # Register employee
+                success, message = self.admin_service.register_employee(
+                    emp_id, emp_name, emp_department, emp_designation,
+                    self.face_service.build_enrollment_template(encodings))
+                
+                if success:
+                    messagebox.showinfo("Success", message)
+                    reg_window.destroy()
+                else:
+                    messagebox.showerror("Error", message)
             
-            tk.Button(capture_window, text="Capture", command=capture_and_save).pack()
+            capture_button = tk.Button(capture_window, text="Capture", command=capture_and_save)
+            capture_button.pack()
             
             def on_closing():
-                cap.release()
                 capture_window.destroy()
             
             capture_window.protocol("WM_DELETE_WINDOW", on_closing)
@@ -304,6 +501,33 @@ class BiometricAttendanceApp:
         
         tk.Button(reg_window, text="Capture Image", command=capture_image).pack(pady=20)
 
+    def setup_deactivate_employee_frame(self):
+        """Setup deactivate employee frame"""
+        deactivate_window = tk.Toplevel(self.root)
+        deactivate_window.title("Deactivate Employee")
+        deactivate_window.geometry("300x180")
+        
+        tk.Label(deactivate_window, text="Deactivate Employee", font=("Arial", 16)).pack(pady=10)
+        
+        tk.Label(deactivate_window, text="Employee ID:").pack()
+        emp_id_entry = tk.Entry(deactivate_window)
+        emp_id_entry.pack(pady=5)
+        
+        def deactivate():
+            emp_id = emp_id_entry.get().strip()
+            if emp_id and not messagebox.askyesno("Confirm", f"Deactivate employee {emp_id}?"):
+                return
+            
+            success, message = self.admin_service.deactivate_employee(emp_id)
+            
+            if success:
+                messagebox.showinfo("Success", message)
+                deactivate_window.destroy()
+            else:
+                messagebox.showerror("Error", message)
+        
+        tk.Button(deactivate_window, text="Deactivate", command=deactivate).pack(pady=10)
+
     def setup_add_admin_frame(self):
         """Setup add admin frame"""
         admin_window = tk.Toplevel(self.root)
@@ -376,16 +600,31 @@ class BiometricAttendanceApp:
         self.employee_id_entry = tk.Entry(self.attendance_frame)
         self.employee_id_entry.pack(pady=5)
         
-        def mark_attendance(is_markin=True):
-            emp_id = self.employee_id_entry.get().strip()
-            success, message = self.attendance_service.mark_attendance(emp_id, is_markin)
-            
-            if success:
-                messagebox.showinfo("Attendance", message)
-            else:
-                messagebox.showerror("Error", message)
+        result_label = tk.Label(self.attendance_frame, text="", font=("Arial", 12))
+        status_label = tk.Label(self.attendance_frame, text="Ready", fg="gray")
+        
+        def show_result(success, message):
+            result_label.configure(text=message, fg="green" if success else "red")
+        
+        def mark_attendance(is_markin=True, mode="id"):
+            emp_id = self.employee_id_entry.get().strip() if mode == "id" else ""
+            if mode == "id" and not emp_id:
+                show_result(False, "Employee ID is required.")
+                return
             
+            self.punch_pipeline.submit(emp_id, is_markin, show_result, mode=mode)
             self.employee_id_entry.delete(0, tk.END)
+            self.employee_id_entry.focus_set()
+        
+        def refresh_status():
+            if self.punch_pipeline is not None:
+                stats = self.punch_pipeline.stats
+                status = f"{self.punch_pipeline.status()} | {stats.punches_per_minute():.1f} punches/min"
+                unsynced = self.attendance_service.punch_journal.pending_count()
+                if unsynced:
+                    status += f" | {unsynced} offline punches to sync"
+                status_label.configure(text=status)
+            status_label.after(250, refresh_status)
         
         btn_mark_in = tk.Button(self.attendance_frame, text="Mark In", 
                                command=lambda: mark_attendance(is_markin=True))
@@ -395,14 +634,33 @@ class BiometricAttendanceApp:
                                 command=lambda: mark_attendance(is_markin=False))
         btn_mark_out.pack(pady=10)
         
+        identify_frame = tk.Frame(self.attendance_frame)
+        identify_frame.pack(pady=10)
+        tk.Button(identify_frame, text="Walk-up Mark In",
+                  command=lambda: mark_attendance(is_markin=True, mode="identify")).pack(side=tk.LEFT, padx=5)
+        tk.Button(identify_frame, text="Walk-up Mark Out",
+                  command=lambda: mark_attendance(is_markin=False, mode="identify")).pack(side=tk.LEFT, padx=5)
+        tk.Button(identify_frame, text="Group Mark In",
+                  command=lambda: mark_attendance(is_markin=True, mode="group")).pack(side=tk.LEFT, padx=5)
+        tk.Button(identify_frame, text="Group Mark Out",
+                  command=lambda: mark_attendance(is_markin=False, mode="group")).pack(side=tk.LEFT, padx=5)
+        
         btn_back = tk.Button(self.attendance_frame, text="Back to Main Screen", 
                             command=lambda: [self.employee_id_entry.delete(0, tk.END), self.show_frame(self.main_frame)])
         btn_back.pack(pady=10)
+        
+        result_label.pack(pady=5)
+        status_label.pack(pady=5)
+        refresh_status()
 
     def run(self):
         """Start the application"""
         self.root.mainloop()
 
 if __name__ == "__main__":
+    # Before anything reads the environment: the warm-up thread, metrics and logging all take .env keys
+    load_dotenv()
+    logging.basicConfig(level=os.getenv("log_level", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     app = BiometricAttendanceApp()
     app.run()
\ No newline at end of file
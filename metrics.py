@@ -0,0 +1,248 @@
+"""
+Metrics Module
+Per-stage punch timings and outcome counters, exported in the Prometheus text format
+
+Instrumented code calls the module-level helpers:
+
+    with metrics.span("detection"):
+        face_locations = face_recognition.face_locations(rgb_small_frame)
+    metrics.increment("punch_outcomes_total", outcome="success")
+
+Until enable() is called they return straight away, so instrumentation
+stays in place on kiosks that do not export metrics.
+"""
+import bisect
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STAGE_HISTOGRAM = "punch_stage_seconds"
+# Upper bounds in seconds; a punch stage ranges from microseconds (matching) to seconds (camera open)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    STAGE_HISTOGRAM: "Time spent in each stage of the punch path",
+    "punch_outcomes_total": "Punches by outcome",
+    "quality_rejections_total": "Punches rejected by the frame quality gate, by reason",
+}
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("registry", "stage", "started")
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values"""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """In-memory stage histograms, counters and gauges
+
+    Stage timings go to one histogram family labeled by stage; counters are
+    keyed by name and label values. Gauges are read from callbacks when the
+    metrics are rendered, e.g. queue depths owned by other services.
+    """
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+        self.exporters = []
+
+    def span(self, stage):
+        """Context manager timing one stage; a shared no-op while disabled"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def add_gauge(self, name, callback, help_text=""):
+        """Report callback() as gauge `name` every time the metrics are rendered"""
+        self.gauges[name] = callback
+        if help_text:
+            HELP.setdefault(name, help_text)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            histograms = {stage: (list(h.counts), h.sum, h.count) for stage, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = []
+        if histograms:
+            lines += [f"# HELP {STAGE_HISTOGRAM} {HELP[STAGE_HISTOGRAM]}", f"# TYPE {STAGE_HISTOGRAM} histogram"]
+            for stage, (counts, total, count) in sorted(histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{STAGE_HISTOGRAM}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{STAGE_HISTOGRAM}_sum{{stage="{stage}"}} {total}')
+                lines.append(f'{STAGE_HISTOGRAM}_count{{stage="{stage}"}} {count}')
+
+        for name in sorted({name for name, _ in counters}):
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+
+        for name, callback in sorted(self.gauges.items()):
+            try:
+                value = callback()
+            except Exception as e:
+                print(f"Gauge {name} failed: {e}")
+                continue
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        """Write the metrics for a node_exporter textfile collector; the file is replaced atomically"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+    def start_file_export(self, path, interval=15.0):
+        """Rewrite `path` every `interval` seconds on a daemon thread"""
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.write_file(path)
+                except OSError as e:
+                    print(f"Failed to write metrics to {path}: {e}")
+
+        threading.Thread(target=run, name="metrics-file", daemon=True).start()
+        self.exporters.append(stop.set)
+
+    def start_http_server(self, port, host="127.0.0.1"):
+        """Serve the metrics at http://host:port/metrics on a daemon thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        self.exporters.append(server.shutdown)
+        return server
+
+    def stop(self):
+        """Stop the exporters"""
+        for stop in self.exporters:
+            stop()
+        self.exporters = []
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def enable():
+    REGISTRY.enabled = True
+
+
+def span(stage):
+    return REGISTRY.span(stage)
+
+
+def observe(stage, seconds):
+    REGISTRY.observe(stage, seconds)
+
+
+def increment(name, amount=1, **labels):
+    REGISTRY.increment(name, amount, **labels)
+
+
+def add_gauge(name, callback, help_text=""):
+    REGISTRY.add_gauge(name, callback, help_text)
+
+
+def configure_from_env():
+    """Enable metrics and start the exporters named by the metrics_file / metrics_port env keys
+
+    Returns True if metrics are enabled; with neither key set, everything stays disabled.
+    """
+    metrics_file = os.getenv("metrics_file")
+    metrics_port = os.getenv("metrics_port")
+    if not metrics_file and not metrics_port:
+        return False
+    enable()
+    if metrics_file:
+        REGISTRY.start_file_export(metrics_file, float(os.getenv("metrics_interval", "15")))
+    if metrics_port:
+        REGISTRY.start_http_server(int(metrics_port), os.getenv("metrics_host", "127.0.0.1"))
+    return True
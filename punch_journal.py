@@ -0,0 +1,281 @@
+"""
+Punch Journal Module
+Local write-ahead journal that takes punches while the database is unreachable
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from storage_backend import DatabaseUnavailableError
+
+# Values of punches.replayed
+PENDING = 0
+REPLAYED = 1
+# Rejected by the database on replay; kept with its error until retry_failed()
+FAILED = 2
+
+
+class PunchJournal:
+    """Append-only SQLite (WAL) journal of check-ins and check-outs
+
+    append() returns only once the punch is durable. Appends arriving within
+    `flush_interval` of each other share one transaction, so a shift-change
+    burst costs one fsync per batch rather than one per punch. Every punch
+    carries an idempotency key; replay() pushes unreplayed punches to the
+    database in journal order as executemany batches and marks them replayed
+    only after the database commit, so a crash mid-replay re-sends keys the
+    database already has and they are skipped rather than counted twice.
+
+    A punch the database rejects (e.g. its employee was deleted during the
+    outage) is quarantined with the error instead of blocking every punch
+    journaled after it; see failed_punches() and retry_failed(). Given an
+    ImageStore, replay links each punch's journaled image to the transaction
+    it was written to.
+    """
+    def __init__(self, path, flush_interval=0.02, replay_interval=5.0, batch_size=500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.replay_interval = replay_interval
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.replay_lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.pending = []
+        self.stopping = False
+        self.timer = None
+        self.metrics = {"appended": 0, "flushes": 0, "replayed": 0, "replay_failures": 0, "quarantined": 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # FULL syncs the WAL on every commit; batching keeps commits rare
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS punches (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL CHECK (kind IN ('in', 'out')),
+                employee_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                image_path TEXT,
+                day TEXT NOT NULL,
+                replayed INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_punches_replayed ON punches (replayed, seq);
+            CREATE INDEX IF NOT EXISTS idx_punches_employee_day ON punches (employee_id, day, kind);
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(punches)")}
+        if "error" not in columns:
+            self.conn.execute("ALTER TABLE punches ADD COLUMN error TEXT")
+        self.conn.commit()
+        self.thread = threading.Thread(target=self._run, name="punch-journal", daemon=True)
+        self.thread.start()
+
+    def append(self, kind, emp_id, timestamp, image_path=None):
+        """Durably record one punch; returns its idempotency key"""
+        return self.append_many([(kind, emp_id, timestamp, image_path)])[0]
+
+    def append_many(self, punches):
+        """Durably record (kind, emp_id, timestamp, image_path) punches in one batch; returns their keys"""
+        if self.stopping:
+            raise RuntimeError("Punch journal is closed.")
+        rows = []
+        for kind, emp_id, timestamp, image_path in punches:
+            if kind not in ("in", "out"):
+                raise ValueError(f"Unknown punch kind: {kind}")
+            rows.append((uuid.uuid4().hex, kind, str(emp_id), timestamp, image_path, timestamp[:10], time.time()))
+
+        done = threading.Event()
+        entry = [rows, done, None]
+        with self.condition:
+            self.pending.append(entry)
+            self.condition.notify()
+        done.wait()
+        if entry[2] is not None:
+            raise entry[2]
+        return [row[0] for row in rows]
+
+    def has_punch(self, emp_id, day, kind):
+        """True if the journal holds a `kind` punch for the employee on `day` (YYYY-MM-DD)"""
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM punches WHERE employee_id = ? AND day = ? AND kind = ? LIMIT 1",
+                                    (str(emp_id), day, kind)).fetchone()
+        return row is not None
+
+    def pending_count(self):
+        """Punches not yet replayed to the database"""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM punches WHERE replayed = ?", (PENDING,)).fetchone()[0]
+
+    def replay(self, db, image_store=None):
+        """Push unreplayed punches to the database in journal order; returns the number applied
+
+        Consecutive punches of the same kind go out as one executemany batch,
+        so a check-in is always applied before a later check-out of the same
+        employee. If a batch fails for any reason other than the database
+        being unreachable, its punches are retried one by one and those that
+        still fail are quarantined.
+        """
+        applied = 0
+        with self.replay_lock:
+            while True:
+                with self.lock:
+                    rows = self.conn.execute("""
+                        SELECT seq, kind, idempotency_key, employee_id, timestamp, image_path, day
+                        FROM punches WHERE replayed = ? ORDER BY seq LIMIT ?
+                    """, (PENDING, self.batch_size)).fetchall()
+                if not rows:
+                    break
+                for run in self._runs(rows):
+                    try:
+                        self._apply(db, run, image_store)
+                    except DatabaseUnavailableError:
+                        raise
+                    except Exception as e:
+                        print(f"Punch journal replay of {len(run)} punches failed, retrying one by one: {e}")
+                        applied += self._apply_one_by_one(db, run, image_store)
+                        continue
+                    self._mark(run, REPLAYED)
+                    applied += len(run)
+        return applied
+
+    def failed_punches(self):
+        """(seq, kind, employee_id, timestamp, error) of quarantined punches"""
+        with self.lock:
+            return self.conn.execute("SELECT seq, kind, employee_id, timestamp, error FROM punches "
+                                     "WHERE replayed = ? ORDER BY seq", (FAILED,)).fetchall()
+
+    def retry_failed(self):
+        """Put quarantined punches back in the replay queue, e.g. once the missing employee exists; returns the count"""
+        with self.lock:
+            cursor = self.conn.execute("UPDATE punches SET replayed = ?, error = NULL WHERE replayed = ?",
+                                       (PENDING, FAILED))
+            self.conn.commit()
+            return cursor.rowcount
+
+    @staticmethod
+    def _apply(db, run, image_store=None):
+        if run[0][1] == "in":
+            transaction_ids = db.replay_attendance_in_batch([(emp_id, ts, image_path, key)
+                                                             for _, _, key, emp_id, ts, image_path, _ in run])
+            if image_store is not None:
+                for _, _, key, _, _, image_path, _ in run:
+                    image_store.link_transaction(transaction_ids.get(key), "in", image_path)
+        else:
+            db.update_attendance_out_batch([(emp_id, ts, image_path, day)
+                                            for _, _, _, emp_id, ts, image_path, day in run])
+            if image_store is not None:
+                for _, _, _, emp_id, _, image_path, day in run:
+                    if image_path is not None:
+                        image_store.link_checkout(emp_id, day, image_path)
+
+    def _apply_one_by_one(self, db, run, image_store=None):
+        applied = 0
+        for row in run:
+            try:
+                self._apply(db, [row], image_store)
+            except DatabaseUnavailableError:
+                raise
+            except Exception as e:
+                print(f"Quarantined journaled punch {row[0]} ({row[1]} for {row[3]} at {row[4]}): {e}")
+                self._mark([row], FAILED, str(e))
+                continue
+            self._mark([row], REPLAYED)
+            applied += 1
+        return applied
+
+    def _mark(self, run, state, error=None):
+        """Set the replay state of a run of consecutive punches"""
+        with self.lock:
+            self.conn.execute("UPDATE punches SET replayed = ?, error = ? WHERE seq BETWEEN ? AND ?",
+                              (state, error, run[0][0], run[-1][0]))
+            self.conn.commit()
+            self.metrics["replayed" if state == REPLAYED else "quarantined"] += len(run)
+
+    def start_replay(self, db, image_store=None):
+        """Replay now and then every `replay_interval` seconds until closed"""
+        def run():
+            try:
+                self.replay(db, image_store)
+            except DatabaseUnavailableError:
+                pass
+            except Exception as e:
+                self._count("replay_failures")
+                print(f"Punch journal replay failed: {e}")
+            if not self.stopping:
+                self.timer = threading.Timer(self.replay_interval, run)
+                self.timer.daemon = True
+                self.timer.start()
+        threading.Thread(target=run, name="punch-replay", daemon=True).start()
+
+    def purge_replayed(self, older_than_days=30):
+        """Delete replayed punches older than `older_than_days`; returns the number removed"""
+        cutoff = time.time() - older_than_days * 24 * 60 * 60
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM punches WHERE replayed = ? AND created_at < ?", (REPLAYED, cutoff))
+            self.conn.commit()
+            return cursor.rowcount
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.metrics)
+        stats["pending"] = self.pending_count()
+        return stats
+
+    def close(self):
+        """Flush queued appends and close the journal file"""
+        if self.timer is not None:
+            self.timer.cancel()
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.thread.join()
+        with self.replay_lock, self.lock:
+            self.conn.close()
+
+    @staticmethod
+    def _runs(rows):
+        run = [rows[0]]
+        for row in rows[1:]:
+            if row[1] != run[-1][1]:
+                yield run
+                run = []
+            run.append(row)
+        yield run
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+            # Let a burst gather before paying for the fsync
+            time.sleep(self.flush_interval)
+            with self.condition:
+                batch, self.pending = self.pending, []
+
+            error = None
+            with self.lock:
+                try:
+                    self.conn.executemany("""
+                        INSERT INTO punches (idempotency_key, kind, employee_id, timestamp, image_path, day, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, [row for rows, _, _ in batch for row in rows])
+                    self.conn.commit()
+                    self.metrics["appended"] += sum(len(rows) for rows, _, _ in batch)
+                    self.metrics["flushes"] += 1
+                except sqlite3.Error as e:
+                    self.conn.rollback()
+                    error = e
+            for entry in batch:
+                entry[2] = error
+                entry[1].set()
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.metrics[name] += amount
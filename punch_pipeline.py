@@ -0,0 +1,129 @@
+"""
+Punch Pipeline Module
+Runs attendance punches off the Tk thread and posts results back with after()
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PunchStats:
+    """Rolling punch latency and throughput figures"""
+    def __init__(self, window_seconds=300):
+        self.window_seconds = window_seconds
+        self.completed = deque()
+        self.total_punches = 0
+        self.total_service_time = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, service_time):
+        now = time.monotonic()
+        with self.lock:
+            self.completed.append((now, service_time))
+            self.total_punches += 1
+            self.total_service_time += service_time
+            self._trim(now)
+
+    def punches_per_minute(self):
+        """Completed punches per minute over the rolling window"""
+        now = time.monotonic()
+        with self.lock:
+            self._trim(now)
+            if len(self.completed) < 2:
+                return float(len(self.completed))
+            elapsed = max(now - self.completed[0][0], 1.0)
+            return len(self.completed) * 60.0 / elapsed
+
+    def average_service_time(self):
+        with self.lock:
+            if not self.completed:
+                return 0.0
+            return sum(t for _, t in self.completed) / len(self.completed)
+
+    def summary(self):
+        avg = self.average_service_time()
+        capacity = 60.0 / avg if avg > 0 else 0.0
+        return (f"{self.punches_per_minute():.1f} punches/min, "
+                f"avg {avg:.2f}s per punch (capacity {capacity:.1f}/min), {self.total_punches} total")
+
+    def _trim(self, now):
+        while self.completed and now - self.completed[0][0] > self.window_seconds:
+            self.completed.popleft()
+
+
+class PunchPipeline:
+    """Single worker executor for the capture-detect-match-record punch flow
+
+    Punches are processed one at a time (they share the camera and the
+    encoder) but are queued, so the kiosk keeps accepting IDs. Results are
+    handed back to the Tk thread through a queue drained with root.after().
+    """
+    POLL_INTERVAL_MS = 50
+
+    def __init__(self, attendance_service, root):
+        self.attendance_service = attendance_service
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="punch")
+        self.results = queue.Queue()
+        self.stats = PunchStats()
+        self.pending = 0
+        self.current = None
+        self.lock = threading.Lock()
+        self.root.after(self.POLL_INTERVAL_MS, self._drain_results)
+
+    MODE_LABELS = {"identify": "walk-up identification", "group": "group punch"}
+
+    def submit(self, emp_id, is_markin, on_done, mode="id"):
+        """Queue a punch; on_done(success, message) is called on the Tk thread
+
+        mode is "id" (typed employee ID, 1:1), "identify" (walk-up 1:N) or
+        "group" (every face in the frame).
+        """
+        with self.lock:
+            self.pending += 1
+        self.executor.submit(self._run, emp_id, is_markin, mode, on_done)
+
+    def status(self):
+        """Human readable progress state for the kiosk"""
+        with self.lock:
+            pending, current = self.pending, self.current
+        if pending == 0:
+            return "Ready"
+        waiting = pending - 1 if current is not None else pending
+        state = f"Processing {current}" if current is not None else "Starting"
+        return f"{state} ({waiting} waiting)" if waiting else state
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _run(self, emp_id, is_markin, mode, on_done):
+        with self.lock:
+            self.current = self.MODE_LABELS.get(mode, f"employee {emp_id}")
+        started = time.monotonic()
+        try:
+            if mode == "identify":
+                success, message = self.attendance_service.identify_and_mark_attendance(is_markin)
+            elif mode == "group":
+                results, error = self.attendance_service.mark_group_attendance(is_markin)
+                success = error is None and any(result.success for result in results)
+                message = error or self.attendance_service.format_group_results(results)
+            else:
+                success, message = self.attendance_service.mark_attendance(emp_id, is_markin)
+        except Exception as e:
+            success, message = False, f"Attendance error: {str(e)}"
+        self.stats.record(time.monotonic() - started)
+        with self.lock:
+            self.pending -= 1
+            self.current = None
+        self.results.put((on_done, success, message))
+
+    def _drain_results(self):
+        try:
+            while True:
+                on_done, success, message = self.results.get_nowait()
+                on_done(success, message)
+        except queue.Empty:
+            pass
+        self.root.after(self.POLL_INTERVAL_MS, self._drain_results)
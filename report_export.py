@@ -0,0 +1,185 @@
+"""
+Report Export Module
+Streams attendance reports to xlsx, CSV or Parquet files in constant memory
+"""
+import csv
+import importlib.util
+import os
+import threading
+
+EXPORT_COLUMNS = ['Date', 'Employee ID', 'Name', 'Checkin Time', 'Checkout Time', 'Worked For']
+EXPORT_FORMATS = ("xlsx", "csv", "parquet")
+# Package each format needs and the file-dialog label; CSV needs only the standard library
+FORMAT_PACKAGES = {"xlsx": "openpyxl", "parquet": "pyarrow"}
+FORMAT_LABELS = {"xlsx": "Excel files", "csv": "CSV files", "parquet": "Parquet files"}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def available_formats():
+    """Export formats whose writer package is installed, in EXPORT_FORMATS order"""
+    return tuple(fmt for fmt in EXPORT_FORMATS
+                 if fmt not in FORMAT_PACKAGES or importlib.util.find_spec(FORMAT_PACKAGES[fmt]) is not None)
+
+
+def file_types():
+    """(label, pattern) pairs of the available formats, for a save-file dialog"""
+    return [(FORMAT_LABELS[fmt], f"*.{fmt}") for fmt in available_formats()]
+
+
+def export_format(path):
+    """Export format implied by a file name's extension; raises ValueError if it is unknown or not installed"""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{extension}'; use one of {EXPORT_FORMATS}")
+    if extension not in available_formats():
+        raise ValueError(f"Exporting {extension} needs the {FORMAT_PACKAGES[extension]} package, which is not installed")
+    return extension
+
+
+def write_export(chunks, path, progress=None, cancel_event=None):
+    """Write row chunks to `path`, one chunk in memory at a time; returns the number of rows written
+
+    The file is written next to `path` and renamed into place when complete,
+    so a cancelled or failed export never leaves a truncated report behind.
+    `progress(rows_written)` is called after every chunk.
+    """
+    fmt = export_format(path)
+    temp_path = f"{path}.part"
+    writer = _WRITERS[fmt](temp_path)
+    rows_written = 0
+    try:
+        for rows in chunks:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ExportCancelled()
+            writer.write(rows)
+            rows_written += len(rows)
+            if progress is not None:
+                progress(rows_written)
+        writer.close()
+        os.replace(temp_path, path)
+    except BaseException:
+        writer.abort()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return rows_written
+
+
+class ExportJob:
+    """Runs write_export on a background thread with progress and cancellation
+
+    Poll `rows_written`, `total_rows` and `done` from the UI thread; `error`
+    holds the exception if the export failed, and `cancelled` is set if it
+    was cancelled.
+    """
+    def __init__(self, chunks, path, total_rows=None):
+        self.path = path
+        self.total_rows = total_rows
+        self.rows_written = 0
+        self.done = False
+        self.cancelled = False
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(chunks,), name="report-export", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def fraction(self):
+        """Share of rows written so far, or None if the total is unknown"""
+        if not self.total_rows:
+            return None
+        return min(self.rows_written / self.total_rows, 1.0)
+
+    def _run(self, chunks):
+        try:
+            write_export(chunks, self.path, self._on_progress, self.cancel_event)
+        except ExportCancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        finally:
+            # Closes a half-read database cursor on cancel or error
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+            self.done = True
+
+    def _on_progress(self, rows_written):
+        self.rows_written = rows_written
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+
+
+class _XlsxWriter:
+    """openpyxl write-only workbook; rows are streamed to a temporary file instead of kept as cells"""
+    def __init__(self, path):
+        from openpyxl import Workbook
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("Attendance")
+        self.sheet.append(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        for row in rows:
+            self.sheet.append(list(row))
+
+    def close(self):
+        self.workbook.save(self.path)
+
+    def abort(self):
+        self.workbook.close()
+
+
+class _ParquetWriter:
+    """pyarrow writer; each chunk becomes one row group"""
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.schema = pa.schema([
+            ("Date", pa.date32()),
+            ("Employee ID", pa.string()),
+            ("Name", pa.string()),
+            ("Checkin Time", pa.timestamp("s")),
+            ("Checkout Time", pa.timestamp("s")),
+            ("Worked For", pa.duration("s")),
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows)) if rows else [[] for _ in EXPORT_COLUMNS]
+        columns[1] = [None if value is None else str(value) for value in columns[1]]
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(list(values), type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+    def abort(self):
+        self.writer.close()
+
+
+_WRITERS = {"xlsx": _XlsxWriter, "csv": _CsvWriter, "parquet": _ParquetWriter}
@@ -0,0 +1,549 @@
+"""
+SQLite Storage Module
+Embedded single-file storage backend for kiosks that run without a database server
+"""
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+import bcrypt
+
+from storage_backend import (StorageBackend, StorageError, IntegrityError, DatabaseUnavailableError,
+                             day_bounds, like_pattern, attendance_order_by)
+
+# Punch times are stored as 'YYYY-MM-DD HH:MM:SS' text so they compare (and
+# index) in time order and match the strings the services pass in
+sqlite3.register_adapter(datetime, lambda value: value.strftime("%Y-%m-%d %H:%M:%S"))
+sqlite3.register_adapter(date, lambda value: value.strftime("%Y-%m-%d"))
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+# Worked time is stored in seconds and read back as a timedelta, like MySQL TIME
+sqlite3.register_converter("DURATION", lambda value: timedelta(seconds=int(value)))
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS admins (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password BLOB
+    );
+    CREATE TABLE IF NOT EXISTS department_master (
+        dm_dept_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        dm_dept_desc TEXT NOT NULL UNIQUE,
+        dm_dept_active INTEGER NOT NULL DEFAULT 1
+    );
+    CREATE TABLE IF NOT EXISTS employee_master (
+        em_employee_id TEXT PRIMARY KEY,
+        em_employee_name TEXT NOT NULL,
+        em_employee_dept INTEGER REFERENCES department_master (dm_dept_id),
+        em_employee_designation TEXT,
+        em_employee_face_encoding BLOB,
+        em_employee_active INTEGER NOT NULL DEFAULT 1,
+        em_updated_at DATETIME
+    );
+    CREATE TABLE IF NOT EXISTS employee_transactions (
+        et_transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        et_employee_id TEXT NOT NULL REFERENCES employee_master (em_employee_id),
+        et_employee_in_time DATETIME NOT NULL,
+        et_employee_in_imgpth TEXT,
+        et_employee_out_time DATETIME,
+        et_employee_out_imgpth TEXT,
+        et_worktime DURATION,
+        et_idempotency_key TEXT UNIQUE
+    );
+    CREATE INDEX IF NOT EXISTS idx_et_employee_in_time ON employee_transactions (et_employee_id, et_employee_in_time);
+    CREATE INDEX IF NOT EXISTS idx_et_in_time ON employee_transactions (et_employee_in_time);
+    CREATE INDEX IF NOT EXISTS idx_em_dept_active ON employee_master (em_employee_dept, em_employee_active);
+"""
+
+
+class SQLiteStorage(StorageBackend):
+    """Storage backend on one SQLite file in WAL mode
+
+    Each statement block borrows a connection from a small pool, so dashboard
+    reads never wait on a punch being written and short-lived timer threads
+    hold none between calls. At most pool_size idle connections are kept;
+    extra ones opened under load are closed when returned. Every statement is a constant SQL string with `?`
+    parameters, which the connection's statement cache prepares once and
+    reuses. Writes take the write lock up front (BEGIN IMMEDIATE) so
+    concurrent writers queue on busy_timeout instead of failing mid-way.
+    """
+    CHECK_ATTENDANCE_SQL = """
+        SELECT * FROM employee_transactions
+        WHERE et_employee_id = ?
+          AND et_employee_in_time >= ? AND et_employee_in_time < ?
+          AND et_employee_out_time >= ? AND et_employee_out_time < ?
+    """
+
+    # SET expressions see the old row, so the new out time is passed again for the worked time
+    UPDATE_ATTENDANCE_OUT_SQL = """
+        UPDATE employee_transactions
+        SET et_employee_out_time = ?, et_employee_out_imgpth = ?,
+            et_worktime = CAST(strftime('%s', ?) AS INTEGER) - CAST(strftime('%s', et_employee_in_time) AS INTEGER)
+        WHERE et_employee_id = ? AND et_employee_in_time >= ? AND et_employee_in_time < ? AND et_employee_out_time IS NULL
+    """
+
+    ADD_ATTENDANCE_IN_SQL = """
+        INSERT INTO employee_transactions (et_employee_id, et_employee_in_time, et_employee_in_imgpth)
+        VALUES (?, ?, ?)
+    """
+
+    ATTENDANCE_RECORDS_SQL = """
+        SELECT date(et.et_employee_in_time) AS "day [DATE]", et.et_employee_id, em.em_employee_name,
+               et.et_employee_in_time, et.et_employee_out_time, et.et_worktime
+        FROM employee_transactions et
+        JOIN employee_master em ON et.et_employee_id = em.em_employee_id
+        JOIN department_master d ON em.em_employee_dept = d.dm_dept_id
+        WHERE d.dm_dept_desc = ? AND et.et_employee_in_time >= ? AND et.et_employee_in_time < ?
+        ORDER BY et.et_employee_in_time
+    """
+
+    ATTENDANCE_PAGE_COLUMNS = """
+        SELECT date(et.et_employee_in_time) AS "day [DATE]", et.et_employee_id, em.em_employee_name,
+               et.et_employee_in_time, et.et_employee_out_time, et.et_worktime
+    """
+
+    DAILY_ATTENDANCE_SQL = """
+        SELECT et.et_employee_id, em.em_employee_name, et.et_employee_in_time, et.et_employee_out_time, et.et_worktime
+        FROM employee_transactions et
+        JOIN employee_master em ON et.et_employee_id = em.em_employee_id
+        JOIN department_master d ON em.em_employee_dept = d.dm_dept_id
+        WHERE d.dm_dept_desc = ? AND et.et_employee_in_time >= ? AND et.et_employee_in_time < ?
+    """
+
+    ATTENDANCE_BY_DEPARTMENT_SQL = """
+        SELECT
+            dm.dm_dept_desc AS department_desc,
+            COUNT(em.em_employee_id) AS employee_count,
+            COUNT(DISTINCT et.et_employee_id) AS attendance_count
+        FROM department_master dm
+        LEFT JOIN employee_master em ON dm.dm_dept_id = em.em_employee_dept AND em.em_employee_active = 1
+        LEFT JOIN employee_transactions et ON em.em_employee_id = et.et_employee_id
+            AND et.et_employee_in_time >= ? AND et.et_employee_in_time < ?
+        WHERE dm.dm_dept_active = 1
+        GROUP BY dm.dm_dept_desc
+    """
+
+    ATTENDANCE_RATE_SQL = """
+        SELECT
+            (SELECT COUNT(DISTINCT et_employee_id) FROM employee_transactions
+             WHERE et_employee_in_time >= ? AND et_employee_in_time < ?) * 100.0 /
+            NULLIF((SELECT COUNT(*) FROM employee_master WHERE em_employee_active = 1), 0) AS attendance_rate
+    """
+
+    def __init__(self, path, busy_timeout=5.0, departments=None, pool_size=None):
+        super().__init__()
+        self.path = path
+        self.busy_timeout = busy_timeout
+        if departments is None:
+            departments = [d.strip() for d in os.getenv("sqlite_departments", "General").split(",") if d.strip()]
+        if pool_size is None:
+            pool_size = int(os.getenv("sqlite_pool_size", "4"))
+        self.pool_size = max(1, pool_size)
+        self.idle_connections = []
+        self.connections_lock = threading.Lock()
+        if os.path.dirname(os.path.abspath(path)):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.initialize_tables(departments)
+        self.report_index_usage()
+
+    def _get_connection(self):
+        """Borrow an idle connection, or open one if all are in use; hand it back with _release_connection"""
+        with self.connections_lock:
+            if self.idle_connections:
+                return self.idle_connections.pop()
+        return self._open_connection()
+
+    def _release_connection(self, conn):
+        """Keep a borrowed connection for reuse, or close it once pool_size are already idle"""
+        if not conn.in_transaction:
+            with self.connections_lock:
+                if len(self.idle_connections) < self.pool_size:
+                    self.idle_connections.append(conn)
+                    return
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _open_connection(self):
+        try:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                   detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                                   cached_statements=256, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+        except sqlite3.Error as err:
+            raise DatabaseUnavailableError(str(err)) from err
+        return conn
+
+    @contextmanager
+    def _cursor(self, commit=False):
+        """Cursor on a borrowed connection, which goes back to the pool when the block ends
+
+        With `commit` set, the block runs in one write transaction that is
+        committed on success and rolled back on error.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            if commit:
+                cursor.execute("BEGIN IMMEDIATE")
+            yield cursor
+            if commit:
+                cursor.execute("COMMIT")
+        except Exception as err:
+            if conn.in_transaction:
+                conn.rollback()
+            if isinstance(err, sqlite3.IntegrityError):
+                raise IntegrityError(str(err)) from err
+            if isinstance(err, sqlite3.OperationalError):
+                # Locked past busy_timeout, disk full or unreadable file
+                raise DatabaseUnavailableError(str(err)) from err
+            if isinstance(err, sqlite3.Error):
+                raise StorageError(str(err)) from err
+            raise
+        finally:
+            cursor.close()
+            self._release_connection(conn)
+
+    def is_available(self):
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except DatabaseUnavailableError:
+            return False
+
+    def initialize_tables(self, departments=()):
+        """Create the schema, the default admin and, on an empty database, the given departments"""
+        with self._cursor() as cursor:
+            cursor.executescript(SCHEMA)
+            cursor.execute("PRAGMA table_info(employee_master)")
+            columns = {row[1] for row in cursor.fetchall()}
+        if "em_updated_at" not in columns:
+            # Watermark for gallery snapshot delta sync; set by every write to the row
+            with self._cursor(commit=True) as cursor:
+                cursor.execute("ALTER TABLE employee_master ADD COLUMN em_updated_at DATETIME")
+                cursor.execute("UPDATE employee_master SET em_updated_at = ?", (datetime.now(),))
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_em_updated_at ON employee_master (em_updated_at)")
+            cursor.execute("SELECT 1 FROM admins LIMIT 1")
+            if cursor.fetchone() is None:
+                hashed_password = bcrypt.hashpw("admin123".encode('utf-8'), bcrypt.gensalt())
+                cursor.execute("INSERT INTO admins (username, password) VALUES (?, ?)", ('admin', hashed_password))
+            cursor.execute("SELECT 1 FROM department_master LIMIT 1")
+            if cursor.fetchone() is None:
+                cursor.executemany("INSERT INTO department_master (dm_dept_desc) VALUES (?)",
+                                   [(dept,) for dept in departments])
+
+    def add_department(self, dept_desc):
+        """Add an active department; returns its ID"""
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("INSERT INTO department_master (dm_dept_desc) VALUES (?)", (dept_desc,))
+            return cursor.lastrowid
+
+    def explain_hot_queries(self):
+        start, end = day_bounds(date.today())
+        queries = {
+            "check_attendance_exists": (self.CHECK_ATTENDANCE_SQL, ("0", start, end, start, end)),
+            "update_attendance_out": (self.UPDATE_ATTENDANCE_OUT_SQL, (end, "", end, "0", start, end)),
+            "get_daily_attendance_records": (self.DAILY_ATTENDANCE_SQL, ("", start, end)),
+            "get_attendance_by_department": (self.ATTENDANCE_BY_DEPARTMENT_SQL, (start, end)),
+            "get_attendance_rate": (self.ATTENDANCE_RATE_SQL, (start, end)),
+        }
+        plans = {}
+        with self._cursor() as cursor:
+            for name, (sql, params) in queries.items():
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+                steps = []
+                for row in cursor.fetchall():
+                    words = row[3].split()
+                    if words[0] not in ("SCAN", "SEARCH") or words[1] == "CONSTANT":
+                        continue
+                    index = re.search(r"USING (?:COVERING )?INDEX (\S+)", row[3])
+                    key = index.group(1) if index else ("PRIMARY" if "PRIMARY KEY" in row[3] else None)
+                    access_type = "ALL" if words[0] == "SCAN" and key is None else words[0]
+                    steps.append((words[1], access_type, key, None))
+                plans[name] = steps
+        return plans
+
+    def get_admin_by_username(self, username):
+        with self._cursor() as cursor:
+            cursor.execute("SELECT * FROM admins WHERE username = ?", (username,))
+            return cursor.fetchone()
+
+    def add_admin(self, username, password):
+        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("INSERT INTO admins (username, password) VALUES (?, ?)", (username, hashed_password))
+
+    def update_admin_password(self, username, new_password):
+        hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("UPDATE admins SET password = ? WHERE username = ?", (hashed_password, username))
+
+    def get_employee_by_id(self, emp_id):
+        with self._cursor() as cursor:
+            cursor.execute("SELECT em_employee_name, em_employee_face_encoding FROM employee_master WHERE em_employee_id = ? AND em_employee_active = 1",
+                           (str(emp_id),))
+            return cursor.fetchone()
+
+    def get_active_face_encodings(self):
+        with self._cursor() as cursor:
+            cursor.execute("""
+                SELECT em_employee_id, em_employee_name, em_employee_face_encoding
+                FROM employee_master
+                WHERE em_employee_active = 1 AND em_employee_face_encoding IS NOT NULL
+            """)
+            return cursor.fetchall()
+
+    def get_face_encoding_changes(self, since=None):
+        with self._cursor() as cursor:
+            if since is None:
+                cursor.execute("""
+                    SELECT em_employee_id, em_employee_name, em_employee_face_encoding, em_employee_active, em_updated_at
+                    FROM employee_master
+                    WHERE em_employee_active = 1 AND em_employee_face_encoding IS NOT NULL
+                """)
+            else:
+                cursor.execute("""
+                    SELECT em_employee_id, em_employee_name, em_employee_face_encoding, em_employee_active, em_updated_at
+                    FROM employee_master
+                    WHERE em_updated_at > ?
+                    ORDER BY em_updated_at
+                """, (since,))
+            return cursor.fetchall()
+
+    def get_face_encodings_after(self, last_id, limit):
+        with self._cursor() as cursor:
+            if last_id is None:
+                cursor.execute("""
+                    SELECT em_employee_id, em_employee_face_encoding FROM employee_master
+                    ORDER BY em_employee_id LIMIT ?
+                """, (limit,))
+            else:
+                cursor.execute("""
+                    SELECT em_employee_id, em_employee_face_encoding FROM employee_master
+                    WHERE em_employee_id > ? ORDER BY em_employee_id LIMIT ?
+                """, (str(last_id), limit))
+            return cursor.fetchall()
+
+    def update_face_encodings(self, rows):
+        now = datetime.now()
+        with self._cursor(commit=True) as cursor:
+            cursor.executemany("UPDATE employee_master SET em_employee_face_encoding = ?, em_updated_at = ? WHERE em_employee_id = ?",
+                               [(encoding, now, str(emp_id)) for emp_id, encoding in rows])
+
+    def add_employee(self, emp_id, emp_name, emp_dept_id, emp_designation, face_encoding):
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("""
+                INSERT INTO employee_master
+                (em_employee_id, em_employee_name, em_employee_dept, em_employee_designation, em_employee_face_encoding,
+                 em_employee_active, em_updated_at)
+                VALUES (?, ?, ?, ?, ?, 1, ?)
+            """, (str(emp_id), emp_name, emp_dept_id, emp_designation, face_encoding, datetime.now()))
+        self._notify("employee_added", emp_id, emp_dept_id)
+
+    def set_employee_active(self, emp_id, active):
+        with self._cursor(commit=True) as cursor:
+            cursor.execute("UPDATE employee_master SET em_employee_active = ?, em_updated_at = ? WHERE em_employee_id = ?",
+                           (1 if active else 0, datetime.now(), str(emp_id)))
+            updated = cursor.rowcount > 0
+        if updated:
+            self._notify("employee_active", emp_id, active)
+        return updated
+
+    def get_department_id_by_name(self, dept_name):
+        with self._cursor() as cursor:
+            cursor.execute("SELECT dm_dept_id FROM department_master WHERE dm_dept_desc = ?", (dept_name,))
+            result = cursor.fetchone()
+            return result[0] if result else None
+
+    def get_all_departments(self):
+        with self._cursor() as cursor:
+            cursor.execute("SELECT dm_dept_desc FROM department_master WHERE dm_dept_active = 1")
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_active_departments_with_ids(self):
+        with self._cursor() as cursor:
+            cursor.execute("SELECT dm_dept_id, dm_dept_desc FROM department_master WHERE dm_dept_active = 1")
+            return cursor.fetchall()
+
+    def get_active_employee_departments(self):
+        with self._cursor() as cursor:
+            cursor.execute("SELECT em_employee_id, em_employee_dept FROM employee_master WHERE em_employee_active = 1")
+            return cursor.fetchall()
+
+    def get_present_employee_ids(self, day):
+        start, end = day_bounds(day)
+        with self._cursor() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT et_employee_id FROM employee_transactions
+                WHERE et_employee_in_time >= ? AND et_employee_in_time < ?
+            """, (start, end))
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_total_employees(self):
+        with self._cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM employee_master WHERE em_employee_active = 1")
+            return cursor.fetchone()[0]
+
+    def get_attendance_rate(self):
+        start, end = day_bounds(date.today())
+        with self._cursor() as cursor:
+            cursor.execute(self.ATTENDANCE_RATE_SQL, (start, end))
+            return cursor.fetchone()[0] or 0
+
+    def get_attendance_by_department(self):
+        start, end = day_bounds(date.today())
+        with self._cursor() as cursor:
+            cursor.execute(self.ATTENDANCE_BY_DEPARTMENT_SQL, (start, end))
+            return cursor.fetchall()
+
+    def check_attendance_exists(self, emp_id, date_today):
+        start, end = day_bounds(date_today)
+        with self._cursor() as cursor:
+            cursor.execute(self.CHECK_ATTENDANCE_SQL, (str(emp_id), start, end, start, end))
+            return cursor.fetchone()
+
+    def get_existing_attendance(self, emp_ids, date_today):
+        if not emp_ids:
+            return set()
+        placeholders = ", ".join(["?"] * len(emp_ids))
+        start, end = day_bounds(date_today)
+        with self._cursor() as cursor:
+            cursor.execute(f"""
+                SELECT DISTINCT et_employee_id FROM employee_transactions
+                WHERE et_employee_id IN ({placeholders})
+                  AND et_employee_in_time >= ? AND et_employee_in_time < ?
+                  AND et_employee_out_time >= ? AND et_employee_out_time < ?
+            """, (*[str(emp_id) for emp_id in emp_ids], start, end, start, end))
+            return {str(row[0]) for row in cursor.fetchall()}
+
+    def add_attendance_in_batch(self, rows):
+        transaction_ids = []
+        with self._cursor(commit=True) as cursor:
+            # One execute per row for its lastrowid; the statement is prepared once
+            for emp_id, ts, image_path in rows:
+                cursor.execute(self.ADD_ATTENDANCE_IN_SQL, (str(emp_id), ts, image_path))
+                transaction_ids.append(cursor.lastrowid)
+        self._notify("attendance_in", [row[0] for row in rows])
+        return transaction_ids
+
+    def replay_attendance_in_batch(self, rows):
+        params = []
+        for emp_id, timestamp, image_path, key in rows:
+            start, end = day_bounds(str(timestamp)[:10])
+            params.append((str(emp_id), timestamp, image_path, key, str(emp_id), start, end))
+        with self._cursor(commit=True) as cursor:
+            # Skips re-sent keys and employees already checked in that day
+            cursor.executemany("""
+                INSERT INTO employee_transactions (et_employee_id, et_employee_in_time, et_employee_in_imgpth, et_idempotency_key)
+                SELECT ?, ?, ?, ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM employee_transactions
+                    WHERE et_employee_id = ? AND et_employee_in_time >= ? AND et_employee_in_time < ?
+                )
+                ON CONFLICT (et_idempotency_key) DO NOTHING
+            """, params)
+            keys = [row[3] for row in rows]
+            cursor.execute(f"""
+                SELECT et_idempotency_key, et_transaction_id FROM employee_transactions
+                WHERE et_idempotency_key IN ({", ".join(["?"] * len(keys))})
+            """, keys)
+            transaction_ids = dict(cursor.fetchall())
+        self._notify("attendance_in", [row[0] for row in rows])
+        return transaction_ids
+
+    def update_attendance_out_batch(self, rows):
+        params = []
+        for emp_id, timestamp, image_path, date_today in rows:
+            start, end = day_bounds(date_today)
+            params.append((timestamp, image_path, timestamp, str(emp_id), start, end))
+        with self._cursor(commit=True) as cursor:
+            cursor.executemany(self.UPDATE_ATTENDANCE_OUT_SQL, params)
+        self._notify("attendance_out", [row[0] for row in rows])
+
+    def add_attendance_in(self, emp_id, timestamp, image_path):
+        with self._cursor(commit=True) as cursor:
+            cursor.execute(self.ADD_ATTENDANCE_IN_SQL, (str(emp_id), timestamp, image_path))
+            transaction_id = cursor.lastrowid
+        self._notify("attendance_in", [emp_id])
+        return transaction_id
+
+    def update_attendance_out(self, emp_id, timestamp, image_path, date_today):
+        start, end = day_bounds(date_today)
+        with self._cursor(commit=True) as cursor:
+            cursor.execute(self.UPDATE_ATTENDANCE_OUT_SQL, (timestamp, image_path, timestamp, str(emp_id), start, end))
+            updated = cursor.rowcount > 0
+        if updated:
+            self._notify("attendance_out", [emp_id])
+
+    def get_attendance_records(self, department, start_datetime, end_datetime):
+        with self._cursor() as cursor:
+            cursor.execute(self.ATTENDANCE_RECORDS_SQL, (department, start_datetime, end_datetime))
+            return cursor.fetchall()
+
+    def count_attendance_records(self, department, start_datetime, end_datetime, employee_filter=None):
+        query, params = self._attendance_filter(department, start_datetime, end_datetime, employee_filter)
+        with self._cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) " + query, params)
+            return cursor.fetchone()[0]
+
+    def get_attendance_page(self, department, start_datetime, end_datetime, offset, limit,
+                            sort_key="date", descending=False, employee_filter=None):
+        query, params = self._attendance_filter(department, start_datetime, end_datetime, employee_filter)
+        with self._cursor() as cursor:
+            cursor.execute(self.ATTENDANCE_PAGE_COLUMNS + query + " " + attendance_order_by(sort_key, descending)
+                           + " LIMIT ? OFFSET ?", (*params, limit, offset))
+            return cursor.fetchall()
+
+    def _attendance_filter(self, department, start_datetime, end_datetime, employee_filter):
+        query = """
+            FROM employee_transactions et
+            JOIN employee_master em ON et.et_employee_id = em.em_employee_id
+            JOIN department_master d ON em.em_employee_dept = d.dm_dept_id
+            WHERE d.dm_dept_desc = ? AND et.et_employee_in_time >= ? AND et.et_employee_in_time < ?
+        """
+        params = [department, start_datetime, end_datetime]
+        if employee_filter:
+            query += " AND (et.et_employee_id LIKE ? ESCAPE '!' OR em.em_employee_name LIKE ? ESCAPE '!')"
+            pattern = like_pattern(employee_filter)
+            params += [pattern, pattern]
+        return query, params
+
+    def iter_attendance_records(self, department, start_datetime, end_datetime, chunk_size=1000):
+        # A connection of its own, since the generator may be consumed on a short-lived thread
+        conn = self._open_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self.ATTENDANCE_RECORDS_SQL, (department, start_datetime, end_datetime))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        except sqlite3.Error as err:
+            raise StorageError(str(err)) from err
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_daily_attendance_records(self, department, single_date):
+        start, end = day_bounds(single_date)
+        with self._cursor() as cursor:
+            cursor.execute(self.DAILY_ATTENDANCE_SQL, (department, start, end))
+            return cursor.fetchall()
+
+    def close(self):
+        """Close the idle connections; ones still borrowed are kept or closed as they come back"""
+        with self.connections_lock:
+            connections, self.idle_connections = self.idle_connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
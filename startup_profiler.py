@@ -0,0 +1,56 @@
+"""
+Startup Profiler Module
+Records a per-stage breakdown of application start-up time
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Taken when the module is first imported, i.e. at the top of main_app
+PROCESS_START = time.perf_counter()
+
+
+class StartupProfiler:
+    """Collects (stage, thread, start offset, duration) for each start-up step
+
+    For a per-module import breakdown, run `python -X importtime main_app.py`;
+    this profiler covers what happens after imports (window, database, models).
+    """
+    def __init__(self, origin=PROCESS_START):
+        self.origin = origin
+        self.stages = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            with self.lock:
+                self.stages.append((name, threading.current_thread().name, started - self.origin, finished - started))
+
+    def mark(self, name):
+        """Record a point in time (zero-duration stage), e.g. the window becoming visible"""
+        now = time.perf_counter()
+        with self.lock:
+            self.stages.append((name, threading.current_thread().name, now - self.origin, 0.0))
+
+    def elapsed(self):
+        """Seconds since the process started importing the application"""
+        return time.perf_counter() - self.origin
+
+    def report(self):
+        """Formatted breakdown, one stage per line in start order"""
+        with self.lock:
+            stages = sorted(self.stages, key=lambda s: s[2])
+        lines = [f"{'stage':<40} {'thread':<12} {'start':>8} {'took':>8}"]
+        for name, thread, offset, duration in stages:
+            lines.append(f"{name:<40} {thread:<12} {offset:>7.3f}s {duration:>7.3f}s")
+        lines.append(f"{'total':<40} {'':<12} {'':>8} {self.elapsed():>7.3f}s")
+        return "\n".join(lines)
+
+    def write_report(self, path):
+        with open(path, "w") as f:
+            f.write(self.report() + "\n")
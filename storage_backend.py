@@ -0,0 +1,288 @@
+"""
+Storage Backend Module
+Storage interface shared by the MySQL and embedded SQLite backends
+"""
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+BACKENDS = ("mysql", "sqlite")
+
+# Sort keys accepted by get_attendance_page; the expressions are valid in both dialects
+ATTENDANCE_SORT_COLUMNS = {
+    "date": "et.et_employee_in_time",
+    "employee_id": "et.et_employee_id",
+    "name": "em.em_employee_name",
+    "checkin": "TIME(et.et_employee_in_time)",
+    "checkout": "et.et_employee_out_time",
+    "worktime": "et.et_worktime",
+}
+
+
+class StorageError(Exception):
+    """A storage operation failed; backends chain the driver's exception"""
+    pass
+
+class IntegrityError(StorageError):
+    """A write violated a constraint, e.g. a duplicate employee ID or admin username"""
+    pass
+
+class DatabaseUnavailableError(StorageError):
+    """The database cannot be reached (down, network loss, connection dropped mid-query)"""
+    pass
+
+
+def day_bounds(day):
+    """Half-open [start, end) datetime range covering one calendar day"""
+    if isinstance(day, str):
+        day = datetime.strptime(day, "%Y-%m-%d")
+    if isinstance(day, datetime):
+        day = day.date()
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def like_pattern(text):
+    """LIKE pattern matching `text` anywhere, escaped with '!' (ESCAPE '!' works in MySQL and SQLite)"""
+    escaped = text.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    return f"%{escaped}%"
+
+
+def attendance_order_by(sort_key, descending):
+    """ORDER BY clause for get_attendance_page, with a tie-break that keeps pages stable"""
+    if sort_key not in ATTENDANCE_SORT_COLUMNS:
+        raise ValueError(f"Unknown sort key: {sort_key}")
+    direction = "DESC" if descending else "ASC"
+    return (f"ORDER BY {ATTENDANCE_SORT_COLUMNS[sort_key]} {direction}, "
+            f"et.et_employee_in_time {direction}, et.et_employee_id {direction}")
+
+
+def create_storage(backend=None):
+    """Storage backend named by `backend` or the `storage_backend` env key (mysql by default)
+
+    Loads `.env` first, so the keys it sets choose and configure the backend.
+    """
+    load_dotenv()
+    backend = (backend or os.getenv("storage_backend", "mysql")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"storage_backend must be one of {BACKENDS}")
+    # Imported lazily so a SQLite kiosk does not need mysql-connector installed
+    if backend == "sqlite":
+        from sqlite_storage import SQLiteStorage
+        return SQLiteStorage(os.getenv("sqlite_path", os.path.join(os.path.expanduser("~"), "attendance.sqlite3")))
+    from database_service import DatabaseService
+    return DatabaseService()
+
+
+class StorageBackend(ABC):
+    """Every operation the services perform against attendance storage
+
+    Rows come back as tuples with the same column order and Python types
+    whichever backend is used: datetimes for punch times, a timedelta for
+    worked time and bytes for face encodings. Writes notify change listeners
+    once they have committed.
+    """
+    def __init__(self):
+        self.change_listeners = []
+
+    def add_change_listener(self, callback):
+        """Register callback(event, *args), called after a write commits
+
+        Events: ("attendance_in", emp_ids), ("attendance_out", emp_ids),
+        ("employee_added", emp_id, dept_id), ("employee_active", emp_id, active).
+        """
+        self.change_listeners.append(callback)
+
+    def _notify(self, event, *args):
+        for callback in self.change_listeners:
+            try:
+                callback(event, *args)
+            except Exception as e:
+                print(f"Change listener failed for {event}: {e}")
+
+    @abstractmethod
+    def is_available(self):
+        """True if the storage can be reached right now"""
+
+    @abstractmethod
+    def initialize_tables(self):
+        """Create necessary tables, indexes and the default admin if they don't exist"""
+
+    @abstractmethod
+    def explain_hot_queries(self):
+        """Query plans of the hot attendance queries; returns {query: [(table, access type, key, rows)]}
+
+        An access type of "ALL" or a key of None means the step scans the table.
+        """
+
+    def check_index_usage(self):
+        """Hot-query steps that scan employee_transactions without an index; an empty list means all is well"""
+        problems = []
+        for name, steps in self.explain_hot_queries().items():
+            for table, access_type, key, rows in steps:
+                if table in ("employee_transactions", "et") and (key is None or access_type == "ALL"):
+                    problems.append(f"{name}: full scan of {table} (~{rows} rows)")
+        return problems
+
+    def report_index_usage(self):
+        """Print every check_index_usage() problem; backends call this once their tables are initialized"""
+        try:
+            problems = self.check_index_usage()
+        except StorageError as e:
+            print(f"Index usage check failed: {e}")
+            return
+        for problem in problems:
+            print(f"Index usage warning: {problem}")
+
+    @abstractmethod
+    def get_admin_by_username(self, username):
+        """(id, username, password hash) of an admin, or None"""
+
+    @abstractmethod
+    def add_admin(self, username, password):
+        """Add new admin; raises IntegrityError if the username is taken"""
+
+    @abstractmethod
+    def update_admin_password(self, username, new_password):
+        """Update admin password"""
+
+    @abstractmethod
+    def get_employee_by_id(self, emp_id):
+        """(name, encoding bytes) of an active employee, or None"""
+
+    @abstractmethod
+    def get_active_face_encodings(self):
+        """Get ID, name and face encoding of every active employee"""
+
+    @abstractmethod
+    def get_face_encoding_changes(self, since=None):
+        """(employee id, name, encoding bytes, active, updated at) of employees changed after `since`
+
+        With `since` None, every active employee with an encoding. Rows that
+        come back inactive or without an encoding leave the gallery.
+        """
+
+    @abstractmethod
+    def get_face_encodings_after(self, last_id, limit):
+        """(employee id, encoding bytes) of up to `limit` employees with an ID past `last_id`, in ID order
+
+        With `last_id` None, from the first employee. Used to walk every
+        stored encoding in batches, e.g. to migrate its format.
+        """
+
+    @abstractmethod
+    def update_face_encodings(self, rows):
+        """Replace the encodings of (employee id, encoding bytes) rows in one transaction"""
+
+    @abstractmethod
+    def add_employee(self, emp_id, emp_name, emp_dept_id, emp_designation, face_encoding):
+        """Add new employee; raises IntegrityError if the ID is taken"""
+
+    @abstractmethod
+    def set_employee_active(self, emp_id, active):
+        """Activate or deactivate an employee; returns True if the employee exists"""
+
+    @abstractmethod
+    def get_department_id_by_name(self, dept_name):
+        """Get department ID by name"""
+
+    @abstractmethod
+    def get_all_departments(self):
+        """Get all active departments"""
+
+    @abstractmethod
+    def get_active_departments_with_ids(self):
+        """Get (id, description) of all active departments"""
+
+    @abstractmethod
+    def get_active_employee_departments(self):
+        """Get (employee id, department id) of all active employees"""
+
+    @abstractmethod
+    def get_present_employee_ids(self, day):
+        """Get IDs of employees with a check-in on the given day"""
+
+    @abstractmethod
+    def get_total_employees(self):
+        """Get total number of active employees"""
+
+    @abstractmethod
+    def get_attendance_rate(self):
+        """Get today's attendance rate"""
+
+    @abstractmethod
+    def get_attendance_by_department(self):
+        """Get (department, employee count, attendance count) for today"""
+
+    @abstractmethod
+    def check_attendance_exists(self, emp_id, date_today):
+        """Check if attendance already exists for employee today"""
+
+    @abstractmethod
+    def get_existing_attendance(self, emp_ids, date_today):
+        """Batch form of check_attendance_exists: IDs among emp_ids with a record for today"""
+
+    @abstractmethod
+    def add_attendance_in_batch(self, rows):
+        """Add several check-ins, given as (emp_id, timestamp, image_path) rows, in one transaction
+
+        Returns their transaction IDs, in row order.
+        """
+
+    @abstractmethod
+    def replay_attendance_in_batch(self, rows):
+        """Insert journaled check-ins, given as (emp_id, timestamp, image_path, idempotency_key) rows
+
+        Rows whose idempotency key is already present are left untouched, and
+        so are check-ins of an employee who already has one that day, e.g.
+        one made online before the outage. Returns {idempotency_key:
+        transaction_id} for the rows stored under their key, now or by an
+        earlier replay.
+        """
+
+    @abstractmethod
+    def update_attendance_out_batch(self, rows):
+        """Apply several check-outs, given as (emp_id, timestamp, image_path, date_today) rows, in one transaction"""
+
+    @abstractmethod
+    def add_attendance_in(self, emp_id, timestamp, image_path):
+        """Add check-in attendance; returns the transaction ID"""
+
+    @abstractmethod
+    def update_attendance_out(self, emp_id, timestamp, image_path, date_today):
+        """Update check-out attendance"""
+
+    @abstractmethod
+    def get_attendance_records(self, department, start_datetime, end_datetime):
+        """(date, emp_id, name, in time, out time, worked time) for a department within a date range"""
+
+    @abstractmethod
+    def count_attendance_records(self, department, start_datetime, end_datetime, employee_filter=None):
+        """Number of rows get_attendance_records would return, optionally only those whose
+        employee ID or name contains `employee_filter`"""
+
+    @abstractmethod
+    def get_attendance_page(self, department, start_datetime, end_datetime, offset, limit,
+                            sort_key="date", descending=False, employee_filter=None):
+        """One window of get_attendance_records rows, sorted and filtered by the database
+
+        `sort_key` is a key of ATTENDANCE_SORT_COLUMNS.
+        """
+
+    @abstractmethod
+    def iter_attendance_records(self, department, start_datetime, end_datetime, chunk_size=1000):
+        """get_attendance_records as a generator of row lists, `chunk_size` rows at a time
+
+        Rows are fetched from the database as they are consumed rather than
+        all at once; close() the generator to abandon the query early.
+        """
+
+    @abstractmethod
+    def get_daily_attendance_records(self, department, single_date):
+        """Get daily attendance records for a department"""
+
+    @abstractmethod
+    def close(self):
+        """Release connections"""
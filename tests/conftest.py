@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from encoding_format import ENCODING_DIMENSIONS, encode_templates
+from sqlite_storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    db = SQLiteStorage(str(tmp_path / "attendance.sqlite3"), departments=["General", "Stores"])
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+
+@pytest.fixture
+def templates(rng):
+    """templates(count) -> face-encoding-like (count x 128) float64 array"""
+    return lambda count=1: rng.normal(scale=0.1, size=(count, ENCODING_DIMENSIONS))
+
+
+@pytest.fixture
+def enroll(storage, templates):
+    """enroll(emp_id, name, department, encodings) adds an employee to `storage`; returns their templates"""
+    def add(emp_id, name, department="General", encodings=None):
+        encodings = templates() if encodings is None else encodings
+        storage.add_employee(emp_id, name, storage.get_department_id_by_name(department), "Staff",
+                             encode_templates(encodings))
+        return encodings
+    return add
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("face_recognition")
+
+import metrics
+from attendance_service import AttendanceService
+from camera_service import CameraSession
+from face_recognition_service import FaceDetection, FaceRecognitionService
+from punch_journal import PunchJournal
+from storage_backend import DatabaseUnavailableError
+
+
+@pytest.fixture
+def face_service(tmp_path, monkeypatch):
+    monkeypatch.setenv("image_store_root", str(tmp_path / "images"))
+    monkeypatch.setenv("threshold_file", str(tmp_path / "thresholds.json"))
+    service = FaceRecognitionService(CameraSession("synthetic:320x240"))
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def service(storage, face_service):
+    return AttendanceService(storage, face_service)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = PunchJournal(str(tmp_path / "journal.sqlite3"), flush_interval=0)
+    yield journal
+    journal.close()
+
+
+@pytest.fixture
+def faces(face_service, monkeypatch, rng):
+    """faces(encodings) makes the next capture find one face per encoding, side by side in one frame"""
+    def arrange(encodings):
+        frame = rng.integers(0, 256, size=(240, 320, 3), dtype=np.uint8)
+        # (top, right, bottom, left) in detection-frame coordinates
+        locations = [(5, 22 + 25 * i, 25, 2 + 25 * i) for i in range(len(encodings))]
+        detection = FaceDetection(frame, locations, list(encodings), face_service.DETECTION_SCALE)
+        monkeypatch.setattr(face_service, "process_attendance_image", lambda emp_id: (detection, None))
+    return arrange
+
+
+def test_group_check_in_links_each_face_image(service, storage, face_service, enroll, faces):
+    faces([enroll("E1", "Asha")[0], enroll("E2", "Ravi")[0]])
+    results, error = service.mark_group_attendance(is_markin=True)
+    assert error is None
+    assert [result.outcome for result in results] == ["success", "success"]
+    with storage._cursor() as cursor:
+        cursor.execute("SELECT et_transaction_id, et_employee_in_imgpth FROM employee_transactions")
+        rows = cursor.fetchall()
+    assert len(rows) == 2
+    for transaction_id, image_path in rows:
+        assert face_service.image_store.get_transaction_images(transaction_id) == {"in": image_path}
+
+
+def test_group_punch_keeps_the_closer_of_two_faces_of_one_person(service, storage, enroll, faces, rng):
+    asha = enroll("E1", "Asha")[0]
+    enroll("E2", "Ravi")
+    faces([asha + rng.normal(scale=0.01, size=128), asha])
+    results, _ = service.mark_group_attendance(is_markin=True)
+    assert [result.outcome for result in results] == ["rejected", "success"]
+    assert results[0].message == "Duplicate of face 2"
+    assert storage.count_attendance_records("General", "2000-01-01", "2100-01-01") == 1
+
+
+def test_group_punch_reports_unknown_faces_per_face(service, enroll, faces, templates):
+    asha = enroll("E1", "Asha")[0]
+    enroll("E2", "Ravi")
+    faces([templates()[0], asha])
+    results, _ = service.mark_group_attendance(is_markin=True)
+    assert [result.outcome for result in results] == ["mismatch", "success"]
+    assert results[1].employee_id == "E1"
+
+
+def test_offline_group_punch_is_journaled_and_linked_on_replay(storage, face_service, journal, enroll,
+                                                               faces, monkeypatch):
+    service = AttendanceService(storage, face_service, journal)
+    faces([enroll("E1", "Asha")[0], enroll("E2", "Ravi")[0]])
+    service.load_gallery()
+
+    def unreachable(*args):
+        raise DatabaseUnavailableError("Database is offline.")
+    with monkeypatch.context() as offline:
+        offline.setattr(storage, "get_existing_attendance", unreachable)
+        results, error = service.mark_group_attendance(is_markin=True)
+    assert error is None and all(result.success for result in results)
+    assert journal.pending_count() == 2
+
+    assert journal.replay(storage, face_service.image_store) == 2
+    with storage._cursor() as cursor:
+        cursor.execute("SELECT et_transaction_id, et_employee_in_imgpth FROM employee_transactions")
+        rows = cursor.fetchall()
+    assert len(rows) == 2
+    for transaction_id, image_path in rows:
+        assert face_service.image_store.get_transaction_images(transaction_id) == {"in": image_path}
+
+
+def test_repeat_punches_read_the_employee_from_the_encoding_cache(service, storage, face_service, enroll,
+                                                                  faces, monkeypatch):
+    faces([enroll("E1", "Asha")[0]])
+    reads = []
+    get_employee_by_id = storage.get_employee_by_id
+    monkeypatch.setattr(storage, "get_employee_by_id", lambda emp_id: reads.append(emp_id) or get_employee_by_id(emp_id))
+    for _ in range(3):
+        service.mark_attendance("E1", is_markin=True)
+    assert reads == ["E1"]
+    assert face_service.encoding_cache.stats()["hits"] == 2
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = metrics.MetricsRegistry(enabled=True)
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    return registry
+
+
+def outcomes(registry):
+    return {dict(labels)["outcome"]: value for (name, labels), value in registry.counters.items()
+            if name == "punch_outcomes_total"}
+
+
+def test_each_face_of_a_group_punch_counts_one_outcome(service, enroll, faces, templates, registry):
+    asha = enroll("E1", "Asha")[0]
+    enroll("E2", "Ravi")
+    faces([asha, templates()[0]])
+    service.mark_group_attendance(is_markin=True)
+    assert outcomes(registry) == {"success": 1, "mismatch": 1}
+    assert {stage for stage in registry.histograms} >= {"punch", "identification", "db_read", "db_write"}
+
+
+def test_punch_against_an_empty_gallery_counts_as_no_gallery(service, faces, templates, registry):
+    faces([templates()[0]])
+    assert service.identify_and_mark_attendance(is_markin=True) == (False, "No employees enrolled.")
+    assert service.mark_group_attendance(is_markin=True) == ([], "No employees enrolled.")
+    assert outcomes(registry) == {"no_gallery": 2}
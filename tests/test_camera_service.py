@@ -0,0 +1,36 @@
+import numpy as np
+
+from camera_service import CameraSession, SyntheticFrameSource, create_frame_source
+
+
+def test_synthetic_spec_builds_frames_of_the_requested_size():
+    source = create_frame_source("synthetic:320x240")
+    assert isinstance(source, SyntheticFrameSource)
+    assert source.open()
+    ret, frame = source.read()
+    assert ret
+    assert frame.shape == (240, 320, 3)
+    assert frame.dtype == np.uint8
+
+
+def test_exhausted_generator_ends_the_stream():
+    frames = iter([np.zeros((4, 4, 3), dtype=np.uint8)])
+    source = SyntheticFrameSource(lambda: next(frames, None))
+    assert source.read()[0]
+    assert source.read() == (False, None)
+
+
+def test_session_serves_fresh_frames():
+    counter = iter(range(1_000_000))
+    source = SyntheticFrameSource(lambda: np.full((8, 8, 3), next(counter) % 256, dtype=np.uint8))
+    session = CameraSession(source, warmup_frames=0, frame_interval=0.001)
+    try:
+        ret, frame = session.read(timeout=2.0)
+        assert ret and frame.shape == (8, 8, 3)
+        ret, _, first = session.read_new(0, timeout=2.0)
+        ret, _, second = session.read_new(first, timeout=2.0)
+        assert ret and second > first
+        assert 1 <= len(session.recent_frames(3)) <= 3
+    finally:
+        session.stop()
+    assert not session.is_running()
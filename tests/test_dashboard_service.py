@@ -0,0 +1,45 @@
+from datetime import datetime
+
+import pytest
+
+from dashboard_service import DashboardAggregates
+
+
+@pytest.fixture
+def dashboard(storage, enroll):
+    enroll("E1", "Asha")
+    enroll("E2", "Ravi")
+    enroll("S1", "Meena", department="Stores")
+    dashboard = DashboardAggregates(storage, reconcile_interval=0)
+    dashboard.start()
+    yield dashboard
+    dashboard.stop()
+
+
+def rebuilt(storage):
+    fresh = DashboardAggregates(storage, reconcile_interval=0)
+    return fresh.get_dashboard_data()
+
+
+def test_punches_update_the_counters_without_a_query(storage, dashboard, monkeypatch):
+    storage.add_attendance_in("E1", datetime.now(), None)
+    storage.add_attendance_in_batch([("S1", datetime.now(), None)])
+    monkeypatch.setattr(storage, "get_present_employee_ids", None)
+    total, rate, departments = dashboard.get_dashboard_data()
+    assert total == 3
+    assert rate == pytest.approx(200 / 3)
+    assert departments == [("General", 1, 50.0), ("Stores", 1, 100.0)]
+
+
+def test_registrations_and_deactivations_match_a_reconcile(storage, enroll, dashboard):
+    storage.add_attendance_in("E2", datetime.now(), None)
+    enroll("S2", "Kiran", department="Stores")
+    storage.set_employee_active("E2", False)
+    assert dashboard.get_dashboard_data() == rebuilt(storage)
+    assert dashboard.get_dashboard_data()[2] == [("General", 0, 0.0), ("Stores", 0, 0.0)]
+
+
+def test_repeat_punches_count_once(storage, dashboard):
+    storage.add_attendance_in("E1", datetime.now(), None)
+    storage.update_attendance_out("E1", datetime.now(), None, datetime.now().strftime("%Y-%m-%d"))
+    assert dashboard.get_dashboard_data()[2][0] == ("General", 1, 50.0)
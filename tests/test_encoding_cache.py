@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from encoding_cache import EncodingCache
+from encoding_format import encode_templates
+
+
+def test_least_recently_used_entry_is_evicted_first(templates):
+    cache = EncodingCache(max_entries=2)
+    for emp_id in ("E1", "E2"):
+        cache.put(emp_id, f"Name {emp_id}", encode_templates(templates()))
+    cache.get("E1")
+    cache.put("E3", "Name E3", encode_templates(templates()))
+    assert cache.get("E2") is None
+    assert cache.get("E1") is not None and cache.get("E3") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_budget_bounds_the_cache(templates):
+    one_template = templates()[0].nbytes
+    cache = EncodingCache(max_bytes=3 * one_template)
+    cache.put("MULTI", "Multi", encode_templates(templates(3)))
+    cache.put("E1", "Asha", encode_templates(templates()))
+    assert cache.get("MULTI") is None
+    assert cache.stats()["bytes"] == one_template
+
+
+def test_hit_returns_the_decoded_read_only_encoding(templates):
+    cache = EncodingCache()
+    encoding = templates()
+    cache.put("E1", "Asha", encode_templates(encoding))
+    name, cached = cache.get("E1")
+    assert name == "Asha"
+    np.testing.assert_allclose(cached, encoding[0])
+    with pytest.raises(ValueError):
+        cached[0] = 0.0
+    assert cache.stats()["hits"] == 1 and cache.stats()["decodes"] == 1
+
+
+def test_invalidate_forces_a_reload(templates):
+    cache = EncodingCache()
+    cache.put("E1", "Asha", encode_templates(templates()))
+    cache.invalidate("E1")
+    assert cache.get("E1") is None
+    assert cache.stats()["invalidations"] == 1 and cache.stats()["bytes"] == 0
+
+
+def test_warm_stops_at_the_entry_limit(templates):
+    cache = EncodingCache(max_entries=3)
+    cache.warm((f"E{i}", f"Name {i}", encode_templates(templates())) for i in range(10))
+    assert len(cache) == 3
+    assert cache.stats()["evictions"] == 0
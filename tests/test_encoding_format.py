@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+import encoding_format
+from encoding_format import decode_compact, decode_templates, encode_templates
+
+
+@pytest.mark.parametrize("fmt, tolerance", [("float64", 0), ("float32", 1e-7), ("float16", 1e-3), ("int8", 2e-3)])
+def test_round_trip(templates, fmt, tolerance):
+    original = templates(3)
+    data = encode_templates(original, fmt)
+    compact, scales, stored_format = decode_compact(data)
+    assert stored_format == fmt
+    assert compact.shape == (3, 128)
+    assert (scales is not None) == (fmt == "int8")
+    np.testing.assert_allclose(decode_templates(data), original, atol=tolerance)
+
+
+def test_single_template_round_trip(templates):
+    original = templates(1)[0]
+    assert decode_templates(encode_templates(original)).shape == (1, 128)
+
+
+def test_legacy_float64_blob_is_detected(templates):
+    original = templates(2)
+    compact, scales, stored_format = decode_compact(original.tobytes())
+    assert stored_format == "legacy"
+    assert scales is None
+    np.testing.assert_array_equal(compact, original)
+
+
+def test_unrecognized_blob_is_rejected():
+    with pytest.raises(ValueError):
+        decode_templates(b"\x00" * 100)
+
+
+def test_migrate_rewrites_legacy_rows(storage):
+    rng = np.random.default_rng(3)
+    legacy = rng.normal(scale=0.1, size=(1, 128))
+    storage.add_employee("E1", "Asha", storage.get_department_id_by_name("General"), "Staff", legacy.tobytes())
+    encoding_format.migrate(storage, "float16")
+    stored = storage.get_employee_by_id("E1")[1]
+    assert decode_compact(stored)[2] == "float16"
+    np.testing.assert_allclose(decode_templates(stored), legacy, atol=1e-3)
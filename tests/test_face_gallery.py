@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from encoding_format import encode_templates
+from face_gallery import FaceGallery
+
+
+def brute_force(gallery_templates, probes):
+    """(best id, best distance, second id) per probe from explicit per-employee minimum distances"""
+    results = []
+    for probe in probes:
+        distances = sorted((np.linalg.norm(encodings - probe, axis=1).min(), emp_id)
+                           for emp_id, encodings in gallery_templates.items())
+        results.append((distances[0][1], distances[0][0], distances[1][1]))
+    return results
+
+
+@pytest.fixture
+def enrolled(templates):
+    """{employee id: templates}; every third employee has three templates"""
+    return {f"E{i:03d}": templates(3 if i % 3 == 0 else 1) for i in range(300)}
+
+
+def probes_near(enrolled, rng, count=40):
+    ids = rng.choice(sorted(enrolled), count)
+    return np.array([enrolled[emp_id][0] + rng.normal(scale=0.02, size=128) for emp_id in ids])
+
+
+def load(gallery, enrolled, fmt="float64"):
+    gallery.load((emp_id, f"Name {emp_id}", encode_templates(encodings, fmt))
+                 for emp_id, encodings in enrolled.items())
+    return gallery
+
+
+def test_identify_matches_brute_force(enrolled, rng):
+    gallery = load(FaceGallery(), enrolled)
+    probes = probes_near(enrolled, rng)
+    for probe, (best_id, best_distance, second_id) in zip(probes, brute_force(enrolled, probes)):
+        result = gallery.identify(probe)
+        assert (result.employee_id, result.second_employee_id) == (best_id, second_id)
+        assert result.distance == pytest.approx(best_distance)
+        assert result.is_match
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"encoding_format": "float32"},
+    # Probing every list makes the IVF search exact
+    {"ann_min_size": 1, "ann_lists": 8, "ann_probes": 8},
+], ids=["float64", "float32", "ivf"])
+def test_identify_batch_matches_brute_force(options, enrolled, rng):
+    gallery = load(FaceGallery(**options), enrolled)
+    probes = probes_near(enrolled, rng)
+    expected = brute_force(enrolled, probes)
+    results = gallery.identify_batch(probes)
+    assert [r.employee_id for r in results] == [e[0] for e in expected]
+    assert [r.second_employee_id for r in results] == [e[2] for e in expected]
+    np.testing.assert_allclose([r.distance for r in results], [e[1] for e in expected], atol=1e-5)
+    assert all(r.is_match for r in results)
+
+
+def test_int8_gallery_agrees_with_brute_force(enrolled, rng):
+    gallery = load(FaceGallery(encoding_format="int8"), enrolled, "int8")
+    probes = probes_near(enrolled, rng)
+    assert ([r.employee_id for r in gallery.identify_batch(probes)]
+            == [e[0] for e in brute_force(enrolled, probes)])
+
+
+def test_index_is_used_from_ann_min_size_on(enrolled):
+    assert load(FaceGallery(ann_min_size=len(enrolled) + 1), enrolled).index is None
+    gallery = load(FaceGallery(ann_min_size=len(enrolled)), enrolled)
+    assert len(gallery.index) == sum(len(encodings) for encodings in enrolled.values())
+
+
+def test_update_keeps_gallery_and_index_consistent(enrolled, templates, rng):
+    gallery = load(FaceGallery(ann_min_size=1, ann_lists=8, ann_probes=8), enrolled)
+    replaced, hired = templates(2), templates(1)
+    gallery.update([("E001", "Renamed", replaced), ("E002", None, None), ("NEW", "New Hire", hired)])
+    enrolled = {**enrolled, "E001": replaced, "NEW": hired}
+    del enrolled["E002"]
+
+    assert len(gallery) == len(enrolled)
+    assert gallery.get("E002") is None
+    assert gallery.get("E001")[0] == "Renamed"
+    assert len(gallery.index) == sum(len(encodings) for encodings in enrolled.values())
+    probes = probes_near(enrolled, rng)
+    assert ([r.employee_id for r in gallery.identify_batch(probes)]
+            == [e[0] for e in brute_force(enrolled, probes)])
+
+
+def test_ambiguous_best_match_is_rejected_by_the_margin(templates):
+    twin = templates()
+    gallery = FaceGallery(min_margin=0.05)
+    gallery.load([("E1", "Asha", encode_templates(twin)), ("E2", "Twin", encode_templates(twin + 1e-4))])
+    result = gallery.identify(twin[0])
+    assert result.distance <= gallery.threshold
+    assert not result.is_match
+
+
+def test_added_and_removed_employees_are_identified_at_once(enrolled, templates):
+    gallery = load(FaceGallery(), enrolled)
+    hired = templates()
+    gallery.add("NEW", "New Hire", hired)
+    assert gallery.identify(hired[0]).employee_id == "NEW"
+    gallery.remove("NEW")
+    assert gallery.identify(hired[0]).employee_id != "NEW"
+    assert len(gallery) == len(enrolled)
+
+
+def test_empty_gallery_identifies_nothing(templates):
+    gallery = FaceGallery()
+    assert gallery.identify(templates()[0]) is None
+    assert gallery.identify(None) is None
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from face_gallery import FaceGallery
+from gallery_snapshot import GallerySnapshot
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return GallerySnapshot(str(tmp_path / "gallery"), "float32")
+
+
+def gallery_from(generation):
+    gallery = FaceGallery(encoding_format="float32")
+    gallery.load_arrays(generation.employee_ids, generation.names, generation.matrix, generation.counts,
+                        generation.scales)
+    return gallery
+
+
+def templates_of(generation, emp_id):
+    compact, _ = generation.templates(emp_id)
+    return np.asarray(compact, dtype=np.float64)
+
+
+def test_first_sync_publishes_every_active_employee(storage, enroll, snapshot):
+    enroll("E1", "Asha")
+    enroll("E2", "Ravi")
+    assert snapshot.open() is None
+    generation = snapshot.sync(storage)
+    assert sorted(generation.employee_ids) == ["E1", "E2"]
+    assert generation.changes is None
+    assert snapshot.open().employee_ids == generation.employee_ids
+
+
+def test_delta_sync_carries_only_changed_rows(storage, enroll, snapshot, templates):
+    first = enroll("E1", "Asha")
+    enroll("E2", "Ravi")
+    base = snapshot.sync(storage)
+    assert snapshot.sync(storage, base) is base
+
+    storage.set_employee_active("E2", False)
+    hired = enroll("E3", "Meera", encodings=templates(2))
+    generation = snapshot.sync(storage, base)
+    assert generation is not base
+    assert sorted(str(row[0]) for row in generation.changes) == ["E2", "E3"]
+    assert sorted(generation.employee_ids) == ["E1", "E3"]
+    np.testing.assert_allclose(generation.templates("E3")[0], hired, atol=1e-6)
+    np.testing.assert_allclose(generation.templates("E1")[0], first, atol=1e-6)
+
+    # Applying the delta to a gallery built from the old generation matches a fresh load of the new one
+    gallery = gallery_from(base)
+    gallery.update((emp_id, name, None if not active else templates_of(generation, emp_id))
+                   for emp_id, name, _, active, _ in generation.changes)
+    fresh = gallery_from(generation)
+    assert sorted(gallery.snapshot[0]) == sorted(fresh.snapshot[0])
+    probes = np.vstack([first, hired])
+    assert ([r.employee_id for r in gallery.identify_batch(probes)]
+            == [r.employee_id for r in fresh.identify_batch(probes)] == ["E1", "E3", "E3"])
+
+
+def test_reopened_snapshot_keeps_watermark(storage, enroll, snapshot):
+    enroll("E1", "Asha")
+    generation = snapshot.sync(storage)
+    reopened = GallerySnapshot(snapshot.root, "float32").open()
+    assert reopened.watermark == generation.watermark
+    assert reopened.employee_ids == ["E1"]
@@ -0,0 +1,63 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from image_store import ImageStore, parse_retention
+from image_writer import ImageWriter
+
+
+@pytest.fixture
+def image_store(tmp_path):
+    store = ImageStore(str(tmp_path / "images"), ImageWriter(max_queue=16))
+    yield store
+    store.image_writer.shutdown()
+    store.close()
+
+
+@pytest.fixture
+def face(rng):
+    return rng.integers(0, 256, size=(48, 48, 3), dtype=np.uint8)
+
+
+def test_paths_are_sharded_by_kind_day_and_hash(image_store, face):
+    path = image_store.put("checkin", face, "E1", captured_at=datetime(2024, 3, 9, 8, 30))
+    digest = os.path.basename(path)[:-len(".jpg")]
+    assert os.path.relpath(path, image_store.root).split(os.sep) == [
+        "checkin", "2024", "03", "09", digest[:2], f"{digest}.jpg"]
+    image_store.image_writer.flush()
+    assert os.path.exists(path)
+
+
+def test_identical_images_are_stored_once(image_store, face):
+    first = image_store.put("failed", face, "unidentified")
+    second = image_store.put("failed", face, "unidentified")
+    assert first == second
+    assert image_store.image_writer.stats()["submitted"] == 1
+    assert image_store.find_images("unidentified") == [first]
+
+
+def test_check_out_is_linked_to_the_same_days_check_in(image_store, face):
+    day = datetime.now().strftime("%Y-%m-%d")
+    checkin = image_store.put("checkin", face, "E1")
+    image_store.link_transaction(7, "in", checkin)
+    checkout = image_store.put("checkout", face[::-1], "E1")
+    image_store.link_checkout("E1", day, checkout)
+    assert image_store.get_transaction_images(7) == {"in": checkin, "out": checkout}
+
+
+def test_retention_removes_expired_kinds_only(tmp_path, face):
+    store = ImageStore(str(tmp_path / "images"), ImageWriter(max_queue=16),
+                       retention_days=parse_retention("failed=90"))
+    try:
+        old = datetime(2020, 1, 1)
+        failed = store.put("failed", face, "unidentified", captured_at=old)
+        checkin = store.put("checkin", face, "E1", captured_at=old)
+        store.image_writer.flush()
+        assert store.apply_retention() == 1
+        assert not os.path.exists(failed)
+        assert store.find_images("E1") == [checkin]
+    finally:
+        store.image_writer.shutdown()
+        store.close()
@@ -0,0 +1,66 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from image_writer import ImageWriter
+
+
+@pytest.fixture
+def crop(rng):
+    return rng.integers(0, 256, size=(32, 32, 3), dtype=np.uint8)
+
+
+def test_submit_returns_the_path_before_the_write(tmp_path, crop):
+    writer = ImageWriter(max_queue=4)
+    path = str(tmp_path / "checkin" / "face.jpg")
+    assert writer.submit(path, crop) == path
+    writer.flush()
+    assert os.path.getsize(path) > 0
+    writer.shutdown()
+    assert writer.stats()["written"] == 1
+
+
+def test_full_queue_drops_after_the_block_timeout(tmp_path, crop, monkeypatch):
+    writer = ImageWriter(max_queue=1, block_timeout=0.01)
+    release = threading.Event()
+    write = os.replace
+    monkeypatch.setattr(os, "replace", lambda *args: release.wait(5) and write(*args))
+    try:
+        writer.submit_bytes(str(tmp_path / "a.jpg"), b"a")    # taken by the writer, which then blocks
+        while writer.queue.qsize():
+            pass
+        writer.submit_bytes(str(tmp_path / "b.jpg"), b"b")    # fills the queue
+        assert writer.submit_bytes(str(tmp_path / "c.jpg"), b"c") is None
+        assert writer.stats()["dropped"] == 1
+    finally:
+        release.set()
+        writer.shutdown()
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg", "b.jpg"]
+
+
+@pytest.mark.parametrize("policy, written", [("drain", ["a.jpg", "b.jpg"]), ("drop", ["a.jpg"])])
+def test_shutdown_applies_the_flush_policy(tmp_path, policy, written, monkeypatch):
+    writer = ImageWriter(max_queue=4, flush_on_shutdown=policy)
+    release = threading.Event()
+    write = os.replace
+    monkeypatch.setattr(os, "replace", lambda *args: release.wait(5) and write(*args))
+    writer.submit_bytes(str(tmp_path / "a.jpg"), b"a")
+    while writer.queue.qsize():
+        pass
+    writer.submit_bytes(str(tmp_path / "b.jpg"), b"b")
+    threading.Timer(0.05, release.set).start()
+    writer.shutdown()
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith(".jpg")) == written
+
+
+def test_closed_writer_refuses_new_images(tmp_path, crop):
+    writer = ImageWriter()
+    writer.shutdown()
+    assert writer.submit(str(tmp_path / "late.jpg"), crop) is None
+
+
+def test_unknown_flush_policy_is_rejected():
+    with pytest.raises(ValueError):
+        ImageWriter(flush_on_shutdown="later")
@@ -0,0 +1,64 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import STAGE_HISTOGRAM, MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    registry = MetricsRegistry(enabled=True, buckets=(0.01, 0.1))
+    yield registry
+    registry.stop()
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry()
+    with registry.span("detection") as first, registry.span("matching") as second:
+        pass
+    assert first is second
+    registry.increment("punch_outcomes_total", outcome="success")
+    assert registry.render() == "\n"
+
+
+def test_stage_histogram_buckets_are_cumulative(registry):
+    for seconds in (0.005, 0.05, 0.5):
+        registry.observe("detection", seconds)
+    lines = registry.render().splitlines()
+    assert f'{STAGE_HISTOGRAM}_bucket{{stage="detection",le="0.01"}} 1' in lines
+    assert f'{STAGE_HISTOGRAM}_bucket{{stage="detection",le="0.1"}} 2' in lines
+    assert f'{STAGE_HISTOGRAM}_bucket{{stage="detection",le="+Inf"}} 3' in lines
+    assert f'{STAGE_HISTOGRAM}_count{{stage="detection"}} 3' in lines
+
+
+def test_counters_are_kept_per_label_set(registry):
+    registry.increment("punch_outcomes_total", outcome="success")
+    registry.increment("punch_outcomes_total", outcome="success")
+    registry.increment("punch_outcomes_total", outcome="no_face")
+    lines = registry.render().splitlines()
+    assert "# TYPE punch_outcomes_total counter" in lines
+    assert 'punch_outcomes_total{outcome="success"} 2' in lines
+    assert 'punch_outcomes_total{outcome="no_face"} 1' in lines
+
+
+def test_failing_gauge_is_left_out(registry):
+    registry.add_gauge("image_queue_depth", lambda: 3)
+    registry.add_gauge("broken", lambda: 1 / 0)
+    text = registry.render()
+    assert "image_queue_depth 3" in text
+    assert "broken" not in text
+
+
+def test_file_and_http_exports_serve_the_same_text(registry, tmp_path):
+    registry.increment("punch_outcomes_total", outcome="success")
+    path = tmp_path / "attendance.prom"
+    registry.write_file(str(path))
+    assert path.read_text() == registry.render()
+
+    server = registry.start_http_server(0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    with urllib.request.urlopen(f"{url}/metrics") as response:
+        assert response.read().decode() == registry.render()
+    with pytest.raises(urllib.error.HTTPError):
+        urllib.request.urlopen(f"{url}/other")
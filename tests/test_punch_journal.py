@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from image_store import ImageStore
+from image_writer import ImageWriter
+from punch_journal import PunchJournal
+from storage_backend import day_bounds
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = PunchJournal(str(tmp_path / "journal.sqlite3"), flush_interval=0)
+    yield journal
+    journal.close()
+
+
+def test_replay_applies_check_ins_then_check_outs(storage, enroll, journal):
+    enroll("E1", "Asha")
+    journal.append("in", "E1", "2024-03-05 09:00:00")
+    journal.append("out", "E1", "2024-03-05 17:30:00")
+    assert journal.has_punch("E1", "2024-03-05", "in")
+    assert journal.pending_count() == 2
+
+    assert journal.replay(storage) == 2
+    assert journal.pending_count() == 0
+    (_, _, _, in_time, out_time, _), = storage.get_attendance_records("General", *day_bounds("2024-03-05"))
+    assert (in_time, out_time) == (datetime(2024, 3, 5, 9), datetime(2024, 3, 5, 17, 30))
+
+
+def test_replay_links_journaled_images(tmp_path, storage, enroll, journal, rng):
+    image_store = ImageStore(str(tmp_path / "images"), ImageWriter(max_queue=16))
+    try:
+        enroll("E1", "Asha")
+        face = rng.integers(0, 256, size=(48, 48, 3), dtype=np.uint8)
+        captured_at = datetime(2024, 3, 5, 9)
+        checkin = image_store.put("checkin", face, "E1", captured_at=captured_at)
+        checkout = image_store.put("checkout", face, "E1", captured_at=captured_at)
+        journal.append("in", "E1", "2024-03-05 09:00:00", checkin)
+        journal.append("out", "E1", "2024-03-05 17:30:00", checkout)
+
+        assert journal.replay(storage, image_store) == 2
+        with storage._cursor() as cursor:
+            cursor.execute("SELECT et_transaction_id FROM employee_transactions")
+            (transaction_id,), = cursor.fetchall()
+        assert image_store.get_transaction_images(transaction_id) == {"in": checkin, "out": checkout}
+    finally:
+        image_store.image_writer.shutdown()
+        image_store.close()
+
+
+def test_replay_is_idempotent(storage, enroll, journal):
+    enroll("E1", "Asha")
+    enroll("E2", "Ravi")
+    journal.append_many([("in", "E1", "2024-03-05 09:00:00", None), ("in", "E2", "2024-03-05 09:01:00", None)])
+    journal.replay(storage)
+    # A crash between the database commit and marking the punches replayed re-sends the same keys
+    with journal.lock:
+        journal.conn.execute("UPDATE punches SET replayed = 0")
+        journal.conn.commit()
+    journal.replay(storage)
+    assert storage.count_attendance_records("General", *day_bounds("2024-03-05")) == 2
+
+
+def test_replay_skips_employees_checked_in_online(storage, enroll, journal):
+    enroll("E1", "Asha")
+    storage.add_attendance_in("E1", datetime(2024, 3, 5, 8, 55), None)
+    journal.append("in", "E1", "2024-03-05 09:00:00")
+    journal.replay(storage)
+    (_, _, _, in_time, _, _), = storage.get_attendance_records("General", *day_bounds("2024-03-05"))
+    assert in_time == datetime(2024, 3, 5, 8, 55)
+
+
+def test_rejected_punches_are_quarantined(storage, enroll, journal):
+    enroll("E1", "Asha")
+    journal.append_many([("in", "E1", "2024-03-05 09:00:00", None), ("in", "GONE", "2024-03-05 09:01:00", None)])
+    assert journal.replay(storage) == 1
+    assert [row[2] for row in journal.failed_punches()] == ["GONE"]
+    assert journal.pending_count() == 0
+
+    enroll("GONE", "Back Again")
+    assert journal.retry_failed() == 1
+    assert journal.replay(storage) == 1
+    assert journal.failed_punches() == []
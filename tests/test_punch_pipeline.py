@@ -0,0 +1,100 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from punch_pipeline import PunchPipeline, PunchStats
+
+
+class ManualRoot:
+    """Stands in for the Tk root: after() callbacks run when the test calls run_pending()"""
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, delay_ms, callback):
+        self.callbacks.append(callback)
+
+    def run_pending(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+class ScriptedAttendance:
+    """Attendance service whose punches wait for `release` and answer from the employee ID"""
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.threads = set()
+
+    def mark_attendance(self, emp_id, is_markin):
+        self.threads.add(threading.current_thread())
+        self.started.set()
+        self.release.wait(5)
+        if emp_id == "BOOM":
+            raise RuntimeError("camera unplugged")
+        return True, f"{'in' if is_markin else 'out'} {emp_id}"
+
+    def mark_group_attendance(self, is_markin):
+        return [SimpleNamespace(success=True, message="Checked in Asha"),
+                SimpleNamespace(success=False, message="Not recognized")], None
+
+    def format_group_results(self, results):
+        return "; ".join(result.message for result in results)
+
+
+@pytest.fixture
+def pipeline():
+    root = ManualRoot()
+    attendance = ScriptedAttendance()
+    pipeline = PunchPipeline(attendance, root)
+    yield pipeline, root, attendance
+    attendance.release.set()
+    pipeline.shutdown(wait=True)
+
+
+def test_punches_run_off_the_caller_thread_and_report_back_on_drain(pipeline):
+    pipeline, root, attendance = pipeline
+    done = []
+    pipeline.submit("E1", True, lambda success, message: done.append((success, message)))
+    pipeline.submit("E2", False, lambda success, message: done.append((success, message)))
+    # submit() returned while the first punch is still blocked in the worker
+    assert attendance.started.wait(5)
+    assert pipeline.status() == "Processing employee E1 (1 waiting)"
+
+    attendance.release.set()
+    pipeline.shutdown(wait=True)
+    assert done == []
+    root.run_pending()
+    assert done == [(True, "in E1"), (True, "out E2")]
+    assert threading.current_thread() not in attendance.threads
+    assert pipeline.status() == "Ready"
+    assert pipeline.stats.total_punches == 2
+
+
+def test_failed_punch_is_reported_not_raised(pipeline):
+    pipeline, root, attendance = pipeline
+    done = []
+    attendance.release.set()
+    pipeline.submit("BOOM", True, lambda success, message: done.append((success, message)))
+    pipeline.shutdown(wait=True)
+    root.run_pending()
+    assert done == [(False, "Attendance error: camera unplugged")]
+
+
+def test_group_punch_succeeds_when_any_face_does(pipeline):
+    pipeline, root, _ = pipeline
+    done = []
+    pipeline.submit(None, True, lambda success, message: done.append((success, message)), mode="group")
+    pipeline.shutdown(wait=True)
+    root.run_pending()
+    assert done == [(True, "Checked in Asha; Not recognized")]
+
+
+def test_stats_report_rate_and_service_time():
+    stats = PunchStats()
+    for service_time in (0.5, 1.5):
+        stats.record(service_time)
+    assert stats.average_service_time() == pytest.approx(1.0)
+    assert stats.punches_per_minute() > 0
+    assert "2 total" in stats.summary()
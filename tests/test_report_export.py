@@ -0,0 +1,54 @@
+import csv
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from report_export import EXPORT_COLUMNS, available_formats, export_format, file_types, write_export
+
+ROWS = [(date(2024, 3, 5), "E1", "Asha", datetime(2024, 3, 5, 9), datetime(2024, 3, 5, 17), timedelta(hours=8)),
+        (date(2024, 3, 5), "E2", "Ravi", datetime(2024, 3, 5, 9, 30), None, None)]
+
+
+def test_csv_is_always_available():
+    assert "csv" in available_formats()
+    assert ("CSV files", "*.csv") in file_types()
+
+
+def test_export_format_rejects_unknown_extensions():
+    with pytest.raises(ValueError):
+        export_format("report.pdf")
+
+
+def test_csv_export_streams_every_chunk(tmp_path):
+    path = tmp_path / "report.csv"
+    progress = []
+    assert write_export(iter([ROWS[:1], ROWS[1:]]), str(path), progress.append) == 2
+    assert progress == [1, 2]
+    with open(path, newline="", encoding="utf-8") as f:
+        lines = list(csv.reader(f))
+    assert lines[0] == EXPORT_COLUMNS
+    assert [line[1] for line in lines[1:]] == ["E1", "E2"]
+    assert not (tmp_path / "report.csv.part").exists()
+
+
+def test_failed_export_leaves_no_file(tmp_path):
+    def chunks():
+        yield ROWS
+        raise RuntimeError("query failed")
+
+    path = tmp_path / "report.csv"
+    with pytest.raises(RuntimeError):
+        write_export(chunks(), str(path))
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("fmt, package", [("xlsx", "openpyxl"), ("parquet", "pyarrow")])
+def test_optional_formats_follow_their_package(tmp_path, fmt, package):
+    try:
+        __import__(package)
+    except ImportError:
+        assert fmt not in available_formats()
+        with pytest.raises(ValueError, match=package):
+            export_format(f"report.{fmt}")
+        return
+    assert write_export(iter([ROWS]), str(tmp_path / f"report.{fmt}")) == 2
@@ -0,0 +1,134 @@
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from storage_backend import IntegrityError, StorageBackend, day_bounds, like_pattern
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+
+def test_duplicate_employee_raises_integrity_error(storage, enroll):
+    enroll("E1", "Asha")
+    with pytest.raises(IntegrityError):
+        enroll("E1", "Asha")
+
+
+def test_check_in_and_check_out(storage, enroll):
+    enroll("E1", "Asha")
+    day = date(2024, 3, 5)
+    check_in = datetime(2024, 3, 5, 9, 0)
+    storage.add_attendance_in("E1", check_in, "in.jpg")
+    assert storage.get_present_employee_ids(day) == ["E1"]
+    assert storage.check_attendance_exists("E1", day.isoformat()) is None
+
+    storage.update_attendance_out("E1", check_in + timedelta(hours=8), "out.jpg", day.isoformat())
+    assert storage.check_attendance_exists("E1", day.isoformat()) is not None
+    assert storage.get_existing_attendance(["E1", "E2"], day.isoformat()) == {"E1"}
+    (_, emp_id, _, _, out_time, worktime), = storage.get_attendance_records("General", *day_bounds(day))
+    assert emp_id == "E1"
+    assert out_time == check_in + timedelta(hours=8)
+    assert worktime == timedelta(hours=8)
+
+
+def test_batch_check_in_returns_transaction_ids_in_row_order(storage, enroll):
+    enroll("E1", "Asha")
+    enroll("E2", "Ravi")
+    transaction_ids = storage.add_attendance_in_batch([("E2", "2024-03-09 08:00:00", "b.jpg"),
+                                                       ("E1", "2024-03-09 08:00:00", "a.jpg")])
+    with storage._cursor() as cursor:
+        cursor.execute("SELECT et_transaction_id, et_employee_id FROM employee_transactions")
+        assert dict(cursor.fetchall()) == dict(zip(transaction_ids, ["E2", "E1"]))
+
+
+def test_day_bounds_are_half_open(storage, enroll):
+    enroll("E1", "Asha")
+    storage.add_attendance_in("E1", datetime(2024, 3, 5, 23, 59, 59), None)
+    storage.add_attendance_in("E1", datetime(2024, 3, 6, 0, 0, 0), None)
+
+    start, end = day_bounds("2024-03-05")
+    assert (start, end) == (datetime(2024, 3, 5), datetime(2024, 3, 6))
+    assert storage.count_attendance_records("General", start, end) == 1
+    assert storage.count_attendance_records("General", *day_bounds(date(2024, 3, 6))) == 1
+    assert storage.get_present_employee_ids(date(2024, 3, 4)) == []
+
+
+def test_change_listeners_see_committed_writes(storage, enroll):
+    events = []
+    storage.add_change_listener(lambda event, *args: events.append((event, args)))
+    enroll("E1", "Asha")
+    storage.add_attendance_in("E1", datetime(2024, 3, 5, 9), None)
+    assert [event for event, _ in events] == ["employee_added", "attendance_in"]
+    assert events[1][1] == (["E1"],)
+
+
+@pytest.fixture
+def attendance(storage, enroll):
+    """Six employees with one check-in each on 2024-03-05, one of them in another department"""
+    people = [("E1", "Asha"), ("E2", "Ravi_K"), ("E3", "Ravik"), ("E4", "50% Shift"), ("E5", "Bang!Bang"),
+              ("E6", "Meera")]
+    for i, (emp_id, name) in enumerate(people):
+        enroll(emp_id, name, "Stores" if emp_id == "E6" else "General")
+        storage.add_attendance_in(emp_id, datetime(2024, 3, 5, 9, 10 * (5 - i)), None)
+    return day_bounds("2024-03-05")
+
+
+def test_pages_are_sorted_and_stable(storage, attendance):
+    pages = [storage.get_attendance_page("General", *attendance, offset, 2, sort_key="name")
+             for offset in (0, 2, 4)]
+    names = [row[2] for page in pages for row in page]
+    assert names == sorted(["Asha", "Ravi_K", "Ravik", "50% Shift", "Bang!Bang"])
+
+    descending = storage.get_attendance_page("General", *attendance, 0, 10, sort_key="checkin", descending=True)
+    times = [row[3] for row in descending]
+    assert times == sorted(times, reverse=True)
+
+    with pytest.raises(ValueError):
+        storage.get_attendance_page("General", *attendance, 0, 10, sort_key="em_password")
+
+
+@pytest.mark.parametrize("employee_filter, expected", [
+    ("ravi", {"E2", "E3"}),
+    ("_", {"E2"}),
+    ("%", {"E4"}),
+    ("!", {"E5"}),
+    ("E1", {"E1"}),
+    ("meera", set()),
+])
+def test_employee_filter_matches_literal_text(storage, attendance, employee_filter, expected):
+    rows = storage.get_attendance_page("General", *attendance, 0, 10, employee_filter=employee_filter)
+    assert {row[1] for row in rows} == expected
+    assert storage.count_attendance_records("General", *attendance, employee_filter) == len(expected)
+
+
+def test_like_pattern_escapes_wildcards():
+    assert like_pattern("a_b%c!d") == "%a!_b!%c!!d%"
+
+
+def test_iter_attendance_records_matches_full_read(storage, attendance):
+    chunks = list(storage.iter_attendance_records("General", *attendance, chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [row for chunk in chunks for row in chunk] == storage.get_attendance_records("General", *attendance)
+
+
+def test_short_lived_threads_do_not_keep_connections(storage):
+    # Like the gallery sync and journal replay timers: a new thread per run
+    for _ in range(50):
+        thread = threading.Thread(target=storage.get_total_employees)
+        thread.start()
+        thread.join()
+    assert len(storage.idle_connections) <= storage.pool_size
+
+
+def test_extra_connections_are_closed_when_returned(storage):
+    borrowed = [storage._get_connection() for _ in range(storage.pool_size + 3)]
+    for conn in borrowed:
+        storage._release_connection(conn)
+    assert storage.idle_connections == borrowed[:storage.pool_size]
+
+
+def test_hot_queries_use_indexes(storage):
+    assert storage.check_index_usage() == []
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from threshold_calibration import SITE, ThresholdPolicy, calibrate, recommend_policy
+
+
+@pytest.fixture
+def gallery(templates):
+    """(employee ids, templates matrix, {employee id: department})"""
+    employee_ids = [f"E{i:02d}" for i in range(60)]
+    groups = {emp_id: "General" if i % 2 else "Stores" for i, emp_id in enumerate(employee_ids)}
+    return employee_ids, templates(len(employee_ids)), groups
+
+
+def pairwise(matrix):
+    distances = np.linalg.norm(matrix[:, np.newaxis] - matrix[np.newaxis], axis=2)
+    return distances[~np.eye(len(matrix), dtype=bool)]
+
+
+def test_impostor_rates_match_explicit_pairwise_distances(gallery):
+    employee_ids, matrix, _ = gallery
+    report = calibrate(employee_ids, matrix, block_size=7)[SITE]
+    distances = pairwise(matrix)
+    assert report.impostor_count == len(distances)
+    for threshold in (0.8, 1.2, 1.6):
+        far, frr = report.rates_at(threshold)
+        assert far == pytest.approx(np.mean(distances <= threshold), abs=2 / len(distances))
+        assert frr is None
+
+
+def test_block_size_does_not_change_the_result(gallery):
+    employee_ids, matrix, groups = gallery
+    small = calibrate(employee_ids, matrix, groups, block_size=5)
+    large = calibrate(employee_ids, matrix, groups, block_size=1000)
+    assert small.keys() == large.keys() == {SITE, "General", "Stores"}
+    for group in small:
+        np.testing.assert_array_equal(small[group].far, large[group].far)
+
+
+def test_genuine_probes_set_the_false_reject_rate(gallery, rng):
+    employee_ids, matrix, groups = gallery
+    probes = [(emp_id, matrix[i] + rng.normal(scale=0.01, size=128)) for i, emp_id in enumerate(employee_ids)]
+    reports = calibrate(employee_ids, matrix, groups, probes=probes, target_far=0.01)
+    site = reports[SITE]
+    assert site.genuine_count == len(probes)
+    assert reports["General"].genuine_count == len(probes) // 2
+    assert site.rates_at(site.recommended_threshold)[0] <= 0.01
+    # Probes lie far closer to their own template than to anyone else's
+    assert site.frr_at_threshold == 0.0
+    assert site.equal_error_rate < 0.01
+
+
+def test_recommended_policy_round_trips_through_the_thresholds_file(gallery, tmp_path):
+    employee_ids, matrix, groups = gallery
+    reports = calibrate(employee_ids, matrix, groups)
+    policy = recommend_policy(reports)
+    path = str(tmp_path / "thresholds.json")
+    policy.save(path, reports)
+
+    loaded = ThresholdPolicy.load(path)
+    assert loaded.site_threshold == reports[SITE].recommended_threshold
+    assert loaded.threshold_for_department("Stores") == reports["Stores"].recommended_threshold
+    assert loaded.threshold_for_department("Unknown") == loaded.site_threshold
+    assert ThresholdPolicy.load(str(tmp_path / "missing.json"), 0.55).site_threshold == 0.55
+
+
+def test_departments_without_enough_genuine_pairs_use_the_site_threshold(gallery):
+    employee_ids, matrix, groups = gallery
+    assert recommend_policy(calibrate(employee_ids, matrix, groups), min_genuine=1).department_thresholds == {}
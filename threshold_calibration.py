@@ -0,0 +1,262 @@
+"""
+Threshold Calibration Module
+Measures false accept / false reject rates over the enrolled gallery and recommends match thresholds
+
+Run `python threshold_calibration.py --target-far 0.001` to write a
+thresholds file that FaceRecognitionService.compare_faces picks up.
+"""
+import json
+import os
+import numpy as np
+
+# Distances are binned at 0.001 resolution; 128-d encodings never lie 2.0 apart
+BINS_PER_UNIT = 1000
+MAX_DISTANCE = 2.0
+NUM_BINS = int(MAX_DISTANCE * BINS_PER_UNIT)
+SITE = "site"
+
+
+class ThresholdPolicy:
+    """Site-wide match threshold with optional per-department overrides"""
+    def __init__(self, site_threshold=0.6, department_thresholds=None):
+        self.site_threshold = site_threshold
+        self.department_thresholds = {str(k): v for k, v in (department_thresholds or {}).items()}
+
+    def threshold_for_department(self, dept_id):
+        return self.department_thresholds.get(str(dept_id), self.site_threshold)
+
+    @classmethod
+    def load(cls, path, default=0.6):
+        """Policy from a thresholds file, or the default everywhere if there is none yet"""
+        if not path or not os.path.exists(path):
+            return cls(default)
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get("site", default), data.get("departments"))
+
+    def save(self, path, reports=None):
+        data = {"site": self.site_threshold, "departments": self.department_thresholds}
+        if reports:
+            data["reports"] = {str(group): report.summary() for group, report in reports.items()}
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_path, path)
+
+
+class CalibrationReport:
+    """FAR/FRR curves for one group (the whole site or one department)
+
+    far[i] and frr[i] are the rates when accepting distances <= thresholds[i].
+    """
+    def __init__(self, genuine_counts, impostor_counts, target_far):
+        self.genuine_count = int(genuine_counts.sum())
+        self.impostor_count = int(impostor_counts.sum())
+        self.thresholds = (np.arange(NUM_BINS) + 1) / BINS_PER_UNIT
+        self.far = np.cumsum(impostor_counts) / max(self.impostor_count, 1)
+        self.frr = (1.0 - np.cumsum(genuine_counts) / self.genuine_count) if self.genuine_count else None
+        self.target_far = target_far
+
+        # Largest threshold whose false accept rate stays within the target
+        within = np.nonzero(self.far <= target_far)[0]
+        index = within[-1] if len(within) else 0
+        self.recommended_threshold = float(self.thresholds[index])
+        self.far_at_threshold = float(self.far[index])
+        self.frr_at_threshold = float(self.frr[index]) if self.frr is not None else None
+        if self.frr is not None:
+            eer_index = int(np.argmin(np.abs(self.far - self.frr)))
+            self.equal_error_rate = float((self.far[eer_index] + self.frr[eer_index]) / 2)
+            self.equal_error_threshold = float(self.thresholds[eer_index])
+        else:
+            self.equal_error_rate = self.equal_error_threshold = None
+
+    def rates_at(self, threshold):
+        """(FAR, FRR) when accepting distances <= threshold"""
+        index = min(max(int(np.ceil(threshold * BINS_PER_UNIT)) - 1, 0), NUM_BINS - 1)
+        return float(self.far[index]), float(self.frr[index]) if self.frr is not None else None
+
+    def summary(self):
+        return {
+            "genuine_pairs": self.genuine_count,
+            "impostor_pairs": self.impostor_count,
+            "target_far": self.target_far,
+            "recommended_threshold": self.recommended_threshold,
+            "far": self.far_at_threshold,
+            "frr": self.frr_at_threshold,
+            "equal_error_rate": self.equal_error_rate,
+            "equal_error_threshold": self.equal_error_threshold,
+        }
+
+
+def _bin(distances):
+    indices = (distances * BINS_PER_UNIT).astype(np.int64)
+    np.minimum(indices, NUM_BINS - 1, out=indices)
+    return np.bincount(indices.ravel(), minlength=NUM_BINS)
+
+
+def _by_group(groups):
+    """(group, row selector) for each group present in a block; a slice when the whole block is one group"""
+    unique = set(groups)
+    if len(unique) == 1:
+        yield unique.pop(), slice(None)
+        return
+    for group in unique:
+        yield group, groups == group
+
+
+def _block_distances(block, matrix, sq_norms):
+    """Euclidean distances from every row of `block` to every row of `matrix`"""
+    sq = sq_norms[np.newaxis, :] - 2.0 * (block @ matrix.T)
+    sq += np.einsum("ij,ij->i", block, block)[:, np.newaxis]
+    return np.sqrt(np.maximum(sq, 0.0, out=sq), out=sq)
+
+
+def calibrate(employee_ids, matrix, employee_groups=None, probes=(), target_far=0.001,
+              block_size=256, sample_rows=None, seed=0):
+    """FAR/FRR reports for the site and for each group, e.g. department
+
+    Impostor pairs are every enrolled template against every other one;
+    the N x N matrix is never materialized, only `block_size` rows of it at a
+    time, and each block is reduced to a fixed-size histogram straight away.
+    `sample_rows` limits the impostor rows to a random subset for very large
+    galleries. Genuine pairs come from `probes`, labeled (employee_id,
+    encoding) captures compared with that employee's template; their
+    distances to every other template are counted as impostor pairs too.
+    Returns {SITE or group: CalibrationReport}.
+    """
+    employee_ids = [str(emp_id) for emp_id in employee_ids]
+    matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+    sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+    employee_groups = {str(k): v for k, v in (employee_groups or {}).items()}
+    row_groups = np.array([str(employee_groups.get(emp_id, "")) for emp_id in employee_ids])
+    groups = [group for group in sorted(set(row_groups)) if group]
+
+    genuine = {group: np.zeros(NUM_BINS, dtype=np.int64) for group in [SITE] + groups}
+    impostor = {group: np.zeros(NUM_BINS, dtype=np.int64) for group in [SITE] + groups}
+
+    rows = np.arange(len(employee_ids))
+    if sample_rows is not None and sample_rows < len(rows):
+        rows = np.sort(np.random.default_rng(seed).choice(rows, sample_rows, replace=False))
+
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        distances = _block_distances(matrix[block_rows], matrix, sq_norms)
+        # A template against itself is not an impostor pair: pin it to bin 0 and take it back out
+        distances[np.arange(len(block_rows)), block_rows] = 0.0
+        for group, selector in _by_group(row_groups[block_rows]):
+            counts = _bin(distances[selector])
+            counts[0] -= len(block_rows[selector])
+            impostor[SITE] += counts
+            if group:
+                impostor[group] += counts
+
+    index_by_id = {emp_id: i for i, emp_id in enumerate(employee_ids)}
+    probes = [(str(emp_id), encoding) for emp_id, encoding in probes if str(emp_id) in index_by_id]
+    for start in range(0, len(probes), block_size):
+        chunk = probes[start:start + block_size]
+        distances = _block_distances(np.asarray([encoding for _, encoding in chunk], dtype=np.float64), matrix, sq_norms)
+        own = np.array([index_by_id[emp_id] for emp_id, _ in chunk])
+        genuine_distances = distances[np.arange(len(chunk)), own].copy()
+        distances[np.arange(len(chunk)), own] = 0.0
+        for group, selector in _by_group(row_groups[own]):
+            genuine_counts = _bin(genuine_distances[selector])
+            impostor_counts = _bin(distances[selector])
+            impostor_counts[0] -= len(own[selector])
+            for key in ([SITE, group] if group else [SITE]):
+                genuine[key] += genuine_counts
+                impostor[key] += impostor_counts
+
+    return {group: CalibrationReport(genuine[group], impostor[group], target_far) for group in [SITE] + groups}
+
+
+def load_probes(image_store, employee_ids, kinds=("checkin", "checkout"), max_per_employee=5):
+    """(employee_id, encoding) for stored evidence crops of accepted punches
+
+    These are captures the system already accepted, so the genuine
+    distribution is biased towards easy cases; FRR is a lower bound.
+    """
+    import cv2
+    import face_recognition
+
+    probes = []
+    for emp_id in employee_ids:
+        paths = []
+        for kind in kinds:
+            paths += image_store.find_images(emp_id, kind=kind)
+        for path in paths[-max_per_employee:]:
+            image = cv2.imread(path)
+            if image is None:
+                continue
+            rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            height, width = rgb.shape[:2]
+            # Evidence images are face crops, so the face fills the image
+            encodings = face_recognition.face_encodings(rgb, [(0, width, height, 0)])
+            if encodings:
+                probes.append((emp_id, encodings[0]))
+    return probes
+
+
+def recommend_policy(reports, default=0.6, min_genuine=0):
+    """ThresholdPolicy from calibration reports; groups with fewer than `min_genuine`
+    genuine pairs fall back to the site threshold"""
+    site = reports.get(SITE)
+    policy = ThresholdPolicy(site.recommended_threshold if site and site.impostor_count else default)
+    for group, report in reports.items():
+        if group != SITE and report.impostor_count and report.genuine_count >= min_genuine:
+            policy.department_thresholds[str(group)] = report.recommended_threshold
+    return policy
+
+
+def main():
+    import argparse
+    from dotenv import load_dotenv
+    from face_gallery import unpack_templates
+    from storage_backend import create_storage
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Calibrate face match thresholds over the enrolled gallery")
+    parser.add_argument("--target-far", type=float, default=0.001, help="largest acceptable false accept rate")
+    parser.add_argument("--block-size", type=int, default=256, help="gallery rows compared per block")
+    parser.add_argument("--sample-rows", type=int, default=None, help="impostor rows to sample (default: all)")
+    parser.add_argument("--no-probes", action="store_true", help="skip re-encoding evidence images")
+    parser.add_argument("--max-probes-per-employee", type=int, default=5)
+    parser.add_argument("--min-genuine", type=int, default=20,
+                        help="genuine pairs a department needs for its own threshold")
+    parser.add_argument("--output", default=os.getenv("threshold_file", os.path.join(os.path.expanduser("~"), "attendance_thresholds.json")))
+    args = parser.parse_args()
+
+    db = create_storage()
+    rows = [row for row in db.get_active_face_encodings() if row[2] is not None]
+    employee_ids = [str(row[0]) for row in rows]
+    templates = [unpack_templates(row[2]) for row in rows]
+    # Multi-sample enrollments: the first template stands in for the employee, the rest are genuine probes
+    matrix = np.array([employee_templates[0] for employee_templates in templates]).reshape(-1, 128)
+    probes = [(emp_id, encoding) for emp_id, employee_templates in zip(employee_ids, templates)
+              for encoding in employee_templates[1:]]
+    employee_groups = {str(emp_id): dept_id for emp_id, dept_id in db.get_active_employee_departments()}
+    db.close()
+
+    if not args.no_probes:
+        from image_store import ImageStore
+        from image_writer import ImageWriter
+        writer = ImageWriter()
+        store = ImageStore(os.getenv("image_store_root", os.path.join(os.path.expanduser("~"), "attendance_images")), writer)
+        probes += load_probes(store, employee_ids, max_per_employee=args.max_probes_per_employee)
+        store.close()
+        writer.shutdown()
+
+    reports = calibrate(employee_ids, matrix, employee_groups, probes, args.target_far, args.block_size, args.sample_rows)
+    policy = recommend_policy(reports, min_genuine=args.min_genuine)
+    policy.save(args.output, reports)
+
+    print(f"{'group':<12} {'genuine':>9} {'impostor':>12} {'threshold':>9} {'FAR':>9} {'FRR':>9} {'EER':>9}")
+    for group, report in reports.items():
+        frr = f"{report.frr_at_threshold:.4f}" if report.frr_at_threshold is not None else "n/a"
+        eer = f"{report.equal_error_rate:.4f}" if report.equal_error_rate is not None else "n/a"
+        print(f"{str(group):<12} {report.genuine_count:>9} {report.impostor_count:>12} "
+              f"{report.recommended_threshold:>9.3f} {report.far_at_threshold:>9.5f} {frr:>9} {eer:>9}")
+    print(f"Thresholds written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()